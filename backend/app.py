@@ -1,47 +1,41 @@
 # backend/app.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+import json
 import logging
 import os
+import time
 
-# Import your project modules (implement these under backend/services and backend/models)
-# If you haven't implemented them yet, create simple stubs with the same function names.
-try:
-    from services.embeddings import embed_text
-    from services.memory_store import add_memory as memory_add, search_memory
-    from models.brain import generate_response
-    from services.data_ingestion import ingest_demo_data
-except Exception as e:
-    # If imports fail, log a friendly message. For hackathon, create stubs if needed.
-    logging.warning("Some imports failed in app.py. Make sure services/ and models/ are implemented. Error: %s", e)
-
-    # --- Minimal fallback stubs so app still runs during early dev/demo ---
-    def embed_text(text: str):
-        # returns a mock vector (list of floats)
-        return [float(abs(hash(text)) % 1000) / 1000.0]
-
-    _MEMORY = []
-    def memory_add(text, vector=None):
-        _MEMORY.append({"text": text, "vector": vector})
-    def search_memory(query, k=3):
-        # naive text-match fallback
-        results = [m["text"] for m in _MEMORY if query.lower() in m["text"].lower()]
-        return results[:k]
-
-    def generate_response(question: str, context: Optional[List[str]] = None):
-        ctx = "\n".join(context or [])
-        return f"(mock) Based on context: {ctx}\nAnswer to '{question}' as the user."
-
-    def ingest_demo_data():
-        memory_add("I like Italian food and pasta.")
-        memory_add("I usually workout at 7am before work.")
-        memory_add("Project deadline is on 2025-10-01.")
-        return {"status": "demo data ingested"}
+from services.startup import startup, start_warmup, readiness
+
+# Service imports are not guarded: a missing or broken module must stop the
+# server here instead of letting it come up without its real store
+with startup.phase("imports"):
+    from services.embeddings import aembed_batch, aembed_text, embedding_cache_stats, embedding_dispatcher_stats
+    from services.memory_store import aadd_memory as memory_add, asearch_hits, asearch_hits_batch
+    from services.memory_store import MAX_BATCH_QUERIES
+    from services.memory_store import adelete_memory, aupdate_memory
+    from services.predictions import aask, astream_ask, answer_cache_stats
+    from services.data_ingestion import ingest_demo_data, bulk_ingest, memory_metadata
+    from services.ingest_jobs import submit_file_job, submit_items_job, get_job, list_jobs
+    from services.fine_tune_dataset import submit_build, get_build, list_builds
+    from services import metrics
+    from services.profiler import start_profiler, stop_profiler, profiler_report, profiler_collapsed
+
+@asynccontextmanager
+async def lifespan(app):
+    # Indexes, caches and clients load in the background; /ready reports when they're done
+    startup.mark("app")
+    start_warmup()
+    yield
 
 # --- FastAPI app setup ---
-app = FastAPI(title="Second Brain AI - Backend")
+app = FastAPI(title="Second Brain AI - Backend", lifespan=lifespan)
 
 # Allow requests from local frontend during hackathon
 app.add_middleware(
@@ -52,15 +46,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Record request latency per route, and with TIMING_HEADERS=1 report the
+    per-stage spans (embed, search, context, llm, ...) in a Server-Timing header.
+    """
+    if not metrics.METRICS_ENABLED:
+        return await call_next(request)
+    timings = metrics.begin_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    # The route template (not the raw path) keeps ids out of the label values
+    route = request.scope.get("route")
+    metrics.observe_request(request.method, getattr(route, "path", "unmatched"),
+                            response.status_code, elapsed)
+    if metrics.TIMING_HEADERS:
+        response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+    return response
+
 # --- Request/Response Models ---
 class AddMemoryRequest(BaseModel):
     text: str
     source: Optional[str] = "manual"
     metadata: Optional[dict] = None
+    user_id: Optional[str] = "default"
+
+class UpdateMemoryRequest(BaseModel):
+    text: str
+    metadata: Optional[dict] = None
+    user_id: Optional[str] = "default"
+
+class AddMemoriesRequest(BaseModel):
+    items: List[AddMemoryRequest]
+    user_id: Optional[str] = "default"
 
 class AskRequest(BaseModel):
     question: str
     k: Optional[int] = 3  # number of retrieved memories to include
+    user_id: Optional[str] = "default"  # whose memories to search
+
+class SearchRequest(BaseModel):
+    query: str
+    k: Optional[int] = 5
+    user_id: Optional[str] = "default"
+    source: Optional[List[str]] = None   # only memories from these sources
+    since: Optional[str] = None          # ISO-8601 lower bound on the memory timestamp
+    until: Optional[str] = None          # ISO-8601 upper bound on the memory timestamp
+    mode: Optional[str] = "hybrid"       # "vector", "lexical" (BM25) or "hybrid" (rank-fused)
+
+class SearchBatchRequest(BaseModel):
+    queries: List[str]
+    k: Optional[int] = 5
+    user_id: Optional[str] = "default"
+    source: Optional[List[str]] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+
+class IngestJobRequest(BaseModel):
+    user_id: Optional[str] = "default"
+    path: Optional[str] = None            # file under INGEST_ROOT (.txt/.md, .jsonl or .json)
+    format: Optional[str] = None          # "text", "jsonl" or "json" (default: from the extension)
+    source: Optional[str] = None
+    text_field: Optional[str] = None      # JSON/JSONL field holding the text (default "text")
+    items_key: Optional[str] = None       # JSON: key of the array inside the top-level object
+    items: Optional[List[AddMemoryRequest]] = None  # or inline items instead of a file
 
 class IngestResult(BaseModel):
     status: str
@@ -70,71 +121,307 @@ class IngestResult(BaseModel):
 async def add_memory_api(req: AddMemoryRequest):
     """
     Add a text memory into the vector DB.
-    - embed_text: converts text -> vector
-    - memory_add: stores text + vector in your memory store
+    - aembed_text: converts text -> vector (non-blocking API call)
+    - memory_add: stores text + vector in your memory store (on the store's thread pool),
+      with user_id, source, timestamp and req.metadata as its metadata
     """
     try:
-        vector = embed_text(req.text)
-        memory_add(req.text, vector)
-        return {"status": "Memory added", "text": req.text}
+        vector = await aembed_text(req.text)
+        metadata = memory_metadata(req.user_id, req.source or "manual", req.metadata)
+        memory_id = await memory_add(req.text, vector, metadata, user_id=req.user_id)
+        return {"status": "Memory added", "id": memory_id, "text": req.text}
     except Exception as e:
         logging.exception("Failed to add memory")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.put("/memories/{memory_id}")
+async def update_memory_api(memory_id: int, req: UpdateMemoryRequest):
+    """Replace a memory's text (re-embedded) and metadata; the id stays the same."""
+    try:
+        vector = await aembed_text(req.text)
+        updated = await aupdate_memory(memory_id, req.text, vector, req.metadata,
+                                       user_id=req.user_id)
+    except Exception as e:
+        logging.exception("Failed to update memory")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail=f"No memory with id {memory_id}")
+    return {"status": "Memory updated", "id": memory_id, "text": req.text}
+
+@app.delete("/memories/{memory_id}")
+async def delete_memory_api(memory_id: int, user_id: str = "default"):
+    """Delete one memory (tombstoned now, reclaimed by background compaction)."""
+    try:
+        deleted = await adelete_memory(memory_id, user_id=user_id)
+    except Exception as e:
+        logging.exception("Failed to delete memory")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"No memory with id {memory_id}")
+    return {"status": "Memory deleted", "id": memory_id}
+
+@app.post("/add_memories/", status_code=201)
+async def add_memories_api(req: AddMemoriesRequest):
+    """
+    Add many text memories in one request.
+    - bulk_ingest: embeds in provider-sized batches and inserts each batch at once
+    - per-item results keep the order of req.items (failed items have status "error")
+    """
+    try:
+        items = [{"text": item.text, "source": item.source, "metadata": item.metadata}
+                 for item in req.items]
+        results = await run_in_threadpool(bulk_ingest, req.user_id, items)
+        added = sum(1 for r in results if r.get("status") == "success")
+        return {"status": "Memories added", "added": added, "results": results}
+    except Exception as e:
+        logging.exception("Failed to add memories")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/ask_brain/")
 async def ask_brain(req: AskRequest):
     """
     Query the Second Brain:
-    1. Use search_memory to get top-k relevant memories (RAG).
-    2. Pass question + retrieved context to generate_response (LLM).
+    1. Retrieve the top-k relevant memories (RAG).
+    2. Answer from question + retrieved context (LLM), unless a similar
+       question was already answered from the same memories (answer cache).
+    Every step is awaited, so one slow request doesn't stall the others.
     """
+    _check_k(req.k)
     try:
-        # 1) Retrieve relevant memories
-        memories = search_memory(req.question, k=req.k)
-
-        # 2) Generate answer using your brain model (wrap LLM calls here)
-        answer = generate_response(req.question, memories)
+        result = await aask(req.user_id, req.question, top_k=req.k)
 
         return {
             "question": req.question,
-            "context": memories,
-            "answer": answer
+            "context": result["context"],
+            "answer": result["answer"],
+            "cached": result["cached"],
+            "prompt_tokens": result["prompt_tokens"],
         }
     except Exception as e:
         logging.exception("ask_brain failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _check_k(k):
+    """Reject a missing or non-positive number of memories to retrieve (400)."""
+    if k is None or k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1")
+
+def _sse(event: str, data) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask_brain/stream")
+async def ask_brain_stream(req: AskRequest):
+    """
+    Streaming /ask_brain/ over server-sent events:
+      event: context -> {"context": [...], "cached": bool, "prompt_tokens": int},
+                        sent right after retrieval
+      event: token   -> a chunk of the answer, sent as the model produces it
+      event: done    -> {"answer": full answer}
+      event: error   -> {"detail": message}, if anything fails mid-stream
+    """
+    _check_k(req.k)
+
+    async def events():
+        try:
+            async for event, data in astream_ask(req.user_id, req.question, top_k=req.k):
+                yield _sse(event, data)
+        except Exception as e:
+            # Headers are already sent, so errors are reported in-stream
+            logging.exception("ask_brain stream failed")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream into one response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/search/")
+async def search_api(req: SearchRequest):
+    """
+    Search over one user's memories, with optional metadata filters.
+    mode picks semantic (vector), keyword (lexical) or fused (hybrid) ranking.
+    Returns scored hits: {"id", "text", "score", "distance", "metadata"}.
+    """
+    _check_k(req.k)
+    try:
+        # Keyword-only search doesn't need the embedding round-trip
+        vector = await aembed_text(req.query) if req.mode != "lexical" else None
+        hits = await asearch_hits(vector, k=req.k, user_id=req.user_id,
+                                  source=req.source, since=req.since, until=req.until,
+                                  query_text=req.query, mode=req.mode)
+        return {"query": req.query, "hits": hits}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("search failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/search_batch/")
+async def search_batch_api(req: SearchBatchRequest):
+    """
+    Vector search for many queries at once: one embedding batch and one index
+    scan for all of them. The filters apply to every query.
+    Returns {"results": [{"query", "hits"}, ...]} in request order.
+    """
+    _check_k(req.k)
+    try:
+        # Rejected before anything is embedded
+        if len(req.queries) > MAX_BATCH_QUERIES:
+            raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per batch, got {len(req.queries)}")
+        if any(not q.strip() for q in req.queries):
+            raise ValueError("Cannot embed empty text")
+        vectors = await aembed_batch(req.queries) if req.queries else []
+        results = await asearch_hits_batch(vectors, k=req.k, user_id=req.user_id,
+                                           source=req.source, since=req.since, until=req.until)
+        return {"results": [{"query": q, "hits": hits} for q, hits in zip(req.queries, results)]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("batch search failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/ingest_jobs/", status_code=202)
+async def submit_ingest_job(req: IngestJobRequest):
+    """
+    Queue a background import and return its job id right away.
+    Parsing and embedding run in worker processes; poll GET /ingest_jobs/{job_id}.
+    """
+    try:
+        if req.items is not None:
+            items = [{"text": item.text, "source": item.source} for item in req.items]
+            job_id = await run_in_threadpool(submit_items_job, req.user_id, items)
+        elif req.path:
+            options = {k: v for k, v in {"source": req.source, "text_field": req.text_field,
+                                         "items_key": req.items_key}.items() if v is not None}
+            job_id = await run_in_threadpool(submit_file_job, req.user_id, req.path,
+                                             req.format, **options)
+        else:
+            raise ValueError("Pass either path or items")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.exception("Failed to submit ingestion job")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/ingest_jobs/{job_id}")
+async def ingest_job_status(job_id: int):
+    """Status, progress (0..1), counters and throughput of one ingestion job."""
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No ingestion job {job_id}")
+    return job
+
+@app.get("/ingest_jobs/")
+async def ingest_jobs_list(user_id: Optional[str] = None):
+    """Most recent ingestion jobs (optionally only one user's)."""
+    return await run_in_threadpool(list_jobs, user_id)
+
 @app.post("/ingest_demo/", response_model=IngestResult)
 async def ingest_demo():
     """
-    Ingest some demo/sample user data (useful for hackathon demo).
-    Implement ingest_demo_data() in services/data_ingestion.py to load from data/
+    Ingest some demo/sample user data (useful for hackathon demo):
+    the habits, calendar events and notes under data/.
     """
     try:
-        result = ingest_demo_data()
+        result = await run_in_threadpool(ingest_demo_data)
         return result
     except Exception as e:
         logging.exception("ingest_demo failed")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/trigger_fine_tune/")
-async def trigger_fine_tune():
+@app.post("/trigger_fine_tune/", status_code=202)
+async def trigger_fine_tune(user_id: str = "default"):
     """
-    OPTIONAL: endpoint that triggers fine-tuning or adaptation flow.
-    Implementation depends on which provider you use. For hackathon, this can be mocked.
+    Start the fine-tuning flow: queue an incremental build of the user's
+    training dataset (only memories added since the last build are read).
+    Poll GET /fine_tune/builds/{job_id}. Uploading the finished JSONL to a
+    provider's fine-tune API is still up to you (provider-specific).
     """
     try:
-        # Placeholder: return success for demo
-        # Replace with code that prepares jsonl, uploads to fine-tune API, monitors job.
-        return {"status": "fine-tune job started (mock)", "job_id": None}
+        build_id = await run_in_threadpool(submit_build, user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.exception("trigger_fine_tune failed")
         raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "dataset build queued", "job_id": build_id}
+
+@app.get("/fine_tune/builds/{build_id}")
+async def fine_tune_build_status(build_id: int):
+    """Status and counters (memories read, examples written, duplicates, parts) of one build."""
+    build = await run_in_threadpool(get_build, build_id)
+    if build is None:
+        raise HTTPException(status_code=404, detail=f"No dataset build {build_id}")
+    return build
+
+@app.get("/fine_tune/builds/")
+async def fine_tune_builds_list(user_id: Optional[str] = None):
+    """Most recent dataset builds (optionally only one user's)."""
+    return await run_in_threadpool(list_builds, user_id)
+
+@app.get("/embedding_cache/stats")
+async def embedding_cache_stats_api():
+    """Hit/miss counters of the embedding cache (memory LRU + SQLite)."""
+    return embedding_cache_stats()
+
+@app.get("/embedding_dispatcher/stats")
+async def embedding_dispatcher_stats_api():
+    """Queue depth and batch-size histogram of the embedding micro-batcher."""
+    return embedding_dispatcher_stats()
+
+@app.get("/answer_cache/stats")
+async def answer_cache_stats_api():
+    """Hit/miss/invalidation counters of the /ask_brain/ answer cache."""
+    return answer_cache_stats()
+
+@app.get("/metrics")
+async def metrics_api():
+    """Counters and latency histograms in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/debug/profiler/start")
+async def profiler_start(interval_ms: Optional[float] = None, duration_s: Optional[float] = None):
+    """Turn on the sampling profiler (stops by itself after duration_s)."""
+    try:
+        return start_profiler(interval_ms, duration_s)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+@app.post("/debug/profiler/stop")
+async def profiler_stop(limit: int = 30):
+    """Turn off the sampling profiler and return the hottest functions."""
+    return await run_in_threadpool(stop_profiler, limit)
+
+@app.get("/debug/profiler")
+async def profiler_results(limit: int = 30, format: str = "json"):
+    """
+    The profile collected so far: top functions as JSON, or with
+    format=collapsed the collapsed stacks for flamegraph.pl / speedscope.
+    """
+    if format == "collapsed":
+        return PlainTextResponse(profiler_collapsed())
+    return profiler_report(limit)
 
 @app.get("/health")
 async def health():
+    """Liveness: the process is up (it may still be warming up)."""
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once warmup has loaded the indexes, caches and clients,
+    503 before that (or if warmup failed). Includes per-phase startup timings.
+    """
+    report = readiness()
+    if not report["ready"]:
+        return JSONResponse(report, status_code=503)
+    return report
+
 # --- Run instructions for local dev ---
 # Use: uvicorn backend.app:app --reload --port 8000
 # (from project root)
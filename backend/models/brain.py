@@ -37,18 +37,16 @@ class SecondBrain:
 
     def list_memories(self) -> list:
         """
-        Retrieve all stored memories (strings only).
-        (In real multi-user app you’d filter by user_id,
-         but demo version shares a single FAISS index.)
+        Retrieve all of this user's stored memories (strings only).
         """
-        return get_all_memories()
+        return get_all_memories(self.user_id)
 
     def clear_memories(self):
         """
-        Wipe all memories for demo or testing.
-        NOTE: Clears global FAISS index (all users).
+        Wipe this user's memories for demo or testing.
+        Other users' shards are not touched.
         """
-        reset_store()
+        reset_store(self.user_id)
 
     # ---- Brain Response ----
     def ask(self, question: str, top_k: int = 3) -> str:
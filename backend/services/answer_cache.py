@@ -0,0 +1,168 @@
+# backend/services/answer_cache.py
+"""
+Answer Cache
+------------
+Semantic cache in front of the LLM call in /ask_brain/.
+
+An entry remembers the question's embedding, the ids of the memories the
+answer was built from, and the answer. A new question reuses it when:
+  1. it belongs to the same user,
+  2. its embedding is within `threshold` cosine similarity of the entry's, and
+  3. retrieval returned the same memory ids (in the same order).
+
+Entries expire after `ttl_seconds` and the least recently used ones are
+evicted past `max_items`. memory_store notifies the cache (see on_memory_event)
+when a user's memories change, and entries whose top-k the change could
+affect are dropped right away. Changes made by other worker processes sharing
+the store are reported as soon as this process's store picks them up, which
+happens at the latest when a question runs its search.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .index_factory import vector_distances
+from .lexical_index import tokenize
+
+
+class _Entry:
+    __slots__ = ("user_id", "question", "vector", "unit", "terms", "context_ids", "max_distance",
+                 "k", "answer", "created")
+
+    def __init__(self, user_id, question, vector, context_ids, max_distance, k, answer):
+        self.user_id = user_id
+        self.question = question
+        self.vector = np.asarray(vector, dtype="float32").ravel()
+        self.unit = _unit(self.vector)
+        self.terms = set(tokenize(question))
+        self.context_ids = tuple(context_ids)
+        self.max_distance = max_distance
+        self.k = k
+        self.answer = answer
+        self.created = time.monotonic()
+
+
+class AnswerCache:
+    """Per-user semantic answer cache with TTL + LRU eviction and hit/miss counters."""
+
+    def __init__(self, max_items: int = 1_000, ttl_seconds: float = 3600,
+                 threshold: float = 0.95, metric: str = "l2"):
+        self.max_items = max_items
+        self.metric = metric  # the memory store's metric, for invalidation distances
+        self.ttl = ttl_seconds
+        self.threshold = threshold
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._by_user: dict[str, set] = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # ---- Lookups ----
+    def get(self, user_id: str, vector, context_ids: list[int], k: int):
+        """Return the cached answer for a similar question with the same context, or None."""
+        query = _unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_sim = None, self.threshold
+            for key in list(self._by_user.get(user_id, ())):
+                entry = self._entries[key]
+                if now - entry.created > self.ttl:
+                    self._drop(key)
+                    continue
+                if entry.k != k or entry.context_ids != tuple(context_ids):
+                    continue
+                sim = float(entry.unit @ query)
+                if sim >= best_sim:
+                    best_key, best_sim = key, sim
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key].answer
+
+    def put(self, user_id: str, question: str, vector, hits: list[dict], k: int, answer: str):
+        """
+        Remember answer for question. hits are the search_hits the answer was
+        built from; their ids and vector distances drive invalidation.
+        """
+        distances = [h["distance"] for h in hits if h.get("distance") is not None]
+        # With fewer than k vector hits, any new memory would enter the top-k
+        max_distance = max(distances) if distances and len(distances) >= k else float("inf")
+        entry = _Entry(user_id, question, vector, [h["id"] for h in hits],
+                       max_distance, k, answer)
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = entry
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: int):
+        # Caller holds self._lock
+        entry = self._entries.pop(key)
+        keys = self._by_user[entry.user_id]
+        keys.discard(key)
+        if not keys:
+            del self._by_user[entry.user_id]
+
+    # ---- Invalidation ----
+    def on_memory_event(self, event: str, user_id: str, ids=None, texts=None, vectors=None):
+        """
+        memory_store listener. Drops user_id's entries that the change can affect:
+          • "add" / "update": a new vector closer to the question than its k-th
+            retrieved memory, or new text sharing a keyword with the question
+          • "update" / "delete": an entry built from one of the changed ids
+          • "reset": every entry of the user (all users when user_id is None)
+        """
+        with self._lock:
+            keys = (list(self._entries) if user_id is None
+                    else list(self._by_user.get(user_id, ())))
+            if event == "reset":
+                stale = keys
+            else:
+                changed = set(ids or ())
+                new_vecs = None if vectors is None else np.asarray(vectors, dtype="float32")
+                new_terms = set()
+                for text in texts or ():
+                    new_terms.update(tokenize(text))
+                stale = []
+                for key in keys:
+                    entry = self._entries[key]
+                    if changed.intersection(entry.context_ids) or entry.terms & new_terms:
+                        stale.append(key)
+                    elif new_vecs is not None and len(new_vecs):
+                        # Same distance the FAISS search reported for the hits
+                        dists = vector_distances(new_vecs, entry.vector, self.metric)
+                        if dists.min() < entry.max_distance:
+                            stale.append(key)
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "items": len(self._entries),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+
+def _unit(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype="float32").ravel()
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
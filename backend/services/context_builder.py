@@ -0,0 +1,107 @@
+# backend/services/context_builder.py
+"""
+Context Builder
+---------------
+Chooses which retrieved memories go into the LLM prompt:
+
+  1. near-duplicates (cosine similarity >= dedup_threshold to a memory that
+     is already in) are dropped, using the vectors memory_store keeps anyway
+  2. optionally, candidates are reordered with MMR (maximal marginal
+     relevance) so the context covers different facts instead of one fact
+     several times
+  3. memories are added best first while the prompt stays within the
+     token budget
+
+Tokens are counted with tiktoken when it is installed and estimated
+locally otherwise.
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+
+# Roughly how many characters one BPE token covers in English text
+_CHARS_PER_TOKEN = 4
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Number of tokens text takes for model (estimated without tiktoken)."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Words and punctuation are a token each; long words split into ~4-char pieces
+    return sum(1 + (len(w) - 1) // _CHARS_PER_TOKEN for w in _WORD_RE.findall(text))
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype="float32")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr_order(query_vector, vectors: np.ndarray, mmr_lambda: float = 0.7) -> list[int]:
+    """
+    Order candidates by maximal marginal relevance:
+    mmr_lambda * sim(query) - (1 - mmr_lambda) * max sim(already chosen).
+    """
+    if len(vectors) == 0:
+        return []
+    unit = _unit_rows(vectors)
+    relevance = unit @ _unit_rows(np.asarray(query_vector, dtype="float32").reshape(1, -1))[0]
+    redundancy = np.full(len(unit), -np.inf, dtype=np.float32)
+    order, left = [], np.ones(len(unit), dtype=bool)
+    for _ in range(len(unit)):
+        penalty = np.where(np.isinf(redundancy), 0.0, redundancy)
+        score = np.where(left, mmr_lambda * relevance - (1 - mmr_lambda) * penalty, -np.inf)
+        best = int(np.argmax(score))
+        order.append(best)
+        left[best] = False
+        redundancy = np.maximum(redundancy, unit @ unit[best])
+    return order
+
+
+def build_context(hits: list[dict], vectors: np.ndarray, k: int, budget_tokens: int,
+                  base_tokens: int = 0, dedup_threshold: float = 0.95,
+                  query_vector=None, mmr_lambda: float = None,
+                  model: str = "gpt-4o-mini") -> tuple[list[dict], int]:
+    """
+    Pick up to k of hits (best first, vectors row-aligned with hits) for the prompt.
+    Args:
+        budget_tokens (int): Token limit for the whole prompt
+        base_tokens (int): Tokens the prompt takes without any memory
+        dedup_threshold (float): Cosine similarity above which a memory counts as a duplicate
+        query_vector / mmr_lambda: Reorder with MMR when mmr_lambda is set
+    Returns:
+        (list[dict], int): Chosen hits in prompt order, and the prompt's token count
+    """
+    order = list(range(len(hits)))
+    if mmr_lambda is not None and query_vector is not None:
+        order = mmr_order(query_vector, vectors, mmr_lambda)
+    unit = _unit_rows(vectors) if len(hits) else np.empty((0, 0), dtype="float32")
+
+    chosen, tokens = [], base_tokens
+    for i in order:
+        if len(chosen) == k:
+            break
+        if chosen and float((unit[chosen] @ unit[i]).max()) >= dedup_threshold:
+            continue
+        cost = count_tokens(hits[i]["text"], model) + 1  # + the joining newline
+        if tokens + cost > budget_tokens:
+            continue  # a shorter memory further down may still fit
+        chosen.append(i)
+        tokens += cost
+    return [hits[i] for i in chosen], tokens
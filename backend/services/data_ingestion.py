@@ -0,0 +1,166 @@
+# backend/services/data_ingestion.py
+"""
+Data Ingestion Service
+----------------------
+Collects user data (text, habits, interactions, routines, etc.),
+generates embeddings, and stores them in the memory store.
+Large exports go through ingest_file(), which streams them through the
+chunked, resumable pipeline in services/ingest_pipeline.py.
+"""
+
+import datetime
+from pathlib import Path
+from .embeddings import embed_text, embed_batch, MAX_BATCH_SIZE
+from .ingest_pipeline import IngestPipeline, JsonArrayReader, JsonlReader, TextReader
+from .memory_store import DEFAULT_USER, add_memory, add_memories
+
+def ingest_text(user_id: str, text: str, source: str = "manual"):
+    """
+    Ingest a single text snippet as a memory.
+
+    Args:
+        user_id (str): Unique user identifier
+        text (str): Content to store
+        source (str): Where the data came from (chat, calendar, notes, etc.)
+    Returns:
+        dict: Metadata for confirmation/logging
+    """
+    if not text or not text.strip():
+        raise ValueError("Cannot ingest empty text")
+
+    # 1️⃣ Create embedding
+    vector = embed_text(text)
+
+    # 2️⃣ Metadata
+    metadata = memory_metadata(user_id, source)
+
+    # 3️⃣ Store in vector DB
+    add_memory(text, vector, metadata, user_id=user_id)
+
+    return {
+        "status": "success",
+        "stored_text": text,
+        "metadata": metadata
+    }
+
+
+def memory_metadata(user_id: str, source: str, extra: dict = None, timestamp: str = None) -> dict:
+    """
+    Metadata stored with an ingested memory: its user, source and ingestion
+    timestamp (what the source/since/until search filters match), plus any
+    extra fields. extra may set its own timestamp, e.g. when an event happened.
+    """
+    metadata = {
+        "user_id": user_id,
+        "source": source,
+        "timestamp": timestamp or datetime.datetime.utcnow().isoformat(),
+        **(extra or {}),
+    }
+    metadata["user_id"] = user_id
+    return metadata
+
+
+def bulk_ingest(user_id: str, items: list[dict]):
+    """
+    Ingest a list of items.
+    Each item must be a dict with keys:
+        { "text": "...", "source": "optional", "metadata": {optional extra fields} }
+
+    Texts are embedded with embed_batch in chunks of MAX_BATCH_SIZE and
+    each chunk is stored with a single add_memories call. If a chunk fails,
+    its items are retried one by one, so each result reports its own item.
+
+    Returns:
+        list of results for each item (same order as items)
+    """
+    results = [None] * len(items)
+    pending = []  # (position, text, source, extra metadata) for items that passed validation
+    for pos, item in enumerate(items):
+        text = item.get("text", "")
+        source = item.get("source") or "bulk"
+        if not text or not text.strip():
+            results[pos] = {"status": "error", "error": "Cannot ingest empty text", "text": text}
+            continue
+        pending.append((pos, text, source, item.get("metadata")))
+
+    for start in range(0, len(pending), MAX_BATCH_SIZE):
+        chunk = pending[start:start + MAX_BATCH_SIZE]
+        try:
+            done = _ingest_chunk(user_id, chunk)
+        except Exception:
+            # Retry item by item, so one bad input (or a rejected request)
+            # only fails itself and every result reflects its own item
+            done = []
+            for item in chunk:
+                try:
+                    done += _ingest_chunk(user_id, [item])
+                except Exception as e:
+                    done.append({"status": "error", "error": str(e), "text": item[1]})
+        for (pos, *_), result in zip(chunk, done):
+            results[pos] = result
+    return results
+
+
+def _ingest_chunk(user_id: str, chunk: list[tuple]) -> list[dict]:
+    """Embed and store (position, text, source, extra) items together; returns their results."""
+    texts = [text for _, text, _, _ in chunk]
+
+    # 1️⃣ One embedding request per chunk
+    vectors = embed_batch(texts)
+
+    # 2️⃣ Metadata
+    timestamp = datetime.datetime.utcnow().isoformat()
+    metas = [memory_metadata(user_id, source, extra, timestamp) for _, _, source, extra in chunk]
+
+    # 3️⃣ One vector DB insert per chunk
+    add_memories(texts, vectors, metas, user_id=user_id)
+    return [
+        {"status": "success", "stored_text": text, "metadata": metadata}
+        for text, metadata in zip(texts, metas)
+    ]
+
+
+# ---- Large files (streaming pipeline, see services/ingest_pipeline.py) ----
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+_READERS = {".txt": TextReader, ".md": TextReader, ".jsonl": JsonlReader, ".json": JsonArrayReader}
+
+
+def ingest_file(user_id: str, path, source: str = None, checkpoint_path=None, **reader_options):
+    """
+    Stream one file into user_id's memories with constant memory.
+    The reader is chosen by extension (.txt/.md, .jsonl, .json); reader_options
+    are passed to it (e.g. items_key="events", formatter=...).
+    Pass the same checkpoint_path again to resume an interrupted import.
+
+    Returns:
+        dict: Pipeline counters (records, chunks, duplicates, inserted, batches, seconds)
+    """
+    path = Path(path)
+    reader_cls = _READERS.get(path.suffix.lower())
+    if reader_cls is None:
+        raise ValueError(f"Don't know how to ingest {path.suffix} files ({', '.join(_READERS)})")
+    reader = reader_cls(path, source=source or path.stem, **reader_options)
+    return IngestPipeline(user_id, checkpoint_path=checkpoint_path).run([reader])
+
+
+def ingest_sample_data(brain):
+    """Load the demo habits, calendar events and notes from data/ into brain's memories."""
+    return ingest_demo_data(brain.user_id)
+
+
+def ingest_demo_data(user_id: str = DEFAULT_USER):
+    """Load the demo habits, calendar events and notes from data/ into user_id's memories."""
+    readers = [
+        JsonArrayReader(
+            DATA_DIR / "habits.json", source="habits",
+            formatter=lambda h: f"Habit: {h['habit']} at {h['time']} ({h['frequency']})",
+        ),
+        JsonArrayReader(
+            DATA_DIR / "calendar.json", source="calendar", items_key="events",
+            formatter=lambda e: f"Event: {e['title']} on {e['date']} at {e['time']}",
+        ),
+        TextReader(DATA_DIR / "notes.txt", source="notes"),
+    ]
+    stats = IngestPipeline(user_id).run(readers)
+    return {"status": "Demo data ingested", "inserted": stats["inserted"]}
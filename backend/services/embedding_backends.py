@@ -0,0 +1,238 @@
+# backend/services/embedding_backends.py
+"""
+Embedding Backends
+------------------
+Pluggable embedding providers behind one small interface, selected with
+EMBEDDING_PROVIDER:
+
+  • "openai" – OpenAI embeddings API (default when OPENAI_API_KEY is set)
+  • "local"  – on-CPU sentence-transformers model (torch or ONNX runtime), no network
+  • "mock"   – deterministic hashed-token projection (default without an API key)
+
+Every backend reports its vector dimension, which memory_store uses as
+VECTOR_DIM, so the FAISS index always matches the configured model.
+"""
+
+import asyncio
+import os
+import threading
+
+import numpy as np
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding providers.
+    Subclasses set name / model / dim / max_batch_size and implement embed().
+    """
+
+    name = "base"
+    model = ""
+    dim = 0
+    max_batch_size = 2048
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Return a (len(texts), dim) float32 matrix."""
+        raise NotImplementedError
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        """Async embed; CPU-bound backends run on a worker thread."""
+        return await asyncio.to_thread(self.embed, texts)
+
+    def warmup(self):
+        """Load whatever the first embed() would otherwise load (clients, model weights)."""
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} model={self.model} dim={self.dim}>"
+
+
+class OpenAIBackend(EmbeddingBackend):
+    """OpenAI embeddings API. Clients are created on first use."""
+
+    name = "openai"
+    max_batch_size = 2048  # max inputs per embeddings request
+
+    # Output size of the models we use
+    MODEL_DIMS = {
+        "text-embedding-ada-002": 1536,
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+    }
+
+    def __init__(self, model: str = "text-embedding-ada-002", max_connections: int = 100):
+        self.model = model
+        self.dim = int(os.getenv("EMBEDDING_DIM", self.MODEL_DIMS.get(model, 1536)))
+        self.max_connections = max_connections
+        self._client = None
+        self._aclient = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            return self._client
+
+    @property
+    def aclient(self):
+        # One pooled HTTP client shared by all requests
+        with self._lock:
+            if self._aclient is None:
+                import httpx
+                from openai import AsyncOpenAI
+                self._aclient = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_connections // 5),
+                        timeout=httpx.Timeout(30.0, connect=5.0),
+                    ),
+                )
+            return self._aclient
+
+    def warmup(self):
+        # Creating the clients imports the SDK and sets up the connection pool
+        _ = self.client, self.aclient
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return np.asarray([item.embedding for item in response.data], dtype="float32")
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        response = await self.aclient.embeddings.create(model=self.model, input=texts)
+        return np.asarray([item.embedding for item in response.data], dtype="float32")
+
+
+class MockBackend(EmbeddingBackend):
+    """Hashed-token random projection (see mock_embeddings.mock_embed_batch)."""
+
+    name = "mock"
+    max_batch_size = 2048  # computed locally; only capped to keep memory flat
+
+    def __init__(self, dim: int = None):
+        from .mock_embeddings import MOCK_DIM, MOCK_SEED
+        self.dim = dim or MOCK_DIM
+        self.seed = MOCK_SEED
+        self.model = f"mock-hash-{self.dim}-{self.seed}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        from .mock_embeddings import mock_embed_batch
+        return mock_embed_batch(texts, dim=self.dim, seed=self.seed)
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        return self.embed(texts)  # microseconds per text, not worth a thread hop
+
+    def warmup(self):
+        self.embed(["warmup"])
+
+
+class LocalBackend(EmbeddingBackend):
+    """
+    On-CPU sentence-transformers model (optional dependency).
+    Inference is batched and uses `threads` intra-op threads; set
+    runtime="onnx" to run the exported ONNX graph instead of torch.
+    The model is loaded on first use.
+    """
+
+    name = "local"
+
+    # Known output sizes, so the dimension is available without loading the model
+    MODEL_DIMS = {
+        "sentence-transformers/all-MiniLM-L6-v2": 384,
+        "sentence-transformers/all-MiniLM-L12-v2": 384,
+        "BAAI/bge-small-en-v1.5": 384,
+        "sentence-transformers/all-mpnet-base-v2": 768,
+    }
+
+    def __init__(self, model: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 threads: int = None, batch_size: int = 64, runtime: str = "torch"):
+        self.model = model
+        self.threads = threads or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_batch_size = batch_size * 16
+        self.runtime = runtime
+        self._st = None
+        self._lock = threading.Lock()
+        if os.getenv("EMBEDDING_DIM"):
+            self.dim = int(os.getenv("EMBEDDING_DIM"))
+        elif model in self.MODEL_DIMS:
+            self.dim = self.MODEL_DIMS[model]
+        else:
+            self.dim = self._load().get_sentence_embedding_dimension()
+
+    def _load(self):
+        with self._lock:
+            if self._st is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise RuntimeError(
+                        "EMBEDDING_PROVIDER=local needs `pip install sentence-transformers`"
+                        " (plus `onnxruntime` for LOCAL_EMBEDDING_RUNTIME=onnx)"
+                    ) from e
+                import torch
+                torch.set_num_threads(self.threads)
+                kwargs = {"backend": "onnx"} if self.runtime == "onnx" else {}
+                self._st = SentenceTransformer(self.model, device="cpu", **kwargs)
+            return self._st
+
+    def warmup(self):
+        self._load()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = self._load().encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(vectors, dtype="float32")
+
+
+PROVIDERS = ("openai", "local", "mock")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def default_provider() -> str:
+    return os.getenv("EMBEDDING_PROVIDER") or ("openai" if os.getenv("OPENAI_API_KEY") else "mock")
+
+
+def create_backend(provider: str = None) -> EmbeddingBackend:
+    """Build the backend for provider (default: EMBEDDING_PROVIDER / env)."""
+    provider = provider or default_provider()
+    if provider == "openai":
+        return OpenAIBackend(
+            model=os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002"),
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 100)),
+        )
+    if provider == "local":
+        return LocalBackend(
+            model=os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+            threads=int(os.getenv("LOCAL_EMBEDDING_THREADS", 0)) or None,
+            batch_size=int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 64)),
+            runtime=os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch"),
+        )
+    if provider == "mock":
+        return MockBackend()
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER {provider!r}, expected one of {PROVIDERS}")
+
+
+def get_backend() -> EmbeddingBackend:
+    """The process-wide configured backend (created once)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+def set_backend(backend: EmbeddingBackend):
+    """Swap the process-wide backend (tests / benchmarks)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
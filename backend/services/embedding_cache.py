@@ -0,0 +1,200 @@
+# backend/services/embedding_cache.py
+"""
+Embedding Cache
+---------------
+Content-addressed cache in front of the embedding provider, so the same
+text is never sent to the API twice.
+
+Keys are sha256(model + normalized text). Lookups go through two levels:
+  1. a bounded in-process LRU of float32 vectors
+  2. an on-disk SQLite table that survives restarts
+Hits from level 2 are promoted into level 1.
+
+The async lookups (aget_many / aput_many / aembed_many) run the SQLite reads
+and commits on a worker thread, so they never block the event loop.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different copies share one entry."""
+    return " ".join(text.split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def _chunks(items: list, size: int = None):
+    """items in consecutive slices of at most size (one slice when size is None)."""
+    size = size or len(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class EmbeddingCache:
+    """
+    Two-level (memory LRU + SQLite) embedding cache with hit/miss counters.
+    Pass path=None for a memory-only cache.
+    """
+
+    def __init__(self, max_items: int = 10_000, path: str = None):
+        self.max_items = max_items
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ---- Lookups ----
+    def get_many(self, keys: list[str]) -> dict:
+        """Return {key: vector} for every key found in either level."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vec
+            self.memory_hits += sum(1 for k in keys if k in found)
+
+            missing = [k for k in dict.fromkeys(keys) if k not in found]
+            if missing and self._db is not None:
+                for start in range(0, len(missing), 500):  # stay under SQLite's variable limit
+                    chunk = missing[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vec = np.frombuffer(blob, dtype="float32")
+                        found[key] = vec
+                        self._remember(key, vec)
+                disk = set(found).intersection(missing)
+                self.disk_hits += sum(1 for k in keys if k in disk)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items: dict):
+        """Store {key: vector} in both levels."""
+        vecs = {k: np.asarray(v, dtype="float32") for k, v in items.items()}
+        with self._lock:
+            for key, vec in vecs.items():
+                self._remember(key, vec)
+            if self._db is not None and vecs:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(k, v.tobytes()) for k, v in vecs.items()],
+                )
+                self._db.commit()
+
+    async def aget_many(self, keys: list[str]) -> dict:
+        """get_many without blocking the event loop on SQLite."""
+        if self._db is None:
+            return self.get_many(keys)
+        return await asyncio.to_thread(self.get_many, keys)
+
+    async def aput_many(self, items: dict):
+        """put_many without blocking the event loop on the SQLite commit."""
+        if self._db is None:
+            self.put_many(items)
+        else:
+            await asyncio.to_thread(self.put_many, items)
+
+    def preload(self, limit: int = None) -> int:
+        """
+        Copy the most recently written disk entries into the memory LRU (for
+        warmup), without touching the hit/miss counters. Returns how many.
+        """
+        if self._db is None:
+            return 0
+        limit = min(limit or self.max_items, self.max_items)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, vector FROM embeddings ORDER BY rowid DESC LIMIT ?", (limit,)
+            ).fetchall()
+            for key, blob in reversed(rows):  # oldest first, so the newest end up hottest
+                if key not in self._lru:
+                    self._remember(key, np.frombuffer(blob, dtype="float32"))
+        return len(rows)
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    # ---- Cached embedding ----
+    def embed_many(self, model: str, texts: list[str], compute,
+                   batch_size: int = None) -> list[list[float]]:
+        """
+        Return embeddings for texts, calling compute(misses) with the distinct
+        texts that are not cached yet, at most batch_size of them per call
+        (None = all in one call).
+        """
+        keys = [cache_key(model, t) for t in texts]
+        found = self.get_many(keys)
+
+        todo = {}  # key -> text, one entry per distinct miss
+        for key, text in zip(keys, texts):
+            if key not in found:
+                todo.setdefault(key, text)
+        if todo:
+            computed = {}
+            for chunk in _chunks(list(todo.items()), batch_size):
+                computed.update(zip([k for k, _ in chunk], compute([t for _, t in chunk])))
+            self.put_many(computed)
+            found.update({k: np.asarray(v, dtype="float32") for k, v in computed.items()})
+        return [found[key].tolist() for key in keys]
+
+    async def aembed_many(self, model: str, texts: list[str], acompute,
+                          batch_size: int = None) -> list[list[float]]:
+        """Async embed_many: awaits acompute(misses) instead of blocking on it."""
+        keys = [cache_key(model, t) for t in texts]
+        found = await self.aget_many(keys)
+
+        todo = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                todo.setdefault(key, text)
+        if todo:
+            computed = {}
+            for chunk in _chunks(list(todo.items()), batch_size):
+                computed.update(zip([k for k, _ in chunk], await acompute([t for _, t in chunk])))
+            await self.aput_many(computed)
+            found.update({k: np.asarray(v, dtype="float32") for k, v in computed.items()})
+        return [found[key].tolist() for key in keys]
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._lru),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
@@ -0,0 +1,111 @@
+# backend/services/embedding_dispatcher.py
+"""
+Embedding Dispatcher
+--------------------
+Coalesces concurrent single-text embedding requests into batched provider
+calls. Each caller awaits its own vector; behind the scenes requests that
+arrive within `max_wait_ms` of each other (up to `max_batch_size` of them)
+share one API round-trip. Up to `max_in_flight` batches are sent at once:
+the next batch is collected while earlier ones are still waiting on the
+provider.
+"""
+
+import asyncio
+import logging
+import time
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+
+class EmbeddingDispatcher:
+    """
+    Micro-batching front end for an async `embed_batch(texts) -> vectors`.
+    Must be created and used inside one running event loop.
+    """
+
+    def __init__(self, embed_batch, max_batch_size: int = 64, max_wait_ms: float = 5.0,
+                 max_in_flight: int = 8):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker = None
+        self._slots = asyncio.Semaphore(max_in_flight)  # bounds concurrent provider calls
+        self._in_flight = set()                         # running batch tasks (kept referenced)
+        # Stats
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.batch_size_counts = {b: 0 for b in BATCH_SIZE_BUCKETS}
+
+    async def embed(self, text: str):
+        """Return the embedding for text, batched with concurrent callers."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until the batch is full or the window closes."""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            await self._slots.acquire()
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: list):
+        """One provider round-trip for batch; resolves every caller's future."""
+        try:
+            # Identical texts in one window are embedded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            self._record_batch(len(texts))
+            try:
+                vectors = dict(zip(texts, await self.embed_batch(texts)))
+            except Exception as e:
+                logging.exception("Batched embedding request failed (%d texts)", len(texts))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectors[text])
+        finally:
+            self._slots.release()
+
+    def _record_batch(self, size: int):
+        self.batches += 1
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_counts[bucket] += 1
+                return
+        self.batch_size_counts[BATCH_SIZE_BUCKETS[-1]] += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+            "batches_in_flight": len(self._in_flight),
+            "max_queue_depth": self.max_queue_depth,
+            "batch_size_histogram": {f"le_{b}": n for b, n in self.batch_size_counts.items()},
+        }
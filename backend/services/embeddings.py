@@ -2,20 +2,67 @@
 """
 Embeddings Service
 ------------------
-Converts text into embeddings (vector representation) using OpenAI API.
+Converts text into embeddings (vector representation) using the configured
+embedding backend (OpenAI API, local CPU model or mock; see
+services/embedding_backends.py and EMBEDDING_PROVIDER).
 These embeddings are later stored in FAISS / Pinecone for semantic search.
 """
 
+import asyncio
 import os
 import logging
-from openai import OpenAI
+import weakref
+from pathlib import Path
 
-# Create OpenAI client (requires OPENAI_API_KEY in your environment)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import numpy as np
 
-# Choose embedding model
-EMBEDDING_MODEL = "text-embedding-ada-002"  # hackathon friendly (fast + cheap)
+from .embedding_backends import get_backend
+from .embedding_cache import EmbeddingCache, cache_key
+from .embedding_dispatcher import EmbeddingDispatcher
+from .metrics import EMBEDDING_REQUESTS, EMBEDDINGS_ISSUED, REGISTRY, timed
 
+# Provider chosen by EMBEDDING_PROVIDER ("openai" when OPENAI_API_KEY is set, else "mock")
+backend = get_backend()
+
+# Model name (part of the cache key) and dimension of the configured backend
+EMBEDDING_MODEL = backend.model
+EMBEDDING_DIM = backend.dim
+
+# Max number of inputs the provider accepts in one request
+MAX_BATCH_SIZE = backend.max_batch_size
+
+# Embedding cache: in-process LRU + SQLite file (set EMBEDDING_CACHE_PATH="" for memory only)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10_000))
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    str(Path(__file__).resolve().parents[2] / "data" / "embedding_cache.sqlite"),
+)
+cache = EmbeddingCache(max_items=EMBEDDING_CACHE_SIZE, path=EMBEDDING_CACHE_PATH or None)
+REGISTRY.callback(
+    "secondbrain_embedding_cache_lookups_total", "counter", "Embedding cache lookups by result",
+    lambda: {"memory_hit": cache.memory_hits, "disk_hit": cache.disk_hits, "miss": cache.misses},
+    labelnames=("result",),
+)
+
+# Micro-batching of concurrent aembed_text calls (one dispatcher per event loop)
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", 64))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5))
+EMBED_BATCHES_IN_FLIGHT = int(os.getenv("EMBED_BATCHES_IN_FLIGHT", 8))  # concurrent provider calls
+_dispatchers = weakref.WeakKeyDictionary()
+
+def _request_embeddings(texts: list[str]):
+    """One provider round-trip for the given texts (cache misses only)."""
+    EMBEDDING_REQUESTS.inc()
+    EMBEDDINGS_ISSUED.inc(len(texts))
+    return backend.embed(texts)
+
+async def _arequest_embeddings(texts: list[str]):
+    """Async provider round-trip; does not block the event loop."""
+    EMBEDDING_REQUESTS.inc()
+    EMBEDDINGS_ISSUED.inc(len(texts))
+    return await backend.aembed(texts)
+
+@timed("embed")
 def embed_text(text: str):
     """
     Convert input text into an embedding vector.
@@ -30,18 +77,17 @@ def embed_text(text: str):
         raise ValueError("Cannot embed empty text")
 
     try:
-        response = client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
-        )
-        return response.data[0].embedding
+        return cache.embed_many(EMBEDDING_MODEL, [text], _request_embeddings)[0]
     except Exception as e:
         logging.exception("Embedding generation failed for text: %s", text)
         raise
 
+@timed("embed")
 def embed_batch(texts: list[str]):
     """
     Generate embeddings for a list of texts.
+    Cached texts are served locally; only the misses go to the API, in
+    requests of at most MAX_BATCH_SIZE texts.
     
     Args:
         texts (list[str]): Multiple input texts.
@@ -53,11 +99,68 @@ def embed_batch(texts: list[str]):
         return []
 
     try:
-        response = client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=texts
+        return cache.embed_many(EMBEDDING_MODEL, texts, _request_embeddings, MAX_BATCH_SIZE)
+    except Exception as e:
+        logging.exception("Batch embedding generation failed")
+        raise
+
+def _dispatcher() -> EmbeddingDispatcher:
+    loop = asyncio.get_running_loop()
+    dispatcher = _dispatchers.get(loop)
+    if dispatcher is None:
+        dispatcher = EmbeddingDispatcher(
+            lambda texts: _arequest_embeddings(texts),
+            max_batch_size=EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=EMBED_BATCH_MAX_WAIT_MS,
+            max_in_flight=EMBED_BATCHES_IN_FLIGHT,
         )
-        return [item.embedding for item in response.data]
+        _dispatchers[loop] = dispatcher
+    return dispatcher
+
+@timed("embed")
+async def aembed_text(text: str):
+    """
+    Async version of embed_text for use inside request handlers.
+    Cache misses from concurrent callers are coalesced into one batched
+    API request by the embedding dispatcher.
+    """
+    if not text or not text.strip():
+        raise ValueError("Cannot embed empty text")
+
+    try:
+        key = cache_key(EMBEDDING_MODEL, text)
+        hit = (await cache.aget_many([key])).get(key)
+        if hit is not None:
+            return hit.tolist()
+        vector = np.asarray(await _dispatcher().embed(text), dtype="float32")
+        await cache.aput_many({key: vector})
+        return vector.tolist()
+    except Exception as e:
+        logging.exception("Embedding generation failed for text: %s", text)
+        raise
+
+@timed("embed")
+async def aembed_batch(texts: list[str]):
+    """
+    Async version of embed_batch for use inside request handlers.
+    """
+    if not texts:
+        return []
+
+    try:
+        return await cache.aembed_many(EMBEDDING_MODEL, texts, _arequest_embeddings, MAX_BATCH_SIZE)
     except Exception as e:
         logging.exception("Batch embedding generation failed")
         raise
+
+def embedding_cache_stats() -> dict:
+    """Hit/miss counters of the embedding cache."""
+    return cache.stats()
+
+def embedding_dispatcher_stats() -> dict:
+    """Queue depth and batch-size histogram of the micro-batching dispatcher."""
+    try:
+        dispatcher = _dispatchers.get(asyncio.get_running_loop())
+    except RuntimeError:
+        dispatcher = None
+    return dispatcher.stats() if dispatcher is not None else {}
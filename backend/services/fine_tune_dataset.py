@@ -0,0 +1,409 @@
+# backend/services/fine_tune_dataset.py
+"""
+Fine-tune Dataset Builder
+-------------------------
+Turns a user's memories into chat-format training examples
+({"messages": [user question, assistant answer]}), incrementally:
+
+  • Watermark – the highest memory id already exported is kept in the user's
+                IngestCheckpoint, so a build only reads memories added since
+                the last one (memory ids only grow)
+  • Dedup     – every example is hashed; hashes already exported (by this or
+                any earlier build) are skipped
+  • Shards    – each batch of new memories becomes one JSONL part file,
+                written by a process pool while the next batch is prepared;
+                the dataset is the ordered list of part files
+  • Jobs      – builds run on a background thread (BuildQueue + DatasetBuildRunner)
+                that /trigger_fine_tune/ submits to and /fine_tune/builds/ reports on
+
+A part file is committed together with its hashes and the new watermark, so a
+build interrupted by a restart is re-queued and redoes only unfinished parts.
+Memories edited after they were exported keep their id and are not exported again.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+from .ingest_pipeline import IngestCheckpoint, chunk_hash
+from .memory_store import iter_memories
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+FINE_TUNE_DIR = os.getenv("FINE_TUNE_DIR", str(DATA_DIR / "fine_tune"))
+FINE_TUNE_WORKERS = int(os.getenv("FINE_TUNE_WORKERS", min(4, os.cpu_count() or 1)))
+FINE_TUNE_SHARD_MEMORIES = int(os.getenv("FINE_TUNE_SHARD_MEMORIES", 10_000))  # memories per part file
+
+_WATERMARK = "watermark"
+_PART_PREFIX = "part:"
+
+# Texts written by data_ingestion.ingest_sample_data
+_HABIT_RE = re.compile(r"^Habit: (?P<habit>.+) at (?P<time>\S+) \((?P<frequency>[^)]+)\)$")
+_EVENT_RE = re.compile(r"^Event: (?P<title>.+) on (?P<date>\S+) at (?P<time>\S+)$")
+
+
+# ---- Examples ----
+def _chat(question: str, answer: str) -> dict:
+    return {"messages": [{"role": "user", "content": question},
+                         {"role": "assistant", "content": answer}]}
+
+
+def memory_example(text: str) -> dict:
+    """Q&A training example for one memory (None for empty memories)."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    habit = _HABIT_RE.match(text)
+    if habit:
+        name = habit["habit"].lower()
+        return _chat(f"When do I usually {name}?",
+                     f"You usually {name} at {habit['time']} ({habit['frequency']}).")
+    event = _EVENT_RE.match(text)
+    if event:
+        return _chat(f"When is {event['title']}?",
+                     f"{event['title']} is on {event['date']} at {event['time']}.")
+    return _chat(f"What do I need to remember about: {text[:20]}...", text)
+
+
+def example_hash(example: dict) -> bytes:
+    return chunk_hash(json.dumps(example, ensure_ascii=False, sort_keys=True))
+
+
+# ---- Worker-process task (must be picklable, module level) ----
+def _write_part(path: str, examples: list[dict]) -> int:
+    """Write one part file atomically; returns its size in bytes."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for example in examples:
+            f.write(json.dumps(example, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+# ---- Persistent build queue ----
+class BuildQueue:
+    """SQLite-backed queue of dataset builds; safe to share between threads."""
+
+    _COLUMNS = ("id", "user_id", "status", "error", "created", "started", "finished",
+                "after_id", "last_id", "memories", "examples", "duplicates", "parts", "bytes")
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS builds (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    error TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    after_id INTEGER,
+                    last_id INTEGER,
+                    memories INTEGER NOT NULL DEFAULT 0,
+                    examples INTEGER NOT NULL DEFAULT 0,
+                    duplicates INTEGER NOT NULL DEFAULT 0,
+                    parts INTEGER NOT NULL DEFAULT 0,
+                    bytes INTEGER NOT NULL DEFAULT 0
+                )""")
+            self._db.commit()
+
+    def submit(self, user_id: str) -> int:
+        """Queue a build for user_id, or return the one already waiting for them."""
+        with self._lock:
+            row = self._db.execute("SELECT id FROM builds WHERE user_id = ? AND status = 'queued'",
+                                   (user_id,)).fetchone()
+            if row is not None:
+                return row[0]
+            cur = self._db.execute("INSERT INTO builds (user_id, created) VALUES (?, ?)",
+                                   (user_id, time.time()))
+            self._db.commit()
+            return cur.lastrowid
+
+    def claim(self, build_id: int = None) -> dict:
+        """Mark the oldest queued build (or build_id) as running and return it (None if idle)."""
+        with self._lock:
+            if build_id is None:
+                row = self._db.execute(
+                    "SELECT id FROM builds WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            else:
+                row = self._db.execute("SELECT id FROM builds WHERE id = ? AND status = 'queued'",
+                                       (build_id,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE builds SET status = 'running', started = COALESCE(started, ?)"
+                             " WHERE id = ?", (time.time(), row[0]))
+            self._db.commit()
+        return self.get(row[0])
+
+    def requeue_interrupted(self) -> int:
+        """Put builds left 'running' by a crash back in the queue."""
+        with self._lock:
+            cur = self._db.execute("UPDATE builds SET status = 'queued' WHERE status = 'running'")
+            self._db.commit()
+            return cur.rowcount
+
+    def set(self, build_id: int, **fields):
+        sets = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE builds SET {sets} WHERE id = ?", (*fields.values(), build_id))
+            self._db.commit()
+
+    def progress(self, build_id: int, **counters):
+        """Add to the build's counters (memories, examples, duplicates, parts, bytes)."""
+        sets = ", ".join(f"{name} = {name} + ?" for name in counters)
+        with self._lock:
+            self._db.execute(f"UPDATE builds SET {sets} WHERE id = ?", (*counters.values(), build_id))
+            self._db.commit()
+
+    def finish(self, build_id: int, error: str = None):
+        with self._lock:
+            self._db.execute("UPDATE builds SET status = ?, error = ?, finished = ? WHERE id = ?",
+                             ("failed" if error else "done", error, time.time(), build_id))
+            self._db.commit()
+
+    def get(self, build_id: int) -> dict:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM builds WHERE id = ?",
+                                   (build_id,)).fetchone()
+        return None if row is None else _with_elapsed(dict(zip(self._COLUMNS, row)))
+
+    def list(self, user_id: str = None, limit: int = 50) -> list[dict]:
+        query = f"SELECT {', '.join(self._COLUMNS)} FROM builds"
+        args = ()
+        if user_id is not None:
+            query += " WHERE user_id = ?"
+            args = (user_id,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY id DESC LIMIT ?", (*args, limit)).fetchall()
+        return [_with_elapsed(dict(zip(self._COLUMNS, row))) for row in rows]
+
+
+def _with_elapsed(build: dict) -> dict:
+    end = build["finished"] or time.time()
+    build["elapsed_seconds"] = end - build["started"] if build["started"] else 0.0
+    return build
+
+
+# ---- Runner ----
+class DatasetBuildRunner:
+    """
+    Background thread that runs queued builds one at a time. Part files are
+    written by `workers` processes (inline when workers == 1); commits happen
+    in order on this thread.
+    """
+
+    def __init__(self, builds: BuildQueue, out_dir, workers: int = FINE_TUNE_WORKERS,
+                 shard_memories: int = FINE_TUNE_SHARD_MEMORIES, poll_seconds: float = 0.5):
+        self.builds = builds
+        self.out_dir = Path(out_dir)
+        self.workers = max(1, workers)
+        self.shard_memories = shard_memories
+        self.poll_seconds = poll_seconds
+        self._pool = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.builds.requeue_interrupted()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="fine-tune-builds")
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def notify(self):
+        """Wake the runner now instead of at the next poll."""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            build = self.builds.claim()
+            if build is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self.run(build)
+
+    def run(self, build: dict):
+        """Run one claimed build and record its outcome."""
+        try:
+            self.run_build(build)
+            self.builds.finish(build["id"])
+        except Exception as e:
+            logging.exception("Fine-tune dataset build %s failed", build["id"])
+            self.builds.finish(build["id"], error=str(e))
+
+    def _submit(self, path: Path, examples: list[dict]) -> Future:
+        if self.workers == 1:
+            future = Future()
+            future.set_result(_write_part(str(path), examples))
+            return future
+        if self._pool is None:
+            # spawn: forking a process that runs FAISS / HTTP client threads is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool.submit(_write_part, str(path), examples)
+
+    def run_build(self, build: dict):
+        user_id = build["user_id"]
+        user_dir = _user_dir(self.out_dir, user_id)
+        user_dir.mkdir(parents=True, exist_ok=True)
+        checkpoint = IngestCheckpoint(user_dir / "state.sqlite")
+        try:
+            watermark = checkpoint.offset(_WATERMARK) - 1  # stored +1 so "unset" (0) means -1
+            self._remove_orphans(user_dir, checkpoint)
+            self.builds.set(build["id"], after_id=watermark, last_id=watermark)
+
+            in_flight = deque()
+            pending = set()  # hashes of examples in parts not committed yet
+            for records in iter_memories(user_id, after_id=watermark, batch_size=self.shard_memories):
+                examples = {}
+                for record in records:
+                    example = memory_example(record["text"])
+                    if example is not None:
+                        examples.setdefault(example_hash(example), example)
+                made = sum(1 for r in records if (r["text"] or "").strip())
+                already = checkpoint.seen(list(examples)) | pending
+                keep = [h for h in examples if h not in already]
+                pending.update(keep)
+
+                name = f"part-{records[0]['id']:012d}-{records[-1]['id']:012d}.jsonl"
+                future = self._submit(user_dir / name, [examples[h] for h in keep]) if keep else None
+                in_flight.append((build["id"], name, records[-1]["id"], len(records), keep,
+                                  made - len(keep), future))
+                while len(in_flight) >= 2 * self.workers:
+                    self._commit(checkpoint, pending, *in_flight.popleft())
+            while in_flight:
+                self._commit(checkpoint, pending, *in_flight.popleft())
+        finally:
+            checkpoint.close()
+
+    def _commit(self, checkpoint, pending, build_id, name, last_id, memories, hashes, duplicates,
+                future):
+        """Record a written part, its example hashes and the new watermark in one transaction."""
+        size = future.result() if future is not None else 0
+        offsets = {_WATERMARK: last_id + 1}
+        if future is not None:
+            offsets[_PART_PREFIX + name] = len(hashes)
+        checkpoint.commit(hashes, offsets)
+        pending.difference_update(hashes)
+        self.builds.set(build_id, last_id=last_id)
+        self.builds.progress(build_id, memories=memories, examples=len(hashes),
+                             duplicates=duplicates, parts=int(future is not None), bytes=size)
+
+    def _remove_orphans(self, user_dir: Path, checkpoint: IngestCheckpoint):
+        """Delete part files an interrupted build wrote but never committed."""
+        committed = _parts(checkpoint)
+        for path in user_dir.glob("part-*.jsonl*"):
+            if path.name not in committed:
+                path.unlink()
+
+
+def _user_dir(out_dir, user_id: str) -> Path:
+    # quote() keeps ids readable on disk while preventing path traversal
+    return Path(out_dir) / quote(user_id, safe="")
+
+
+def _parts(checkpoint: IngestCheckpoint) -> dict:
+    """{part file name: example count}; zero-padded ids make name order memory order."""
+    parts = checkpoint.offsets(_PART_PREFIX)
+    return {key[len(_PART_PREFIX):]: parts[key] for key in sorted(parts)}
+
+
+# ---- Module-level service (used by the API and fine_tune/prepare_dataset.py) ----
+_builds: BuildQueue = None
+_runner: DatasetBuildRunner = None
+_service_lock = threading.Lock()
+
+
+def _service() -> tuple[BuildQueue, DatasetBuildRunner]:
+    global _builds, _runner
+    with _service_lock:
+        if _runner is None:
+            _builds = BuildQueue(Path(FINE_TUNE_DIR) / "builds.sqlite")
+            _runner = DatasetBuildRunner(_builds, FINE_TUNE_DIR)
+            _runner.start()
+        return _builds, _runner
+
+
+def submit_build(user_id: str) -> int:
+    """Queue an incremental dataset build for user_id; returns the build id."""
+    builds, runner = _service()
+    build_id = builds.submit(user_id)
+    runner.notify()
+    return build_id
+
+
+def get_build(build_id: int) -> dict:
+    return _service()[0].get(build_id)
+
+
+def list_builds(user_id: str = None) -> list[dict]:
+    return _service()[0].list(user_id)
+
+
+def build_dataset(user_id: str, out_dir=None, workers: int = FINE_TUNE_WORKERS) -> dict:
+    """Run one incremental build in this thread (for scripts); returns the build record."""
+    out_dir = Path(out_dir or FINE_TUNE_DIR)
+    builds = BuildQueue(out_dir / "builds.sqlite")
+    runner = DatasetBuildRunner(builds, out_dir, workers=workers)
+    try:
+        build_id = builds.submit(user_id)
+        build = builds.claim(build_id)
+        if build is None:  # already being built by the server's runner
+            return builds.get(build_id)
+        runner.run(build)
+        return builds.get(build_id)
+    finally:
+        runner.stop()
+
+
+def _parts_of(user_id: str, out_dir=None) -> dict:
+    user_dir = _user_dir(out_dir or FINE_TUNE_DIR, user_id)
+    if not (user_dir / "state.sqlite").exists():
+        return {}
+    checkpoint = IngestCheckpoint(user_dir / "state.sqlite")
+    try:
+        return {user_dir / name: n for name, n in _parts(checkpoint).items()}
+    finally:
+        checkpoint.close()
+
+
+def dataset_files(user_id: str, out_dir=None) -> list[Path]:
+    """Part files making up user_id's dataset, in order."""
+    return list(_parts_of(user_id, out_dir))
+
+
+def export_dataset(user_id: str, path, out_dir=None) -> int:
+    """Concatenate user_id's part files into one JSONL file; returns its example count."""
+    parts = _parts_of(user_id, out_dir)
+    with open(path, "wb") as out:
+        for part in parts:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out)
+    return sum(parts.values())
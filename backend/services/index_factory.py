@@ -0,0 +1,201 @@
+# backend/services/index_factory.py
+"""
+Index Factory
+-------------
+Builds the FAISS index tiers a shard can use once it grows past the
+point where a brute-force IndexFlatL2 scan is the bottleneck:
+
+  • "flat"     – exact search, no training (default, always used for small shards)
+  • "ivf_flat" – inverted file over k-means cells, exact distances inside a cell
+  • "hnsw"     – graph index, no training but slower to build
+  • "ivf_pq"   – inverted file + product quantization (smallest memory footprint)
+
+Recall/latency at query time is tuned with nprobe (IVF) and ef_search (HNSW).
+
+Every tier can compare vectors by one of three metrics:
+  • "l2"     – squared Euclidean distance (default)
+  • "ip"     – inner product (maximum inner product search)
+  • "cosine" – inner product of vectors normalized to unit length; callers
+               normalize at insert and query time with prepare_vectors()
+
+Search results are reported as a distance (smaller = closer) whatever the
+metric, so rankings, caches and thresholds work the same way for all three.
+
+Indexes are not modified once searches can see them: a shard searches
+several immutable index segments plus its recent rows (brute-forced with
+knn()), and merge_results() combines the parts into one top-k.
+"""
+
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+METRICS = ("l2", "ip", "cosine")
+
+# Query-time defaults, set on the index when it is built
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+
+HNSW_M = 32               # graph neighbours per node
+PQ_BITS = 8               # bits per PQ sub-code
+MIN_POINTS_PER_CELL = 39  # FAISS k-means needs ~39 training points per centroid
+MAX_TRAIN_POINTS = 100_000
+
+
+def _nlist(n: int) -> int:
+    """Number of IVF cells for a shard of n vectors (~4·sqrt(n), bounded by training size)."""
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CELL))
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest m <= dim/4 that divides dim (each sub-vector gets >= 4 dims)."""
+    for m in range(max(1, dim // 4), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+# ---- Metrics ----
+def faiss_metric(metric: str) -> int:
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+    return faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT
+
+
+def prepare_vectors(vectors, metric: str) -> np.ndarray:
+    """Contiguous float32 copy of vectors, unit-normalized for the cosine metric."""
+    vectors = np.array(vectors, dtype="float32", ndmin=2)
+    if metric == "cosine":
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+    return vectors
+
+
+def to_distances(values: np.ndarray, metric: str) -> np.ndarray:
+    """FAISS search values -> distances (smaller = closer) for metric."""
+    if metric == "l2":
+        return values
+    if metric == "cosine":
+        return 1.0 - values  # cosine distance
+    return -values
+
+
+def similarity(distance: float, metric: str) -> float:
+    """Relevance score for a distance: 1 / (1 + d) for l2, the similarity itself otherwise."""
+    if metric == "l2":
+        return 1.0 / (1.0 + distance)
+    if metric == "cosine":
+        return 1.0 - distance
+    return -distance
+
+
+def vector_distances(vectors: np.ndarray, query: np.ndarray, metric: str) -> np.ndarray:
+    """Distance of every row of vectors to query, as a search would report it."""
+    vectors = prepare_vectors(vectors, metric)
+    query = prepare_vectors(query, metric)[0]
+    if metric == "l2":
+        return ((vectors - query) ** 2).sum(axis=1)
+    return to_distances(vectors @ query, metric)
+
+
+# ---- Index tiers ----
+def build_index(index_type: str, dim: int, n: int, metric: str = "l2"):
+    """
+    Create an empty (untrained) index of index_type sized for n vectors.
+    """
+    faiss_metric_type = faiss_metric(metric)
+    if index_type == "flat":
+        return faiss.IndexFlat(dim, faiss_metric_type)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss_metric_type)
+        index.hnsw.efSearch = DEFAULT_EF_SEARCH
+        return index
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(faiss.IndexFlat(dim, faiss_metric_type), dim, _nlist(n),
+                                   faiss_metric_type)
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(faiss.IndexFlat(dim, faiss_metric_type), dim, _nlist(n),
+                                 _pq_subquantizers(dim), PQ_BITS, faiss_metric_type)
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    index.nprobe = min(DEFAULT_NPROBE, index.nlist)
+    return index
+
+
+def train_index(index, vectors: np.ndarray, seed: int = 0):
+    """Train index on (a sample of) vectors; no-op for indexes that need no training."""
+    if index.is_trained:
+        return
+    if len(vectors) > MAX_TRAIN_POINTS:
+        rows = np.sort(np.random.default_rng(seed).choice(len(vectors), MAX_TRAIN_POINTS, replace=False))
+        vectors = vectors[rows]
+    index.train(np.ascontiguousarray(vectors, dtype="float32"))
+
+
+def knn(query: np.ndarray, vectors: np.ndarray, k: int, metric: str):
+    """
+    Exact (values, positions) of query's k nearest rows of vectors, in the
+    same form as an index search (padded with -1 past len(vectors)).
+    """
+    nq = len(query)
+    if len(vectors) == 0 or k <= 0:
+        return (np.full((nq, max(k, 0)), np.nan, dtype="float32"),
+                np.full((nq, max(k, 0)), -1, dtype=np.int64))
+    return faiss.knn(query, np.ascontiguousarray(vectors, dtype="float32"),
+                     min(k, len(vectors)), metric=faiss_metric(metric))
+
+
+def merge_results(results: list, k: int, metric: str):
+    """
+    Merge per-part (values, rows) search results into one top-k (values, rows),
+    best first; -1 rows are padding and sort last.
+    """
+    values = np.concatenate([v for v, _ in results], axis=1)
+    rows = np.concatenate([r for _, r in results], axis=1)
+    keys = np.where(rows >= 0, to_distances(values, metric), np.inf)
+    order = np.argsort(keys, axis=1, kind="stable")[:, :k]
+    values = np.take_along_axis(values, order, axis=1)
+    rows = np.take_along_axis(rows, order, axis=1)
+    if rows.shape[1] < k:
+        pad = k - rows.shape[1]
+        values = np.pad(values, ((0, 0), (0, pad)), constant_values=np.nan)
+        rows = np.pad(rows, ((0, 0), (0, pad)), constant_values=-1)
+    return values, rows
+
+
+def index_type_of(index) -> str:
+    """Inverse of build_index: which tier an (e.g. reloaded) index belongs to."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf_flat"
+    return "flat"
+
+
+def search_params(index, nprobe: int = None, ef_search: int = None, selector=None):
+    """
+    Per-query search parameters for index, or None to use its defaults.
+    Knobs that don't apply to the index type are ignored; selector (an
+    faiss.IDSelector) restricts the scan to the selected ids.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe is not None or selector is not None):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or index.hnsw.efSearch)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def bitmap_selector(mask: np.ndarray):
+    """
+    IDSelector accepting the rows where mask is True.
+    Returns (selector, bits); keep bits alive for as long as the selector is used.
+    """
+    bits = np.packbits(mask, bitorder="little")
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits)), bits
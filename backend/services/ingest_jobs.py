@@ -0,0 +1,427 @@
+# backend/services/ingest_jobs.py
+"""
+Ingestion Jobs
+--------------
+Background imports, so a big upload never runs inside an API request.
+
+  • JobQueue      – persistent SQLite queue of import jobs and their progress
+  • IngestJobRunner – one background thread that claims queued jobs; parsing,
+                    chunking and embedding fan out to a process pool, and the
+                    runner thread is the only writer into memory_store
+
+Text and JSONL files are split into byte-range segments that workers parse
+independently, so throughput scales with cores. JSON arrays cannot be split
+without parsing them, so the runner streams their records and only the
+chunking + embedding runs in the pool.
+
+Every finished segment is committed to a per-job IngestCheckpoint; a job
+interrupted by a restart is re-queued and skips the segments already done.
+"""
+
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .ingest_pipeline import (
+    IngestCheckpoint, INGEST_CHUNK_CHARS, INGEST_CHUNK_OVERLAP,
+    chunk_hash, chunk_text, iter_json_array, record_meta, record_text,
+)
+from .memory_store import add_memories
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+INGEST_JOBS_DIR = os.getenv("INGEST_JOBS_DIR", str(DATA_DIR / "ingest_jobs"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_SEGMENT_BYTES = int(os.getenv("INGEST_SEGMENT_BYTES", 1 << 20))
+# Jobs may only read files under this directory
+INGEST_ROOT = os.getenv("INGEST_ROOT", str(DATA_DIR))
+
+FORMATS = ("text", "jsonl", "json")
+_EXTENSION_FORMATS = {".txt": "text", ".md": "text", ".jsonl": "jsonl", ".json": "json"}
+
+_JSON_RECORDS_PER_TASK = 512
+
+
+# ---- Persistent queue ----
+class JobQueue:
+    """SQLite-backed job queue; safe to share between threads."""
+
+    _COLUMNS = ("id", "user_id", "path", "format", "options", "status", "error",
+                "created", "started", "finished", "total_bytes", "done_bytes",
+                "records", "chunks", "inserted", "duplicates")
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    options TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    error TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    total_bytes INTEGER NOT NULL DEFAULT 0,
+                    done_bytes INTEGER NOT NULL DEFAULT 0,
+                    records INTEGER NOT NULL DEFAULT 0,
+                    chunks INTEGER NOT NULL DEFAULT 0,
+                    inserted INTEGER NOT NULL DEFAULT 0,
+                    duplicates INTEGER NOT NULL DEFAULT 0
+                )""")
+            self._db.commit()
+
+    def submit(self, user_id: str, path, fmt: str, options: dict = None) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO jobs (user_id, path, format, options, created, total_bytes)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, str(path), fmt, json.dumps(options or {}), time.time(),
+                 os.path.getsize(path)),
+            )
+            self._db.commit()
+            return cur.lastrowid
+
+    def claim(self) -> dict:
+        """Mark the oldest queued job as running and return it (None if idle)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = 'running', started = COALESCE(started, ?)"
+                             " WHERE id = ?", (time.time(), row[0]))
+            self._db.commit()
+        return self.get(row[0])
+
+    def requeue_interrupted(self) -> int:
+        """Put jobs left 'running' by a crash back in the queue."""
+        with self._lock:
+            cur = self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._db.commit()
+            return cur.rowcount
+
+    def progress(self, job_id: int, **counters):
+        """Add to the job's counters (done_bytes, records, chunks, inserted, duplicates)."""
+        sets = ", ".join(f"{name} = {name} + ?" for name in counters)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {sets} WHERE id = ?", (*counters.values(), job_id))
+            self._db.commit()
+
+    def finish(self, job_id: int, error: str = None):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                             ("failed" if error else "done", error, time.time(), job_id))
+            self._db.commit()
+
+    def get(self, job_id: int) -> dict:
+        """Job row plus derived progress (fraction done, elapsed seconds, throughput)."""
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?",
+                                   (job_id,)).fetchone()
+        return None if row is None else _with_progress(dict(zip(self._COLUMNS, row)))
+
+    def list(self, user_id: str = None, limit: int = 50) -> list[dict]:
+        query = f"SELECT {', '.join(self._COLUMNS)} FROM jobs"
+        args = ()
+        if user_id is not None:
+            query += " WHERE user_id = ?"
+            args = (user_id,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY id DESC LIMIT ?", (*args, limit)).fetchall()
+        return [_with_progress(dict(zip(self._COLUMNS, row))) for row in rows]
+
+
+def _with_progress(job: dict) -> dict:
+    job["options"] = json.loads(job["options"])
+    end = job["finished"] or time.time()
+    elapsed = end - job["started"] if job["started"] else 0.0
+    job["progress"] = job["done_bytes"] / job["total_bytes"] if job["total_bytes"] else 1.0
+    job["elapsed_seconds"] = elapsed
+    job["memories_per_second"] = job["inserted"] / elapsed if elapsed else 0.0
+    return job
+
+
+# ---- Worker-process tasks (must be picklable, module level) ----
+def _segment_lines(path, start: int, end: int):
+    """Lines that start inside [start, end)."""
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()  # finish the line that straddles start (owned by the previous segment)
+        while f.tell() < end:
+            raw = f.readline()
+            if not raw:
+                return
+            yield raw
+
+
+def _chunk_and_embed(records, chunk_chars: int, overlap: int):
+    """
+    records: (text, meta) pairs. Returns (texts, metas, hashes, vectors) for
+    their chunks, deduplicated within the task.
+    """
+    from .embeddings import embed_batch, MAX_BATCH_SIZE
+
+    texts, metas, hashes, seen = [], [], [], set()
+    for text, meta in records:
+        for chunk in chunk_text(text, chunk_chars, overlap):
+            digest = chunk_hash(chunk)
+            if digest in seen:
+                continue
+            seen.add(digest)
+            texts.append(chunk)
+            metas.append(meta)
+            hashes.append(digest)
+    vectors = np.empty((0, 0), dtype="float32")
+    if texts:
+        vectors = np.concatenate([
+            np.asarray(embed_batch(texts[i:i + MAX_BATCH_SIZE]), dtype="float32")
+            for i in range(0, len(texts), MAX_BATCH_SIZE)
+        ])
+    return texts, metas, hashes, vectors
+
+
+def _process_segment(path, fmt: str, start: int, end: int, options: dict, base_meta: dict,
+                     chunk_chars: int, overlap: int):
+    """Parse, chunk and embed the records of one byte range of a text / JSONL file."""
+    records = []
+    for raw in _segment_lines(path, start, end):
+        if not raw.strip():
+            continue
+        if fmt == "jsonl":
+            obj = json.loads(raw)
+            text = record_text(obj, options.get("text_field", "text"), None)
+            meta = {**base_meta, **record_meta(obj, options.get("timestamp_field", "timestamp"))}
+            if isinstance(obj, dict) and obj.get("source"):
+                meta["source"] = obj["source"]
+        else:
+            text, meta = raw.decode("utf-8", errors="replace").strip(), base_meta
+        records.append((text, meta))
+    return (len(records),) + _chunk_and_embed(records, chunk_chars, overlap)
+
+
+def _process_records(records, chunk_chars: int, overlap: int):
+    return (len(records),) + _chunk_and_embed(records, chunk_chars, overlap)
+
+
+# ---- Runner ----
+class IngestJobRunner:
+    """
+    Background thread that runs queued jobs one at a time. Each job's
+    parsing and embedding fans out to `workers` processes; inserts happen
+    only on this thread.
+    """
+
+    def __init__(self, jobs: JobQueue, workdir, workers: int = INGEST_WORKERS,
+                 segment_bytes: int = INGEST_SEGMENT_BYTES,
+                 chunk_chars: int = INGEST_CHUNK_CHARS, overlap: int = INGEST_CHUNK_OVERLAP,
+                 poll_seconds: float = 0.5):
+        self.jobs = jobs
+        self.workdir = Path(workdir)
+        self.workers = max(1, workers)
+        self.segment_bytes = segment_bytes
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self.poll_seconds = poll_seconds
+        self._pool = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.jobs.requeue_interrupted()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="ingest-jobs")
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def notify(self):
+        """Wake the runner now instead of at the next poll."""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            job = self.jobs.claim()
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            try:
+                self.run_job(job)
+                self.jobs.finish(job["id"])
+            except Exception as e:
+                logging.exception("Ingestion job %s failed", job["id"])
+                self.jobs.finish(job["id"], error=str(e))
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs FAISS / HTTP client threads is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def run_job(self, job: dict):
+        checkpoint = IngestCheckpoint(self.workdir / f"job-{job['id']}.checkpoint.sqlite")
+        try:
+            base_meta = {"user_id": job["user_id"],
+                         "source": job["options"].get("source") or Path(job["path"]).stem,
+                         "timestamp": datetime.datetime.utcnow().isoformat()}
+            if job["format"] == "json":
+                tasks = self._json_tasks(job, checkpoint, base_meta)
+            else:
+                tasks = self._segment_tasks(job, checkpoint, base_meta)
+            self._write_results(job, checkpoint, tasks)
+        finally:
+            checkpoint.close()
+
+    def _segment_tasks(self, job, checkpoint, base_meta):
+        """Yield (checkpoint key, offset, done_bytes, submit()) for every unfinished segment."""
+        size = job["total_bytes"]
+        for start in range(0, size, self.segment_bytes):
+            end = min(start + self.segment_bytes, size)
+            key = f"segment:{start}"
+            if checkpoint.offset(key):
+                continue
+            yield key, end, end - start, lambda start=start, end=end: self._executor().submit(
+                _process_segment, job["path"], job["format"], start, end, job["options"],
+                base_meta, self.chunk_chars, self.overlap)
+
+    def _json_tasks(self, job, checkpoint, base_meta):
+        """Stream a JSON array here and ship its records to the pool in batches."""
+        options = job["options"]
+        start = checkpoint.offset("json")
+        done = start
+        batch, offset = [], start
+        for obj, offset in iter_json_array(job["path"], start, options.get("items_key")):
+            meta = {**base_meta, **record_meta(obj, options.get("timestamp_field", "timestamp"))}
+            batch.append((record_text(obj, options.get("text_field", "text"), None), meta))
+            if len(batch) == _JSON_RECORDS_PER_TASK:
+                yield "json", offset, offset - done, \
+                    lambda records=batch: self._executor().submit(
+                        _process_records, records, self.chunk_chars, self.overlap)
+                batch, done = [], offset
+        if batch:
+            yield "json", offset, offset - done, lambda records=batch: self._executor().submit(
+                _process_records, records, self.chunk_chars, self.overlap)
+        # Trailing bytes after the last element (closing brackets)
+        job_rest = job["total_bytes"] - offset
+        if job_rest > 0:
+            self.jobs.progress(job["id"], done_bytes=job_rest)
+
+    def _write_results(self, job, checkpoint, tasks):
+        """Keep 2 × workers tasks in flight; insert their results in order (single writer)."""
+        in_flight = deque()
+        tasks = iter(tasks)
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < 2 * self.workers:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                key, offset, nbytes, submit = task
+                in_flight.append((key, offset, nbytes, submit()))
+            if not in_flight:
+                return
+            key, offset, nbytes, future = in_flight.popleft()
+            records, texts, metas, hashes, vectors = future.result()
+
+            already = checkpoint.seen(hashes)
+            keep = [i for i, h in enumerate(hashes) if h not in already]
+            if keep:
+                add_memories([texts[i] for i in keep], vectors[keep], [metas[i] for i in keep],
+                             user_id=job["user_id"])
+            checkpoint.commit([hashes[i] for i in keep], {key: offset})
+            self.jobs.progress(job["id"], done_bytes=nbytes, records=records, chunks=len(texts),
+                               inserted=len(keep), duplicates=len(texts) - len(keep))
+
+
+# ---- Module-level service (used by the API) ----
+_jobs: JobQueue = None
+_runner: IngestJobRunner = None
+_service_lock = threading.Lock()
+
+
+def _service() -> tuple[JobQueue, IngestJobRunner]:
+    global _jobs, _runner
+    with _service_lock:
+        if _runner is None:
+            _jobs = JobQueue(Path(INGEST_JOBS_DIR) / "jobs.sqlite")
+            _runner = IngestJobRunner(_jobs, INGEST_JOBS_DIR)
+            _runner.start()
+        return _jobs, _runner
+
+
+def detect_format(path) -> str:
+    fmt = _EXTENSION_FORMATS.get(Path(path).suffix.lower())
+    if fmt is None:
+        raise ValueError(f"Unknown file type {Path(path).suffix!r}; pass format= one of {FORMATS}")
+    return fmt
+
+
+def submit_file_job(user_id: str, path, fmt: str = None, **options) -> int:
+    """
+    Queue an import of a file under INGEST_ROOT; returns the job id.
+    options: source, text_field, items_key (JSON arrays), timestamp_field.
+    """
+    root = Path(INGEST_ROOT).resolve()
+    path = Path(path)
+    path = (path if path.is_absolute() else root / path).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        raise ValueError(f"{path} is not a file under {root}")
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}, got {fmt!r}")
+    jobs, runner = _service()
+    job_id = jobs.submit(user_id, path, fmt, options)
+    runner.notify()
+    return job_id
+
+
+def submit_items_job(user_id: str, items: list[dict]) -> int:
+    """Queue an import of {"text", "source"} items (spooled to a JSONL file first)."""
+    jobs, runner = _service()
+    spool = Path(INGEST_JOBS_DIR) / "uploads" / f"{time.time_ns()}.jsonl"
+    spool.parent.mkdir(parents=True, exist_ok=True)
+    with open(spool, "w", encoding="utf-8") as f:
+        for item in items:
+            record = {"text": item.get("text", ""), "source": item.get("source") or "bulk"}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    job_id = jobs.submit(user_id, spool, "jsonl", {"source": "bulk"})
+    runner.notify()
+    return job_id
+
+
+def get_job(job_id: int) -> dict:
+    return _service()[0].get(job_id)
+
+
+def list_jobs(user_id: str = None) -> list[dict]:
+    return _service()[0].list(user_id)
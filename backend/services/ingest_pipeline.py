@@ -0,0 +1,446 @@
+# backend/services/ingest_pipeline.py
+"""
+Ingestion Pipeline
+------------------
+Streams large exports (chat archives, mailboxes, note vaults) into the
+memory store with constant memory:
+
+  readers ──▶ chunker ──▶ [queue] ──▶ dedup + batched embedding ──▶ [queue] ──▶ bulk insert
+  (stage 1: reader thread)            (stage 2: embed thread)                   (stage 3: caller)
+
+  • readers stream records from text, JSONL and (iteratively parsed) JSON
+    files and report the byte offset each record ends at
+  • long records are split into overlapping chunks
+  • chunks already ingested by this job (same normalized text) are skipped
+  • the queues between stages are bounded, so a slow embedding provider
+    pauses the readers instead of buffering the whole file
+
+Progress is committed to a SQLite checkpoint after every inserted batch
+(per-file offsets + hashes of the inserted chunks), so a crashed run
+started again with the same checkpoint resumes where it stopped. A crash
+between an insert and its checkpoint commit can repeat that one batch.
+"""
+
+import codecs
+import datetime
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from .embedding_cache import normalize_text
+from .embeddings import embed_batch, MAX_BATCH_SIZE
+from .memory_store import DEFAULT_USER, add_memories
+
+INGEST_CHUNK_CHARS = 1000     # max characters per memory chunk
+INGEST_CHUNK_OVERLAP = 200    # characters repeated between consecutive chunks of one record
+INGEST_BATCH_SIZE = min(MAX_BATCH_SIZE, 256)  # chunks per embedding call / insert
+INGEST_QUEUE_BATCHES = 4      # batches buffered between two stages
+
+_READ_SIZE = 1 << 16
+_SEPARATORS = re.compile(r"[ \t\r\n,]*")  # between the elements of a JSON array
+
+
+# ---- Readers ----
+class TextReader:
+    """Plain text file: one record per non-empty line (or per paragraph)."""
+
+    def __init__(self, path, source: str = "notes", paragraphs: bool = False):
+        self.path = Path(path)
+        self.source = source
+        self.paragraphs = paragraphs
+        self.key = f"text:{self.path.resolve()}"
+
+    def read(self, start: int = 0):
+        """Yield (text, meta, end_offset) for every record after byte offset start."""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset, para = start, []
+            for raw in f:
+                offset += len(raw)
+                line = raw.decode("utf-8", errors="replace").strip()
+                if not self.paragraphs:
+                    if line:
+                        yield line, {}, offset
+                elif line:
+                    para.append(line)
+                elif para:
+                    yield " ".join(para), {}, offset
+                    para = []
+            if para:
+                yield " ".join(para), {}, offset
+
+
+class JsonlReader:
+    """JSON Lines file: one record per line, text taken from text_field (or formatter(obj))."""
+
+    def __init__(self, path, source: str = "jsonl", text_field: str = "text", formatter=None,
+                 timestamp_field: str = "timestamp"):
+        self.path = Path(path)
+        self.source = source
+        self.text_field = text_field
+        self.formatter = formatter
+        self.timestamp_field = timestamp_field
+        self.key = f"jsonl:{self.path.resolve()}"
+
+    def read(self, start: int = 0):
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                offset += len(raw)
+                if not raw.strip():
+                    continue
+                obj = json.loads(raw)
+                yield record_text(obj, self.text_field, self.formatter), \
+                    record_meta(obj, self.timestamp_field), offset
+
+
+class JsonArrayReader:
+    """
+    JSON file holding an array of records, parsed incrementally so the file
+    is never loaded whole. items_key names the array when it is a value of
+    the top-level object (e.g. {"events": [...]}).
+    """
+
+    def __init__(self, path, source: str = "json", items_key: str = None,
+                 text_field: str = "text", formatter=None, timestamp_field: str = "timestamp"):
+        self.path = Path(path)
+        self.source = source
+        self.items_key = items_key
+        self.text_field = text_field
+        self.formatter = formatter
+        self.timestamp_field = timestamp_field
+        self.key = f"json:{self.path.resolve()}:{items_key or ''}"
+
+    def read(self, start: int = 0):
+        for obj, offset in iter_json_array(self.path, start, self.items_key):
+            yield record_text(obj, self.text_field, self.formatter), \
+                record_meta(obj, self.timestamp_field), offset
+
+
+def record_text(obj, text_field, formatter) -> str:
+    if formatter is not None:
+        return formatter(obj)
+    return (obj.get(text_field) or "") if isinstance(obj, dict) else str(obj)
+
+
+def record_meta(obj, timestamp_field) -> dict:
+    if isinstance(obj, dict) and obj.get(timestamp_field) is not None:
+        return {"timestamp": obj[timestamp_field]}
+    return {}
+
+
+def iter_json_array(path, start: int = 0, items_key: str = None):
+    """
+    Yield (element, end_offset) for the elements of a JSON array, reading
+    the file in fixed-size blocks. start is 0 or an end_offset returned
+    earlier (to resume after that element).
+
+    Elements are decoded in place at a position in the block buffer, which
+    is only trimmed when the next block is read, so parsing stays linear in
+    the file size however small the elements are.
+    """
+    raw_decode = json.JSONDecoder().raw_decode
+    skip = _SEPARATORS.match
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        f.seek(start)
+        buf, pos, offset, eof = "", 0, start, False  # offset: file byte offset of buf[pos]
+        ascii_only = True  # buf's characters are its bytes
+
+        def more():
+            nonlocal buf, pos, eof, ascii_only
+            block = f.read(_READ_SIZE)
+            eof = not block
+            buf = buf[pos:] + utf8.decode(block, final=eof)
+            pos = 0
+            ascii_only = buf.isascii()
+
+        if start == 0:
+            # Find the opening bracket of the array
+            opener = "[" if items_key is None else json.dumps(items_key)
+            while True:
+                i = buf.find(opener)
+                if i != -1 and (items_key is None or buf.find("[", i) != -1):
+                    pos = (buf.index("[", i) if items_key else i) + 1
+                    offset += len(buf[:pos].encode("utf-8"))
+                    break
+                if eof:
+                    raise ValueError(f"No JSON array {items_key or ''} found in {path}")
+                more()
+
+        while True:
+            i = skip(buf, pos).end()
+            offset += i - pos  # separators are ASCII
+            pos = i
+            if pos == len(buf):
+                if eof:
+                    raise ValueError(f"Unterminated JSON array in {path}")
+                more()
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more()  # element continues in the next block
+                continue
+            if end == len(buf) and not eof:
+                more()  # a number at the end of the block may be cut short
+                continue
+            offset += end - pos if ascii_only else len(buf[pos:end].encode("utf-8"))
+            pos = end
+            yield obj, offset
+
+
+# ---- Chunker ----
+def chunk_text(text: str, max_chars: int = INGEST_CHUNK_CHARS,
+               overlap: int = INGEST_CHUNK_OVERLAP):
+    """Split text into chunks of at most max_chars, overlapping by ~overlap, on word boundaries."""
+    text = text.strip()
+    if len(text) <= max_chars:
+        if text:
+            yield text
+        return
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + overlap + 1, end)
+            if cut != -1:
+                end = cut
+        yield text[start:end].strip()
+        if end >= len(text):
+            return
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+
+
+def chunk_hash(text: str) -> bytes:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).digest()
+
+
+# ---- Checkpoint ----
+class IngestCheckpoint:
+    """
+    SQLite record of a job's progress: the byte offset reached in every
+    source and the hashes of every chunk inserted so far.
+    path=None keeps it in memory (no resume, dedup within the run only).
+    """
+
+    def __init__(self, path=None):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path) if path else ":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS offsets (key TEXT PRIMARY KEY, offset INTEGER)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS seen (hash BLOB PRIMARY KEY)")
+            self._db.commit()
+
+    def offset(self, key: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT offset FROM offsets WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def offsets(self, prefix: str = "") -> dict:
+        """All recorded offsets whose key starts with prefix."""
+        with self._lock:
+            rows = self._db.execute("SELECT key, offset FROM offsets WHERE substr(key, 1, ?) = ?",
+                                    (len(prefix), prefix)).fetchall()
+        return dict(rows)
+
+    def seen(self, hashes: list[bytes]) -> set:
+        """The subset of hashes already committed."""
+        found = set()
+        with self._lock:
+            for start in range(0, len(hashes), 500):  # stay under SQLite's variable limit
+                chunk = hashes[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT hash FROM seen WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def commit(self, hashes: list[bytes], offsets: dict):
+        """Atomically record inserted chunk hashes and the new source offsets."""
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO seen (hash) VALUES (?)",
+                                 [(h,) for h in hashes])
+            self._db.executemany("INSERT OR REPLACE INTO offsets (key, offset) VALUES (?, ?)",
+                                 list(offsets.items()))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ---- Pipeline ----
+class _Chunk:
+    __slots__ = ("key", "text", "meta", "end", "last", "hash")
+
+    def __init__(self, key, text, meta, end, last):
+        self.key, self.text, self.meta, self.end, self.last = key, text, meta, end, last
+        self.hash = None
+
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class IngestPipeline:
+    """
+    Streaming ingestion of one or more readers into user_id's memories.
+    Pass the same checkpoint_path again to resume an interrupted run.
+    """
+
+    def __init__(self, user_id: str = DEFAULT_USER, checkpoint_path=None,
+                 chunk_chars: int = INGEST_CHUNK_CHARS, overlap: int = INGEST_CHUNK_OVERLAP,
+                 batch_size: int = INGEST_BATCH_SIZE, queue_batches: int = INGEST_QUEUE_BATCHES,
+                 on_progress=None):
+        self.user_id = user_id
+        self.checkpoint = IngestCheckpoint(checkpoint_path)
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.queue_batches = queue_batches
+        self.on_progress = on_progress  # called with the stats dict after every batch
+        self._stop = threading.Event()
+        self.stats = {"records": 0, "chunks": 0, "duplicates": 0, "inserted": 0, "batches": 0}
+
+    def run(self, readers: list) -> dict:
+        """Ingest every reader; returns counters (records, chunks, duplicates, inserted, ...)."""
+        start = time.perf_counter()
+        chunks_q = queue.Queue(maxsize=self.batch_size * self.queue_batches)
+        batches_q = queue.Queue(maxsize=self.queue_batches)
+        self._stop.clear()
+        stages = [
+            threading.Thread(target=self._read_stage, args=(readers, chunks_q),
+                             daemon=True, name="ingest-read"),
+            threading.Thread(target=self._embed_stage, args=(chunks_q, batches_q),
+                             daemon=True, name="ingest-embed"),
+        ]
+        for stage in stages:
+            stage.start()
+        try:
+            self._write_stage(batches_q)
+        finally:
+            self._stop.set()
+            for stage in stages:
+                stage.join()
+        self.stats["seconds"] = time.perf_counter() - start
+        return dict(self.stats)
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Blocking put that gives up once the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        """Blocking get that returns _DONE once the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    # 1️⃣ Read + chunk
+    def _read_stage(self, readers, out_q):
+        try:
+            for reader in readers:
+                now = datetime.datetime.utcnow().isoformat()
+                for text, meta, end in reader.read(self.checkpoint.offset(reader.key)):
+                    self.stats["records"] += 1
+                    meta = {"user_id": self.user_id, "source": reader.source,
+                            "timestamp": now, **meta}
+                    chunks = list(chunk_text(text, self.chunk_chars, self.overlap)) or [None]
+                    for i, chunk in enumerate(chunks):
+                        if not self._put(out_q, _Chunk(reader.key, chunk, meta, end,
+                                                       i == len(chunks) - 1)):
+                            return
+            self._put(out_q, _DONE)
+        except Exception as e:
+            self._put(out_q, _Failed(e))
+
+    # 2️⃣ Dedup + embed
+    def _embed_stage(self, in_q, out_q):
+        # Hashes of the batches that may still be queued or being written: everything
+        # older has been committed to the checkpoint, where seen() finds it
+        in_flight = deque(maxlen=self.queue_batches + 2)
+        try:
+            done = False
+            while not done:
+                batch = []
+                while len(batch) < self.batch_size:
+                    item = self._get(in_q)
+                    if item is _DONE or isinstance(item, _Failed):
+                        done = True
+                        break
+                    batch.append(item)
+                if batch:
+                    for chunk in batch:
+                        if chunk.text is not None:
+                            chunk.hash = chunk_hash(chunk.text)
+                    seen = self.checkpoint.seen([c.hash for c in batch if c.hash is not None])
+                    keep, hashes = [], set()
+                    for chunk in batch:
+                        if chunk.hash is None:
+                            continue
+                        if (chunk.hash in seen or chunk.hash in hashes
+                                or any(chunk.hash in queued for queued in in_flight)):
+                            self.stats["duplicates"] += 1
+                            chunk.hash = None  # position-only: advances the checkpoint
+                            continue
+                        hashes.add(chunk.hash)
+                        keep.append(chunk)
+                    in_flight.append(hashes)
+                    vectors = embed_batch([c.text for c in keep]) if keep else []
+                    if not self._put(out_q, (batch, keep, vectors)):
+                        return
+                if isinstance(item, _Failed):
+                    self._put(out_q, item)
+                    return
+            self._put(out_q, _DONE)
+        except Exception as e:
+            self._put(out_q, _Failed(e))
+
+    # 3️⃣ Insert + checkpoint
+    def _write_stage(self, in_q):
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.error
+            batch, keep, vectors = item
+            if keep:
+                add_memories([c.text for c in keep], vectors, [c.meta for c in keep],
+                             user_id=self.user_id)
+            offsets = {c.key: c.end for c in batch if c.last}
+            self.checkpoint.commit([c.hash for c in keep], offsets)
+            self.stats["chunks"] += sum(1 for c in batch if c.text is not None)
+            self.stats["inserted"] += len(keep)
+            self.stats["batches"] += 1
+            if self.on_progress is not None:
+                self.on_progress(dict(self.stats))
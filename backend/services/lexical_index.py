@@ -0,0 +1,134 @@
+# backend/services/lexical_index.py
+"""
+Lexical Index
+-------------
+Incremental BM25 inverted index over one shard's memory texts, so exact
+keyword questions ("what's due on 2025-10-01?", names, ids) are answered
+from posting lists instead of a scan over every memory.
+
+Rows are appended as memories are added; each term keeps two compact
+posting arrays (row, term frequency) that numpy reads without copying,
+so scoring a query only touches the rows that contain its terms.
+
+rrf_fuse() merges a lexical and a vector ranking with reciprocal-rank
+fusion for hybrid search.
+"""
+
+import re
+from array import array
+
+import numpy as np
+
+from .metadata_index import GrowableColumn
+
+# Words joined by - . / : @ ' stay one token, so dates, times, emails and versions match exactly
+_TOKEN_RE = re.compile(r"\w+(?:[-./:@']\w+)*")
+
+# Too common to rank anything, and their posting lists are the longest
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have i in is it my of on or so "
+    "that the this to was what when where which who will with you your me".split()
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # rank offset from the original RRF paper
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased tokens of text, without stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 over rows of one shard, row-aligned with its vectors."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> (rows array('q'), term-frequency array('i'))
+        self._doc_lens = GrowableColumn(np.int32)
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._doc_lens.values)
+
+    def add(self, texts: list[str]):
+        """Index the next len(texts) rows."""
+        row = len(self)
+        lens = []
+        for text in texts:
+            tokens = tokenize(text)
+            lens.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("q"), array("i"))
+                postings[0].append(row)
+                postings[1].append(tf)
+            row += 1
+        self._doc_lens.extend(lens)
+        self._total_len += sum(lens)
+
+    def search(self, query: str, k: int, mask: np.ndarray = None, limit: int = None):
+        """
+        Return (scores, rows) of the top-k BM25 matches for query, best first.
+        mask (bool per row) restricts the result to the selected rows, limit
+        to the rows below it (the rows a searcher's snapshot holds).
+        """
+        n = len(self)
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in self._postings]
+        if not terms or n == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        doc_lens = self._doc_lens.values
+        avg_len = self._total_len / n or 1.0
+        all_rows, all_scores = [], []
+        for term in terms:
+            rows_arr, tfs_arr = self._postings[term]
+            rows = np.frombuffer(rows_arr, dtype=np.int64)
+            tfs = np.frombuffer(tfs_arr, dtype=np.int32).astype(np.float32)
+            df = len(rows)
+            idf = np.log1p((n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lens[rows] / avg_len)
+            all_rows.append(rows)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+        if len(all_rows) == 1:
+            rows, scores = all_rows[0], all_scores[0]
+        else:
+            # Sum per-term scores of rows that match several terms
+            rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+
+        if limit is not None and (mask is None or len(mask) > limit):
+            keep = rows < limit
+            rows, scores = rows[keep], scores[keep]
+        if mask is not None:
+            # Rows added after the mask was computed are not selected
+            keep = rows < len(mask)
+            keep[keep] = mask[rows[keep]]
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return scores[order], rows[order]
+
+    def terms(self) -> int:
+        return len(self._postings)
+
+
+def rrf_fuse(rankings: list[list[int]], k: int, rrf_k: int = RRF_K) -> list[tuple[int, float]]:
+    """
+    Reciprocal-rank fusion: score(row) = sum over rankings of 1 / (rrf_k + rank).
+    Returns the top-k (row, fused score) pairs, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
@@ -4,61 +4,477 @@ Memory Store Service
 --------------------
 Handles storage and retrieval of user memories (text + embeddings).
 Uses FAISS for efficient vector similarity search.
+
+Memories are persisted under STORE_DIR (see services/persistence.py), so
+a restart maps the existing files instead of re-embedding everything.
+Each user has their own shard (see services/shards.py): a query only
+scans that user's vectors.
+
+Every memory gets a stable id when it is added. delete_memory() and
+update_memory() tombstone the old row; shards compact themselves in the
+background once enough rows are dead.
+
+Vectors are compared by METRIC: L2 distance, inner product, or cosine
+similarity (vectors normalized when they are stored). search_hits_batch()
+answers many query vectors with a single FAISS call.
+
+Searches run lock-free against the shard's current view (see ShardView), so
+they never wait for or observe a half-finished add. Several processes (e.g.
+uvicorn --workers N) can open the same STORE_DIR: writes are serialized by a
+per-shard file lock, index segments are memory-mapped and shared through the
+page cache, and each process picks up the others' writes on its next search.
+
+An add only appends to the shard's small in-memory head; sealing it into an
+index segment, and merging segments into bigger, ANN-indexed ones, happens
+in the background (see MemoryShard), so ingest latency stays flat.
 """
 
-import faiss
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import numpy as np
 
-# Memory text storage (parallel to FAISS index)
-memory_texts: list[str] = []
-memory_meta: list[dict] = []
+from .embedding_backends import get_backend
+from .index_factory import INDEX_TYPES, METRICS, similarity, to_distances
+from .lexical_index import rrf_fuse
+from .metrics import SEARCHES, VECTORS_SEARCHED, timed
+from .shards import ShardRegistry
+
+# FAISS index setup: vectors are as wide as the configured embedding backend's output
+VECTOR_DIM = get_backend().dim
+
+# Where memories live on disk (override with MEMORY_STORE_DIR)
+STORE_DIR = os.getenv(
+    "MEMORY_STORE_DIR",
+    str(Path(__file__).resolve().parents[2] / "data" / "memory_store"),
+)
+SNAPSHOT_EVERY = 10_000  # seal the head into an index segment after this many new memories
+MERGE_FACTOR = int(os.getenv("MERGE_FACTOR", 4))  # merge this many same-tier segments into one
+MAX_LOADED_SHARDS = int(os.getenv("MAX_LOADED_SHARDS", 64))  # LRU bound on open shards
+
+# ANN tier a shard is upgraded to once it holds INDEX_TRAIN_THRESHOLD memories
+# ("flat", "ivf_flat", "hnsw" or "ivf_pq"; see services/index_factory.py)
+INDEX_TYPE = os.getenv("MEMORY_INDEX_TYPE", "flat")
+INDEX_TRAIN_THRESHOLD = int(os.getenv("INDEX_TRAIN_THRESHOLD", 50_000))
+
+# A shard is compacted once this fraction of its rows (and at least COMPACT_MIN_DEAD) are dead
+COMPACT_RATIO = float(os.getenv("COMPACT_RATIO", 0.3))
+COMPACT_MIN_DEAD = int(os.getenv("COMPACT_MIN_DEAD", 1_000))
+
+# How vectors are compared: "l2", "ip" (inner product) or "cosine" (normalized
+# inner product, the intended measure for OpenAI embeddings). Fixed per store.
+METRIC = os.getenv("MEMORY_METRIC", "l2")
+
+# Most query vectors one search_hits_batch call accepts
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", 10_000))
+
+# search_hits modes; hybrid fuses the top HYBRID_CANDIDATES of each ranking
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 50))
+
+# Bounded pool the async API runs FAISS work on, so handlers never block the event loop
+SEARCH_THREADS = int(os.getenv("SEARCH_THREADS", min(8, os.cpu_count() or 1)))
+_executor = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="memory-store")
+
+# Used when a caller doesn't say whose memory it is (single-user demo)
+DEFAULT_USER = "default"
+
+# Opened lazily on first use (see _registry)
+_shards: ShardRegistry = None
+
+# Called as listener(event, user_id, ids=, texts=, vectors=) after every change,
+# event being "add", "update", "delete" or "reset" (user_id None = all users).
+# Changes other worker processes made are reported when this process picks them up.
+_listeners = []
+
+
+def open_store(path: str = None):
+    """
+    Open (or create) the store rooted at path and make it the active store.
+    Shards are opened lazily the first time a user is touched.
+    """
+    global _shards
+    if INDEX_TYPE not in INDEX_TYPES:
+        raise ValueError(f"MEMORY_INDEX_TYPE must be one of {INDEX_TYPES}, got {INDEX_TYPE!r}")
+    if METRIC not in METRICS:
+        raise ValueError(f"MEMORY_METRIC must be one of {METRICS}, got {METRIC!r}")
+    if MERGE_FACTOR < 2:
+        raise ValueError(f"MERGE_FACTOR must be at least 2, got {MERGE_FACTOR}")
+    _shards = ShardRegistry(path or STORE_DIR, VECTOR_DIM,
+                            max_loaded=MAX_LOADED_SHARDS, snapshot_every=SNAPSHOT_EVERY,
+                            index_type=INDEX_TYPE, train_threshold=INDEX_TRAIN_THRESHOLD,
+                            compact_ratio=COMPACT_RATIO, compact_min_dead=COMPACT_MIN_DEAD,
+                            metric=METRIC, merge_factor=MERGE_FACTOR, on_change=_notify)
+
+
+def _registry() -> ShardRegistry:
+    if _shards is None:
+        open_store()
+    return _shards
+
+
+def add_listener(listener):
+    """Subscribe to memory changes (e.g. to invalidate caches built on search results)."""
+    if listener not in _listeners:
+        _listeners.append(listener)
 
-# FAISS index setup
-VECTOR_DIM = 128  # same dim as mock embeddings (adjust if real model is used)
-index = faiss.IndexFlatL2(VECTOR_DIM)  # L2 = Euclidean distance
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
 
-def reset_store():
-    """Clear all stored memories (useful for testing/demo reset)."""
-    global memory_texts, memory_meta, index
-    memory_texts = []
-    memory_meta = []
-    index = faiss.IndexFlatL2(VECTOR_DIM)
+def _notify(event: str, user_id: str, **change):
+    for listener in list(_listeners):
+        try:
+            listener(event, user_id, **change)
+        except Exception:
+            logging.exception("Memory store listener %r failed on %s", listener, event)
 
-def add_memory(text: str, vector: list[float], metadata: dict = None):
+
+def get_shard(user_id: str = DEFAULT_USER):
+    """Return the (lazily loaded) shard holding user_id's memories."""
+    return _registry().get(user_id)
+
+
+def warm_shard(user_id: str = DEFAULT_USER) -> int:
+    """
+    Open user_id's shard and build its BM25 index now, so the first search
+    doesn't pay for it. Returns the number of live memories.
+    """
+    shard = get_shard(user_id)
+    _ = shard.lexical_index  # built on first access
+    return len(shard)
+
+
+def loaded_users() -> list[str]:
+    """Users whose shards are in memory (empty before the store is first used)."""
+    return [] if _shards is None else _shards.loaded_user_ids()
+
+
+def snapshot(user_id: str = DEFAULT_USER):
+    """Seal and merge user_id's index into a single segment on disk now."""
+    get_shard(user_id).snapshot()
+
+
+def reset_store(user_id: str = None):
+    """
+    Clear stored memories (useful for testing/demo reset).
+    Only user_id's shard is touched; with no user_id every user is cleared.
+    """
+    if user_id is None:
+        _registry().clear_all()
+    else:
+        _registry().clear(user_id)
+    _notify("reset", user_id)
+
+
+def add_memory(text: str, vector: list[float], metadata: dict = None,
+               user_id: str = DEFAULT_USER):
     """
     Add a new memory to the store.
     Args:
         text (str): User memory text
         vector (list[float]): Embedding vector
         metadata (dict, optional): Extra info (source, timestamp, etc.)
+        user_id (str): Whose shard the memory goes into
+    Returns:
+        int: The new memory's id
     """
-    global memory_texts, memory_meta, index
-    memory_texts.append(text)
-    memory_meta.append(metadata or {})
-    vec = np.array([vector], dtype="float32")
-    index.add(vec)
+    return add_memory_ids([text], [vector], [metadata], user_id=user_id)[0]
 
-def search_memory(query_vector: list[float], k: int = 3):
+def add_memories(texts: list[str], vectors, metas: list[dict] = None,
+                 user_id: str = DEFAULT_USER):
     """
-    Search for top-k relevant memories given a query vector.
+    Add many memories to the store with a single FAISS call.
     Args:
-        query_vector (list[float]): Embedding of query text
+        texts (list[str]): Memory texts
+        vectors (list[list[float]] | np.ndarray): One embedding per text
+        metas (list[dict], optional): One metadata dict per text
+        user_id (str): Whose shard the memories go into
+    Returns:
+        int: Number of memories added
+    """
+    return len(add_memory_ids(texts, vectors, metas, user_id=user_id))
+
+@timed("insert")
+def add_memory_ids(texts: list[str], vectors, metas: list[dict] = None,
+                   user_id: str = DEFAULT_USER) -> list[int]:
+    """add_memories, returning the new memories' ids instead of a count."""
+    if metas is None:
+        metas = [None] * len(texts)
+    if not (len(texts) == len(vectors) == len(metas)):
+        raise ValueError("texts, vectors and metas must have the same length")
+    if len(texts) == 0:
+        return []
+
+    # One contiguous float32 matrix -> one index.add instead of one per memory
+    vecs = _as_matrix(vectors)
+    ids = get_shard(user_id).add(texts, vecs, [m or {} for m in metas])
+    _notify("add", user_id, ids=ids, texts=list(texts), vectors=vecs)
+    return ids
+
+def _as_matrix(vectors) -> np.ndarray:
+    vecs = np.ascontiguousarray(vectors, dtype="float32")
+    if vecs.ndim != 2 or vecs.shape[1] != VECTOR_DIM:
+        raise ValueError(f"Expected vectors of shape (n, {VECTOR_DIM}), got {vecs.shape}")
+    return vecs
+
+def delete_memory(memory_id: int, user_id: str = DEFAULT_USER) -> bool:
+    """
+    Delete one memory. Its row is tombstoned and skipped by every search
+    from now on; the space is reclaimed by the next compaction.
+    Returns:
+        bool: False if no live memory has that id
+    """
+    return delete_memories([memory_id], user_id=user_id) == 1
+
+def delete_memories(memory_ids: list[int], user_id: str = DEFAULT_USER) -> int:
+    """Delete many memories; returns how many existed."""
+    deleted = get_shard(user_id).delete(list(memory_ids))
+    if deleted:
+        _notify("delete", user_id, ids=deleted)
+    return len(deleted)
+
+def update_memory(memory_id: int, text: str, vector: list[float], metadata: dict = None,
+                  user_id: str = DEFAULT_USER) -> bool:
+    """
+    Replace a memory's text, embedding and metadata. The memory keeps its id.
+    Returns:
+        bool: False if no live memory has that id
+    """
+    vecs = _as_matrix([vector])
+    updated = get_shard(user_id).update(memory_id, text, vecs[0], metadata or {})
+    if updated:
+        _notify("update", user_id, ids=[memory_id], texts=[text], vectors=vecs)
+    return updated
+
+def get_memory(memory_id: int, user_id: str = DEFAULT_USER) -> dict:
+    """Return {"id", "text", "metadata"} for a live memory, or None."""
+    view = get_shard(user_id).view()
+    row = view.row_of(memory_id)
+    if row < 0:
+        return None
+    record = view.record(row)
+    return {"id": memory_id, "text": record["text"], "metadata": record["meta"]}
+
+def iter_memories(user_id: str = DEFAULT_USER, after_id: int = -1, batch_size: int = 1_000):
+    """
+    Yield user_id's live memories with id > after_id as lists of
+    {"id", "text", "metadata"}, oldest first. Ids only grow, so a caller that
+    remembers the last id it saw can resume with just the newer memories
+    (an updated memory keeps its id and is not yielded again).
+    """
+    shard = get_shard(user_id)
+    ids = shard.ids_after(after_id)
+    for start in range(0, len(ids), batch_size):
+        records = shard.records_of(ids[start:start + batch_size])
+        if records:
+            yield records
+
+def get_memory_vectors(memory_ids: list[int], user_id: str = DEFAULT_USER) -> np.ndarray:
+    """Return the stored embeddings of memory_ids as a (len(memory_ids), VECTOR_DIM) array."""
+    return get_shard(user_id).vectors_of(list(memory_ids))
+
+def compact(user_id: str = DEFAULT_USER):
+    """Rewrite user_id's shard without its deleted rows (normally runs in the background)."""
+    get_shard(user_id).compact()
+
+@timed("search")
+def search_hits(query_vector: list[float], k: int = 3, user_id: str = DEFAULT_USER,
+                source=None, since=None, until=None,
+                nprobe: int = None, ef_search: int = None,
+                query_text: str = None, mode: str = "vector") -> list[dict]:
+    """
+    Search for top-k relevant memories and return structured hits.
+    Metadata filters are turned into a row bitmap that FAISS applies during
+    the scan, so k filtered results come back without over-fetching.
+    Args:
+        query_vector (list[float]): Embedding of query text (unused in "lexical" mode)
         k (int): Number of results to return
+        user_id (str): Only this user's memories are searched
+        source (str | list[str], optional): Only memories from these sources
+        since / until (datetime | ISO str | epoch seconds, optional): Timestamp range
+        nprobe (int, optional): IVF cells to visit (higher = better recall, slower)
+        ef_search (int, optional): HNSW search breadth (higher = better recall, slower)
+        query_text (str, optional): Raw query, needed for "lexical" and "hybrid"
+        mode (str): "vector" (FAISS), "lexical" (BM25) or "hybrid" (both, fused with RRF)
     Returns:
-        list[str]: Top matching memory texts
+        list[dict]: {"id", "text", "score", "distance", "metadata"} best first;
+        score is the vector similarity in vector mode (1 / (1 + L2 distance),
+        the inner product, or the cosine similarity, depending on METRIC),
+        BM25 in lexical mode and the reciprocal-rank-fusion score in hybrid
+        mode (higher is more relevant). distance is the METRIC's distance
+        (squared L2, -inner product, 1 - cosine; smaller is closer), None for
+        hits the vector search did not return.
     """
-    if len(memory_texts) == 0:
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {SEARCH_MODES}, got {mode!r}")
+    if mode != "vector" and not query_text:
+        raise ValueError(f"query_text is required for {mode} search")
+    SEARCHES.inc(mode=mode)
+    shard = get_shard(user_id)
+    if mode != "vector":
+        _ = shard.lexical_index  # built on the first keyword search
+    # Everything below reads this one view, whatever writers do meanwhile
+    view = shard.view()
+    if len(view) == 0:
+        return []
+
+    mask = _filter_mask(view, source, since, until)
+    if mask is not None and not mask.any():
         return []
 
-    query_vec = np.array([query_vector], dtype="float32")
-    distances, indices = index.search(query_vec, k)
+    # Hybrid fuses two longer candidate lists; a memory ranked well by either can win
+    fetch = k if mode != "hybrid" else max(k, HYBRID_CANDIDATES)
+    distances = {}  # row -> distance
+    if mode != "lexical":
+        VECTORS_SEARCHED.inc(len(view))
+        query_vec = np.array([query_vector], dtype="float32")
+        values, rows = view.search(query_vec, fetch, nprobe=nprobe, ef_search=ef_search, mask=mask)
+        distances = _row_distances(view, values[0], rows[0])
+    if mode != "vector":
+        bm25, lexical_rows = view.lexical_search(query_text, fetch, mask=mask)
+
+    if mode == "vector":
+        ranked = [(row, similarity(dist, view.metric)) for row, dist in distances.items()]
+    elif mode == "lexical":
+        ranked = list(zip(lexical_rows.tolist(), bm25.tolist()))
+    else:
+        ranked = rrf_fuse([list(distances), lexical_rows.tolist()], k)
+    return _hits(view, ranked, distances)
+
+@timed("search")
+def search_hits_batch(query_matrix, k: int = 3, user_id: str = DEFAULT_USER,
+                      source=None, since=None, until=None,
+                      nprobe: int = None, ef_search: int = None) -> list[list[dict]]:
+    """
+    Vector search for many queries at once: one FAISS call over the whole
+    (n_queries, VECTOR_DIM) matrix instead of one Python -> FAISS round-trip
+    per query (for evaluation runs and multi-question clients).
+    Filters apply to every query. Returns one search_hits-style list per query.
+    """
+    if len(query_matrix) == 0:
+        return []
+    queries = _as_matrix(query_matrix)
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per batch, got {len(queries)}")
+    SEARCHES.inc(len(queries), mode="vector")
+    view = get_shard(user_id).view()
+    mask = _filter_mask(view, source, since, until)
+    if len(view) == 0 or (mask is not None and not mask.any()):
+        return [[] for _ in range(len(queries))]
 
+    VECTORS_SEARCHED.inc(len(view) * len(queries))
+    values, rows = view.search(queries, k, nprobe=nprobe, ef_search=ef_search, mask=mask)
     results = []
-    for idx in indices[0]:
-        if idx < len(memory_texts):
-            results.append(memory_texts[idx])
+    for query_values, query_rows in zip(values, rows):
+        distances = _row_distances(view, query_values, query_rows)
+        ranked = [(row, similarity(dist, view.metric)) for row, dist in distances.items()]
+        results.append(_hits(view, ranked, distances))
     return results
 
-def get_all_memories():
-    """Return all stored memories (for debugging)."""
-    return memory_texts
+def _filter_mask(view, source, since, until):
+    if source is None and since is None and until is None:
+        return None
+    return view.meta_index.mask(source=source, since=since, until=until)
+
+def _row_distances(view, values: np.ndarray, rows: np.ndarray) -> dict:
+    """{row: distance} of one query's FAISS results, best first (padding rows dropped)."""
+    distances = to_distances(values, view.metric)
+    return {int(row): float(dist) for dist, row in zip(distances, rows) if 0 <= row < view.rows}
+
+def _hits(view, ranked, distances: dict) -> list[dict]:
+    hits = []
+    for row, score in ranked:
+        record = view.record(row)
+        hits.append({
+            "id": view.memory_id(row),
+            "text": record["text"],
+            "score": float(score),
+            "distance": distances.get(row),
+            "metadata": record["meta"],
+        })
+    return hits
+
+def search_memory(query_vector: list[float], k: int = 3, user_id: str = DEFAULT_USER,
+                  nprobe: int = None, ef_search: int = None, **filters):
+    """
+    Search for top-k relevant memories given a query vector.
+    Args:
+        query_vector (list[float]): Embedding of query text
+        k (int): Number of results to return
+        user_id (str): Only this user's memories are searched
+        nprobe / ef_search / **filters: see search_hits (also query_text / mode)
+    Returns:
+        list[str]: Top matching memory texts
+    """
+    return [hit["text"] for hit in search_hits(query_vector, k, user_id=user_id,
+                                               nprobe=nprobe, ef_search=ef_search, **filters)]
+
+def search_memory_batch(query_matrix, k: int = 3, user_id: str = DEFAULT_USER,
+                        nprobe: int = None, ef_search: int = None, **filters) -> list[list[str]]:
+    """search_memory for many query vectors in one FAISS call; one text list per query."""
+    return [[hit["text"] for hit in hits]
+            for hits in search_hits_batch(query_matrix, k, user_id=user_id,
+                                          nprobe=nprobe, ef_search=ef_search, **filters)]
+
+def get_memory_meta(memory_id: int, user_id: str = DEFAULT_USER) -> dict:
+    """Return the metadata stored with user_id's memory memory_id."""
+    memory = get_memory(memory_id, user_id)
+    if memory is None:
+        raise KeyError(memory_id)
+    return memory["metadata"]
+
+def get_all_memories(user_id: str = DEFAULT_USER):
+    """Return all of user_id's live memories (for debugging)."""
+    view = get_shard(user_id).view()
+    return [view.log.text(int(row)) for row in view.live_rows()]
+
+
+# ---- Async API (for FastAPI handlers) ----
+async def _run(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context so timing spans land in its request's timings
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, lambda: context.run(fn, *args, **kwargs))
+
+async def arun(fn, *args, **kwargs):
+    """Run fn, blocking work that reads the store, on the bounded store pool."""
+    return await _run(fn, *args, **kwargs)
+
+async def asearch_memory(query_vector: list[float], k: int = 3, user_id: str = DEFAULT_USER,
+                         **kwargs):
+    """search_memory on the bounded search pool."""
+    return await _run(search_memory, query_vector, k, user_id=user_id, **kwargs)
+
+async def asearch_hits(query_vector: list[float], k: int = 3, user_id: str = DEFAULT_USER,
+                       **kwargs) -> list[dict]:
+    """search_hits on the bounded search pool."""
+    return await _run(search_hits, query_vector, k, user_id=user_id, **kwargs)
+
+async def asearch_hits_batch(query_matrix, k: int = 3, user_id: str = DEFAULT_USER,
+                             **kwargs) -> list[list[dict]]:
+    """search_hits_batch on the bounded search pool."""
+    return await _run(search_hits_batch, query_matrix, k, user_id=user_id, **kwargs)
+
+async def aadd_memory(text: str, vector: list[float], metadata: dict = None,
+                      user_id: str = DEFAULT_USER):
+    """add_memory on the bounded search pool."""
+    return await _run(add_memory, text, vector, metadata, user_id=user_id)
+
+async def aadd_memories(texts: list[str], vectors, metas: list[dict] = None,
+                        user_id: str = DEFAULT_USER):
+    """add_memories on the bounded search pool."""
+    return await _run(add_memories, texts, vectors, metas, user_id=user_id)
+
+async def adelete_memory(memory_id: int, user_id: str = DEFAULT_USER) -> bool:
+    """delete_memory on the bounded search pool."""
+    return await _run(delete_memory, memory_id, user_id=user_id)
+
+async def aupdate_memory(memory_id: int, text: str, vector: list[float], metadata: dict = None,
+                         user_id: str = DEFAULT_USER) -> bool:
+    """update_memory on the bounded search pool."""
+    return await _run(update_memory, memory_id, text, vector, metadata, user_id=user_id)
@@ -0,0 +1,304 @@
+# backend/services/metadata_index.py
+"""
+Metadata Columns & Index
+------------------------
+Memory metadata is stored column-wise next to the vectors (see
+services/persistence.py), not as one JSON object / Python dict per memory:
+
+  • source    – dictionary-encoded: int32 code per row (-1 = absent)
+  • user_id   – dictionary-encoded: int32 code per row (-1 = absent)
+  • timestamp – int64 epoch microseconds (MISSING_TS when absent)
+  • anything else ("extras") stays free-form JSON in the record log, and is
+    only written when there is something to write
+
+The columns are memory-mapped, so a shard costs 16 bytes of page cache per
+memory for them and opening it parses nothing. MetadataIndex turns filters
+such as "only calendar items from last week" into a row bitmap that FAISS
+applies inside the index scan (IDSelectorBitmap), instead of over-fetching
+k×N results and post-filtering them in Python.
+
+Values that would not round-trip through a column (a non-string source, a
+timestamp that isn't a naive ISO-8601 string) are also kept verbatim in the
+extras, so reading a memory back always returns exactly what was stored.
+"""
+
+import datetime
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+MISSING_TS = np.iinfo(np.int64).min
+
+# Dictionary-encoded metadata keys (each has its own code column)
+DICT_KEYS = ("user_id", "source")
+
+DICT_FILE = "meta_dict.json"
+TIMESTAMP_FILE = "meta_ts.i64"
+
+_CODE_DTYPE = np.dtype("<i4")
+_TS_DTYPE = np.dtype("<i8")
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_UTC = _EPOCH.replace(tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _code_file(key: str) -> str:
+    return f"meta_{key}.i32"
+
+
+def to_epoch_us(value) -> int:
+    """Accept datetime / ISO-8601 string / epoch seconds and return epoch microseconds."""
+    if value is None:
+        return MISSING_TS
+    if isinstance(value, (int, float)):
+        return int(value * 1_000_000)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # ingest_text stores naive utcnow() timestamps
+        return (value - _EPOCH) // _MICROSECOND
+    return (value - _EPOCH_UTC) // _MICROSECOND
+
+
+def from_epoch_us(us: int) -> str:
+    """Naive ISO-8601 string for epoch microseconds (inverse of to_epoch_us)."""
+    return (_EPOCH + datetime.timedelta(microseconds=int(us))).isoformat()
+
+
+def _column_timestamp(value):
+    """(epoch µs for the column, whether the column alone reproduces value)."""
+    if value is None:
+        return MISSING_TS, False
+    try:
+        us = to_epoch_us(value)
+    except (TypeError, ValueError, OverflowError):
+        return MISSING_TS, False
+    return us, isinstance(value, str) and from_epoch_us(us) == value
+
+
+class GrowableColumn:
+    """Growable numpy column with amortized O(1) appends (values is a writable view)."""
+
+    def __init__(self, dtype):
+        self._data = np.empty(1024, dtype=dtype)
+        self._len = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        need = self._len + len(values)
+        if need > len(self._data):
+            grown = np.empty(max(need, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._len] = self._data[:self._len]
+            self._data = grown
+        self._data[self._len:need] = values
+        self._len = need
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self._len]
+
+    def copy(self) -> "GrowableColumn":
+        column = GrowableColumn(self._data.dtype)
+        column.extend(self.values)
+        return column
+
+
+class MetadataColumns:
+    """
+    Append-only metadata columns of one store directory, row-aligned with its
+    vectors. The owning MemoryLog decides how many rows are committed.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        for name in [_code_file(key) for key in DICT_KEYS] + [TIMESTAMP_FILE]:
+            (self.path / name).touch(exist_ok=True)
+        self._dict_state = None
+        self._set_dictionaries({})
+        self.reload()
+        self._count = 0
+        self._maps = None
+
+    def _set_dictionaries(self, stored: dict):
+        self._values = {key: list(stored.get(key, [])) for key in DICT_KEYS}  # code -> value
+        self._codes = {key: {v: i for i, v in enumerate(values)}
+                       for key, values in self._values.items()}
+        self._saved = {key: len(values) for key, values in self._values.items()}
+
+    def reload(self):
+        """Pick up dictionary values another process saved (dictionaries only ever grow)."""
+        try:
+            stat = os.stat(self.path / DICT_FILE)
+        except FileNotFoundError:
+            return
+        state = (stat.st_ino, stat.st_mtime_ns)
+        if state == self._dict_state:
+            return
+        try:
+            stored = json.loads((self.path / DICT_FILE).read_text())
+        except (OSError, ValueError):
+            return
+        if any(len(stored.get(key, [])) > len(self._values[key]) for key in DICT_KEYS):
+            self._set_dictionaries(stored)
+        self._dict_state = state
+
+    def extend_to(self, count: int):
+        """Rows up to count were committed by another process."""
+        self._count = max(self._count, count)
+
+    def stored_rows(self) -> int:
+        """Rows present in every column file (may exceed the committed count after a crash)."""
+        sizes = [os.path.getsize(self.path / _code_file(key)) // _CODE_DTYPE.itemsize
+                 for key in DICT_KEYS]
+        sizes.append(os.path.getsize(self.path / TIMESTAMP_FILE) // _TS_DTYPE.itemsize)
+        return min(sizes)
+
+    def truncate(self, count: int):
+        for key in DICT_KEYS:
+            os.truncate(self.path / _code_file(key), count * _CODE_DTYPE.itemsize)
+        os.truncate(self.path / TIMESTAMP_FILE, count * _TS_DTYPE.itemsize)
+        self._count = count
+        self._maps = None
+
+    # ---- Writes ----
+    def encode(self, metas: list[dict]):
+        """
+        Split metas into column arrays and per-row extras (None when a row has
+        none). New dictionary values get codes here; call append() to store them.
+        """
+        codes = {key: np.full(len(metas), -1, dtype=_CODE_DTYPE) for key in DICT_KEYS}
+        timestamps = np.full(len(metas), MISSING_TS, dtype=_TS_DTYPE)
+        extras = []
+        for row, meta in enumerate(metas):
+            rest = dict(meta or {})
+            for key in DICT_KEYS:
+                value = rest.get(key)
+                if isinstance(value, str):
+                    code = self._codes[key].get(value)
+                    if code is None:
+                        code = self._codes[key][value] = len(self._values[key])
+                        self._values[key].append(value)
+                    codes[key][row] = code
+                    del rest[key]
+            if "timestamp" in rest:
+                timestamps[row], exact = _column_timestamp(rest["timestamp"])
+                if exact:
+                    del rest["timestamp"]
+            extras.append(rest or None)
+        return (codes, timestamps), extras
+
+    def append(self, columns):
+        """Append encoded rows (the dictionaries are saved first, so every code resolves)."""
+        codes, timestamps = columns
+        self._save_dictionaries()
+        for key in DICT_KEYS:
+            with open(self.path / _code_file(key), "ab") as f:
+                f.write(codes[key].tobytes())
+        with open(self.path / TIMESTAMP_FILE, "ab") as f:
+            f.write(timestamps.tobytes())
+        self._count += len(timestamps)
+
+    def _save_dictionaries(self):
+        lengths = {key: len(values) for key, values in self._values.items()}
+        if lengths == self._saved:
+            return  # no new values (the common case)
+        tmp = self.path / (DICT_FILE + ".tmp")
+        tmp.write_text(json.dumps(self._values, ensure_ascii=False))
+        os.replace(tmp, self.path / DICT_FILE)
+        self._saved = lengths
+        stat = os.stat(self.path / DICT_FILE)
+        self._dict_state = (stat.st_ino, stat.st_mtime_ns)
+
+    def clear(self):
+        self.truncate(0)
+        self._set_dictionaries({})
+        self._dict_state = None
+        (self.path / DICT_FILE).unlink(missing_ok=True)
+
+    # ---- Reads ----
+    def __len__(self):
+        return self._count
+
+    def _columns(self):
+        """(Re)map the column files if rows were appended since the last mapping."""
+        maps = self._maps
+        if maps is None or len(maps[1]) != self._count:
+            if self._count == 0:
+                codes = {key: np.empty(0, dtype=_CODE_DTYPE) for key in DICT_KEYS}
+                timestamps = np.empty(0, dtype=_TS_DTYPE)
+            else:
+                codes = {key: np.memmap(self.path / _code_file(key), dtype=_CODE_DTYPE, mode="r",
+                                        shape=(self._count,)) for key in DICT_KEYS}
+                timestamps = np.memmap(self.path / TIMESTAMP_FILE, dtype=_TS_DTYPE, mode="r",
+                                       shape=(self._count,))
+            maps = self._maps = (codes, timestamps)
+        return maps
+
+    def codes(self, key: str) -> np.ndarray:
+        """Read-only int32 codes of key for every row (-1 = absent)."""
+        return self._columns()[0][key]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Read-only int64 epoch-µs timestamp of every row (MISSING_TS = absent)."""
+        return self._columns()[1]
+
+    def values(self, key: str) -> list:
+        """Dictionary of key: values[code]."""
+        return list(self._values[key])
+
+    def code_of(self, key: str, value) -> int:
+        return self._codes[key].get(value, -1)
+
+    def decode(self, row: int, extras: dict = None) -> dict:
+        """Rebuild row's metadata dict from the columns plus its extras."""
+        codes, timestamps = self._columns()
+        meta = {}
+        for key in DICT_KEYS:
+            code = int(codes[key][row])
+            if code >= 0:
+                meta[key] = self._values[key][code]
+        ts = int(timestamps[row])
+        if ts != MISSING_TS and not (extras and "timestamp" in extras):
+            meta["timestamp"] = from_epoch_us(ts)
+        if extras:
+            meta.update(extras)
+        return meta
+
+
+class MetadataIndex:
+    """Vectorized filters over a store's metadata columns (no per-row Python objects)."""
+
+    def __init__(self, columns: MetadataColumns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns)
+
+    def mask(self, source=None, since=None, until=None, user_id=None) -> np.ndarray:
+        """
+        Boolean row mask for the filters (None = not filtered).
+        source / user_id may be a single value or a list of accepted values;
+        since/until bound the timestamp (inclusive).
+        """
+        keep = np.ones(len(self), dtype=bool)
+        for key, accepted in (("source", source), ("user_id", user_id)):
+            if accepted is not None:
+                wanted = [accepted] if isinstance(accepted, str) else list(accepted)
+                # Lookup table indexed by code (the last slot is code -1, "absent")
+                table = np.zeros(len(self.columns.values(key)) + 1, dtype=bool)
+                table[[c for c in (self.columns.code_of(key, v) for v in wanted) if c >= 0]] = True
+                keep &= table[self.columns.codes(key)[:len(keep)]]
+        if since is not None or until is not None:
+            ts = self.columns.timestamps[:len(keep)]
+            keep &= ts != MISSING_TS
+            if since is not None:
+                keep &= ts >= to_epoch_us(since)
+            if until is not None:
+                keep &= ts <= to_epoch_us(until)
+        return keep
+
+    def sources(self) -> list[str]:
+        return self.columns.values("source")
@@ -0,0 +1,286 @@
+# backend/services/metrics.py
+"""
+Metrics
+-------
+In-process instrumentation, exported in the Prometheus text format on /metrics:
+- Counters: embeddings issued, searches, vectors searched, LLM tokens, ...
+- Histograms: per-stage timing spans (embed / search / context / llm) and
+  HTTP request latency
+- Callback metrics: read existing counters (e.g. cache hit/miss stats) at
+  scrape time instead of counting everything twice
+
+span(stage) also records its duration into the current request's timing list,
+which app.py turns into a Server-Timing response header when TIMING_HEADERS=1.
+
+With METRICS_ENABLED=0 every span is a shared no-op object and inc()/observe()
+return immediately, so instrumented code pays one attribute check.
+"""
+
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Add a Server-Timing header (per-stage durations) to every response
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "0") == "1"
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (stage, seconds) pairs of the request being handled (None outside requests)
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics), optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(n, "") for n in self.labelnames))
+        return series[-1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        out = []
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-2] + [0]):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                out.append((self.name + "_bucket", _labels(self.labelnames, key, le),
+                            cumulative if bound != float("inf") else series[-1]))
+            out.append((self.name + "_sum", _labels(self.labelnames, key), series[-2]))
+            out.append((self.name + "_count", _labels(self.labelnames, key), series[-1]))
+        return out
+
+
+class CallbackMetric:
+    """
+    Metric whose values are read from fn() at scrape time.
+    fn returns a number, or a dict {label value(s): number} when labelnames are set.
+    """
+
+    def __init__(self, name: str, kind: str, help: str, fn, labelnames=()):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        values = self.fn()
+        if not self.labelnames:
+            return [(self.name, "", values)]
+        return [(self.name, _labels(self.labelnames, key if isinstance(key, tuple) else (key,)), value)
+                for key, value in values.items()]
+
+
+class Registry:
+    """Named metrics, rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Registering a name again returns the existing metric; callbacks are replaced
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, CallbackMetric):
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, kind: str, help: str, fn, labelnames=()) -> CallbackMetric:
+        return self._register(CallbackMetric(name, kind, help, fn, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue  # a failing callback must not break the whole scrape
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---- Metrics shared across services ----
+STAGE_SECONDS = REGISTRY.histogram(
+    "secondbrain_stage_seconds", "Duration of one pipeline stage", ("stage",))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "secondbrain_http_request_seconds", "HTTP request latency (until response headers)",
+    ("method", "route", "status"))
+EMBEDDINGS_ISSUED = REGISTRY.counter(
+    "secondbrain_embeddings_issued_total", "Texts sent to the embedding provider (cache misses)")
+EMBEDDING_REQUESTS = REGISTRY.counter(
+    "secondbrain_embedding_requests_total", "Embedding provider round-trips")
+SEARCHES = REGISTRY.counter(
+    "secondbrain_searches_total", "Memory searches", ("mode",))
+VECTORS_SEARCHED = REGISTRY.counter(
+    "secondbrain_vectors_searched_total", "Live vectors in the indexes that vector searches ran against")
+TOKENS_USED = REGISTRY.counter(
+    "secondbrain_llm_tokens_total", "Tokens sent to / generated by the LLM", ("kind",))
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(stage: str):
+    """Context manager timing one stage: `with span("search"): ...`."""
+    return _Span(stage) if METRICS_ENABLED else _NOOP_SPAN
+
+
+def timed(stage: str):
+    """Decorator form of span() for whole (sync or async) functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def begin_request() -> list:
+    """Start collecting span timings for the current request; returns the list they go to."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    HTTP_REQUEST_SECONDS.observe(seconds, method=method, route=route, status=str(status))
+
+
+def server_timing(timings: list, total: float) -> str:
+    """Server-Timing header value; repeated stages (e.g. two searches) are summed."""
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    totals["total"] = total
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in totals.items())
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format (for GET /metrics)."""
+    return REGISTRY.render()
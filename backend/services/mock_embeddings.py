@@ -1,4 +1,4 @@
-# backend/services/embeddings.py
+# backend/services/mock_embeddings.py
 """
 Embeddings Service (Mock Version)
 ---------------------------------
@@ -7,9 +7,12 @@ so the rest of the system (memory store + retrieval) still works.
 When you get an API key, switch USE_MOCK = False to use real embeddings.
 """
 
-import hashlib
-import numpy as np
+import functools
 import os
+import re
+import zlib
+
+import numpy as np
 
 USE_MOCK = True  # set to False when real API key is available
 
@@ -19,16 +22,58 @@ if not USE_MOCK and os.getenv("OPENAI_API_KEY"):
     client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     EMBEDDING_MODEL = "text-embedding-ada-002"
 
-def _mock_embed(text: str, dim: int = 128):
+# Mock vectors are computed locally, so batches are only capped to keep memory flat
+MAX_BATCH_SIZE = 2048
+
+# Hashed-token random projection settings
+MOCK_DIM = 128           # matches memory_store.VECTOR_DIM
+MOCK_SEED = 42           # same seed -> same vectors across runs and machines
+MOCK_BUCKETS = 2 ** 14   # token hash space (collisions only add a little noise)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=8)
+def _projection(dim: int, seed: int) -> np.ndarray:
+    """One fixed random float32 direction per token bucket, (MOCK_BUCKETS, dim)."""
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((MOCK_BUCKETS, dim), dtype=np.float32)
+
+
+@functools.lru_cache(maxsize=1_000_000)
+def _bucket(token: str) -> int:
+    # crc32 is stable across processes (unlike hash()), so vectors are reproducible
+    return zlib.crc32(token.encode("utf-8")) % MOCK_BUCKETS
+
+
+def mock_embed_batch(texts: list[str], dim: int = MOCK_DIM, seed: int = MOCK_SEED) -> np.ndarray:
+    """
+    Embed a whole batch into a (len(texts), dim) float32 matrix.
+
+    Each text is the L2-normalized sum of the random directions of its
+    (lower-cased) word tokens, so texts sharing words get nearby vectors
+    and cosine / L2 retrieval behaves like it would on real embeddings.
+    """
+    if len(texts) == 0:
+        return np.empty((0, dim), dtype=np.float32)
+    buckets, starts = [], []
+    for text in texts:
+        starts.append(len(buckets))
+        tokens = _TOKEN_RE.findall(text.lower()) or [text]
+        buckets.extend(_bucket(t) for t in tokens)
+
+    rows = _projection(dim, seed)[np.asarray(buckets, dtype=np.int64)]
+    out = np.add.reduceat(rows, np.asarray(starts, dtype=np.int64), axis=0)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    out /= np.maximum(norms, 1e-12)
+    return out
+
+def _mock_embed(text: str, dim: int = MOCK_DIM):
     """
     Generate a deterministic fake embedding vector from text.
-    Uses SHA256 hash to create pseudo-random numbers.
+    (Single-text wrapper around mock_embed_batch.)
     """
-    h = hashlib.sha256(text.encode("utf-8")).hexdigest()
-    nums = [int(h[i:i+4], 16) % 1000 for i in range(0, len(h), 4)]
-    # normalize to 0-1 range
-    arr = np.array(nums[:dim]) / 1000.0
-    return arr.tolist()
+    return mock_embed_batch([text], dim=dim)[0].tolist()
 
 def embed_text(text: str):
     """
@@ -46,11 +91,28 @@ def embed_text(text: str):
         )
         return response.data[0].embedding
 
+async def aembed_text(text: str):
+    """
+    Async version of embed_text (mock vectors are computed inline).
+    """
+    return embed_text(text)
+
 def embed_batch(texts: list[str]):
     """
     Generate embeddings for a list of texts.
+    In mock mode this returns one (len(texts), MOCK_DIM) float32 matrix.
     """
     if not texts:
         return []
 
+    if USE_MOCK or not os.getenv("OPENAI_API_KEY"):
+        if any(not t or not t.strip() for t in texts):
+            raise ValueError("Cannot embed empty text")
+        return mock_embed_batch(texts)
     return [embed_text(t) for t in texts]
+
+async def aembed_batch(texts: list[str]):
+    """
+    Async version of embed_batch.
+    """
+    return embed_batch(texts)
@@ -0,0 +1,457 @@
+# backend/services/persistence.py
+"""
+Persistence Service
+-------------------
+On-disk format for the memory store, so memories survive restarts
+without being re-embedded.
+
+A store directory holds:
+  • vectors.f32    – raw float32 rows, one per memory (memory-mapped on open)
+  • records.jsonl  – append-only log of {"text"} records, plus "meta" for
+                     metadata keys that have no column (free-form extras)
+  • records.idx    – int64 end offset of every record in records.jsonl
+  • ids.i64        – stable memory id of every row (an update appends a new
+                     row with the same id)
+  • deleted.i64    – append-only list of tombstoned rows
+  • meta_*.i32/i64 – metadata columns: dictionary codes of source and user_id,
+                     epoch-µs timestamps (+ meta_dict.json, the code -> value
+                     dictionaries; see services/metadata_index.py)
+  • segments/      – sealed FAISS index segments, each covering a contiguous
+                     range of rows (+ manifest.json listing the live ones;
+                     stores from before segments have a single index.faiss)
+  • store.json     – vector dimension and metric the store was created with
+
+records.idx is written last, so it is the commit point: on open, anything
+in the other files past the last committed record is truncated away.
+
+Several processes (uvicorn workers) may open the same store. Writes are
+serialized by an exclusive lock on <dir>.lock (see FileLock); whoever holds
+it first catches up with rows other processes committed. Readers never take
+it: committed rows are immutable, so they only ever map more of the files.
+Stores written before the metadata columns existed get them filled in from
+their records on open.
+
+Segment files are immutable: a seal or merge writes a new file and then
+swaps manifest.json, so a process still searching an older segment keeps
+its mapping; files the manifest no longer lists are removed afterwards.
+
+Compaction writes a fresh directory next to the store (<dir>.compact) and
+swaps it in with two renames; recover_compaction() finishes or discards a
+swap interrupted by a crash.
+"""
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so one process per store
+    fcntl = None
+
+import faiss
+import numpy as np
+
+from .metadata_index import MetadataColumns
+
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "records.idx"
+SEGMENTS_DIR = "segments"
+SNAPSHOT_FILE = "index.faiss"  # the one index of stores from before segments
+MANIFEST_FILE = "manifest.json"
+STORE_FILE = "store.json"
+IDS_FILE = "ids.i64"
+DELETED_FILE = "deleted.i64"
+
+COMPACT_SUFFIX = ".compact"
+OLD_SUFFIX = ".old"
+LOCK_SUFFIX = ".lock"                    # held while writing to the store
+MAINTENANCE_SUFFIX = ".maintenance.lock"  # held by segment builds and compactions
+
+_OFFSET_DTYPE = np.dtype("<i8")
+
+
+class MemoryLog:
+    """
+    Append-only vectors + text/metadata log for one store directory.
+    Nothing is held in Python lists: rows are read from memory-mapped
+    files on demand, so resident memory is bounded by the page cache.
+    """
+
+    def __init__(self, path, dim: int, metric: str = "l2"):
+        self.path = Path(path)
+        self.dim = dim
+        self.metric = metric
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._check_store()
+        if not (self.path / IDS_FILE).exists() and (self.path / OFFSETS_FILE).exists():
+            # Stores written before stable ids existed: id = row number
+            rows = os.path.getsize(self.path / OFFSETS_FILE) // _OFFSET_DTYPE.itemsize
+            np.arange(rows, dtype=_OFFSET_DTYPE).tofile(self.path / IDS_FILE)
+        for name in (VECTORS_FILE, RECORDS_FILE, OFFSETS_FILE, IDS_FILE, DELETED_FILE):
+            (self.path / name).touch(exist_ok=True)
+        self.meta_columns = MetadataColumns(self.path)
+        self._count = self._recover()
+        self._mapped = None  # (vectors, offsets, records, ids), swapped as one
+        self._backfill_columns()
+
+    # ---- Open / recovery ----
+    def _check_store(self):
+        """Refuse to open a store written with a different embedding dimension or metric."""
+        store_file = self.path / STORE_FILE
+        if store_file.exists():
+            stored = json.loads(store_file.read_text())
+            if stored["dim"] != self.dim:
+                raise ValueError(
+                    f"Memory store at {self.path} holds {stored['dim']}-dim vectors but the "
+                    f"configured embedding backend produces {self.dim}-dim vectors"
+                )
+            # Stores from before metrics were configurable are L2
+            if stored.get("metric", "l2") != self.metric:
+                raise ValueError(
+                    f"Memory store at {self.path} was built for the {stored.get('metric', 'l2')!r} "
+                    f"metric, not {self.metric!r} (MEMORY_METRIC); re-import it to switch"
+                )
+        else:
+            store_file.write_text(json.dumps({"dim": self.dim, "metric": self.metric}))
+
+    def recover(self) -> int:
+        """
+        Drop any partially written tail left by a crash (or by another process
+        that died mid-append) and pick up rows other processes committed.
+        Only safe while holding the store's write lock; returns the row count.
+        """
+        self._count = self._recover()
+        self.meta_columns.reload()
+        return self._count
+
+    def refresh(self) -> int:
+        """Pick up rows other processes committed, without taking the write lock."""
+        committed = os.path.getsize(self.path / OFFSETS_FILE) // _OFFSET_DTYPE.itemsize
+        if committed > self._count:
+            self.meta_columns.reload()
+            self.meta_columns.extend_to(committed)
+            self._count = committed
+        return self._count
+
+    def _recover(self) -> int:
+        """Drop any partially written tail left by a crash; return the row count."""
+        offsets_path = self.path / OFFSETS_FILE
+        row_bytes = self.dim * 4
+        count = min(os.path.getsize(offsets_path) // _OFFSET_DTYPE.itemsize,
+                    os.path.getsize(self.path / VECTORS_FILE) // row_bytes,
+                    os.path.getsize(self.path / IDS_FILE) // _OFFSET_DTYPE.itemsize)
+        os.truncate(offsets_path, count * _OFFSET_DTYPE.itemsize)
+        os.truncate(self.path / VECTORS_FILE, count * row_bytes)
+        os.truncate(self.path / IDS_FILE, count * _OFFSET_DTYPE.itemsize)
+        deleted_path = self.path / DELETED_FILE
+        os.truncate(deleted_path, os.path.getsize(deleted_path) // 8 * 8)
+
+        end = 0
+        if count:
+            with open(offsets_path, "rb") as f:
+                f.seek((count - 1) * _OFFSET_DTYPE.itemsize)
+                end = int(np.frombuffer(f.read(_OFFSET_DTYPE.itemsize), dtype=_OFFSET_DTYPE)[0])
+        os.truncate(self.path / RECORDS_FILE, end)
+        self.meta_columns.truncate(min(count, self.meta_columns.stored_rows()))
+        return count
+
+    def _backfill_columns(self, chunk: int = 10_000):
+        """Encode the metadata columns of rows that have none (stores from before columns)."""
+        columns = self.meta_columns
+        for start in range(len(columns), self._count, chunk):
+            rows = range(start, min(start + chunk, self._count))
+            # Their records keep the full metadata, which decode() layers over the columns
+            encoded, _ = columns.encode([self._raw_record(i).get("meta") for i in rows])
+            columns.append(encoded)
+
+    def _maps(self):
+        """
+        (Re)map the files if rows were appended since the last mapping.
+        The maps are replaced as one tuple, so a reader thread never pairs
+        new vectors with old offsets; older maps stay valid for their rows.
+        """
+        count = self._count
+        mapped = self._mapped
+        if mapped is None or len(mapped[0]) != count:
+            if count == 0:
+                mapped = (np.empty((0, self.dim), dtype="float32"), np.empty(0, dtype=_OFFSET_DTYPE),
+                          b"", np.empty(0, dtype=_OFFSET_DTYPE))
+            else:
+                mapped = (
+                    np.memmap(self.path / VECTORS_FILE, dtype="float32", mode="r",
+                              shape=(count, self.dim)),
+                    np.memmap(self.path / OFFSETS_FILE, dtype=_OFFSET_DTYPE, mode="r", shape=(count,)),
+                    np.memmap(self.path / RECORDS_FILE, dtype="uint8", mode="r"),
+                    np.memmap(self.path / IDS_FILE, dtype=_OFFSET_DTYPE, mode="r", shape=(count,)),
+                )
+            self._mapped = mapped
+        return mapped
+
+    def unmap(self):
+        """Drop this log's memory maps (views holding them keep theirs); the next read remaps."""
+        self._mapped = None
+
+    # ---- Writes ----
+    def append(self, texts: list[str], vectors: np.ndarray, metas: list[dict], ids=None):
+        """
+        Append rows; vectors must be a (len(texts), dim) float32 array.
+        ids are the rows' stable memory ids (default: their row numbers).
+        """
+        if len(texts) == 0:
+            return
+        if ids is None:
+            ids = np.arange(self._count, self._count + len(texts))
+        columns, extras = self.meta_columns.encode(metas)
+        lines = [
+            (json.dumps({"text": t, "meta": m} if m else {"text": t}, ensure_ascii=False)
+             + "\n").encode("utf-8")
+            for t, m in zip(texts, extras)
+        ]
+        start = os.path.getsize(self.path / RECORDS_FILE)
+        ends = start + np.cumsum([len(line) for line in lines], dtype=_OFFSET_DTYPE)
+
+        with open(self.path / RECORDS_FILE, "ab") as f:
+            f.write(b"".join(lines))
+        with open(self.path / VECTORS_FILE, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+        with open(self.path / IDS_FILE, "ab") as f:
+            f.write(np.asarray(ids, dtype=_OFFSET_DTYPE).tobytes())
+        self.meta_columns.append(columns)
+        # Commit point: rows only exist once their offsets are written
+        with open(self.path / OFFSETS_FILE, "ab") as f:
+            f.write(ends.astype(_OFFSET_DTYPE).tobytes())
+        self._count += len(texts)
+
+    def mark_deleted(self, rows):
+        """Tombstone rows (persisted; the data stays until compaction)."""
+        with open(self.path / DELETED_FILE, "ab") as f:
+            f.write(np.asarray(rows, dtype=_OFFSET_DTYPE).tobytes())
+
+    def clear(self):
+        """Remove every row and every index segment."""
+        self._mapped = None
+        for name in (VECTORS_FILE, RECORDS_FILE, OFFSETS_FILE, IDS_FILE, DELETED_FILE):
+            os.truncate(self.path / name, 0)
+        self.meta_columns.clear()
+        for name in (SNAPSHOT_FILE, MANIFEST_FILE):
+            (self.path / name).unlink(missing_ok=True)
+        shutil.rmtree(self.path / SEGMENTS_DIR, ignore_errors=True)
+        self._count = 0
+
+    # ---- Reads ----
+    def __len__(self):
+        return self._count
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only (n, dim) memory-mapped view of all vectors."""
+        return self._maps()[0]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Read-only memory-mapped stable id of every row."""
+        return self._maps()[3]
+
+    def deleted_rows(self, start: int = 0) -> np.ndarray:
+        """Rows tombstoned so far (only those that still exist), from the start-th tombstone on."""
+        rows = np.fromfile(self.path / DELETED_FILE, dtype=_OFFSET_DTYPE,
+                           offset=start * _OFFSET_DTYPE.itemsize)
+        return rows[rows < self._count]
+
+    def disk_state(self) -> tuple:
+        """
+        Cheap fingerprint of what other processes may have changed: the
+        directory (replaced by compaction), committed rows, tombstones and
+        the snapshot. Equal fingerprints mean there is nothing to pick up.
+        """
+        try:
+            directory = os.stat(self.path).st_ino
+            offsets = os.path.getsize(self.path / OFFSETS_FILE)
+            deleted = os.path.getsize(self.path / DELETED_FILE)
+        except FileNotFoundError:
+            return None
+        try:
+            manifest = os.stat(self.path / MANIFEST_FILE)
+            snapshot = (manifest.st_ino, manifest.st_mtime_ns)
+        except FileNotFoundError:
+            snapshot = None
+        return (directory, offsets // _OFFSET_DTYPE.itemsize, deleted // _OFFSET_DTYPE.itemsize, snapshot)
+
+    def _raw_record(self, i: int) -> dict:
+        """Row i's record as stored: {"text"} plus "meta" extras, if any."""
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        _, offsets, records, _ = self._maps()
+        start = int(offsets[i - 1]) if i else 0
+        return json.loads(bytes(records[start:int(offsets[i])]))
+
+    def record(self, i: int) -> dict:
+        """Return {"text", "meta"} for row i (meta rebuilt from the columns + extras)."""
+        raw = self._raw_record(i)
+        return {"text": raw["text"], "meta": self.meta_columns.decode(i, raw.get("meta"))}
+
+    def text(self, i: int) -> str:
+        return self._raw_record(i)["text"]
+
+    def meta(self, i: int) -> dict:
+        return self.record(i)["meta"]
+
+    def texts(self):
+        """Iterate over all texts in insertion order."""
+        for i in range(self._count):
+            yield self.text(i)
+
+
+# ---- Inter-process locks ----
+class FileLock:
+    """
+    Exclusive flock() on a lock file, shared by every process that opens the
+    store. Not re-entrant: each acquire opens its own descriptor, so a second
+    acquire blocks even within one process. Without fcntl it is a no-op.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if fcntl is None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            os.close(fd)  # closing the descriptor drops the lock
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def store_lock(path) -> FileLock:
+    """The write lock of the store at path (a file next to it, so it survives compaction)."""
+    path = Path(path)
+    return FileLock(path.with_name(path.name + LOCK_SUFFIX))
+
+
+def maintenance_lock(path) -> FileLock:
+    """Held by whoever is rebuilding or compacting the store at path."""
+    path = Path(path)
+    return FileLock(path.with_name(path.name + MAINTENANCE_SUFFIX))
+
+
+# ---- FAISS index segments ----
+def write_segment(index, path, start: int, end: int) -> str:
+    """
+    Write index (covering rows [start, end)) to a new segment file and
+    return its name relative to path. It is not used until a manifest lists it.
+    """
+    path = Path(path)
+    (path / SEGMENTS_DIR).mkdir(exist_ok=True)
+    name = f"{SEGMENTS_DIR}/{start:012d}-{end:012d}-{time.time_ns():x}.faiss"
+    tmp = path / (name + ".tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, path / name)
+    return name
+
+
+def save_manifest(path, segments: list, dim: int):
+    """Atomically make segments, a list of (name, start, end), the store's index."""
+    path = Path(path)
+    tmp = path / (MANIFEST_FILE + ".tmp")
+    tmp.write_text(json.dumps({
+        "dim": dim,
+        "segments": [{"file": name, "start": start, "end": end} for name, start, end in segments],
+    }))
+    os.replace(tmp, path / MANIFEST_FILE)
+
+
+def load_manifest(path, dim: int) -> list:
+    """
+    The (name, start, end) segments listed in the manifest, in row order.
+    Empty if there is no usable manifest or the segments don't tile the
+    rows from 0 on; a pre-segment snapshot reads as one segment.
+    """
+    path = Path(path)
+    try:
+        manifest = json.loads((path / MANIFEST_FILE).read_text())
+    except (OSError, ValueError):
+        return []
+    if manifest.get("dim") != dim:
+        return []
+    if "segments" not in manifest:
+        count = manifest.get("count", 0)
+        return [(SNAPSHOT_FILE, 0, count)] if count else []
+    segments = [(s["file"], s["start"], s["end"]) for s in manifest["segments"]]
+    expected = 0
+    for _, start, end in segments:
+        if start != expected or end <= start:
+            return []
+        expected = end
+    return segments
+
+
+def read_segment(path, name: str):
+    """
+    Memory-map a segment file, so every process that opens the store shares
+    one copy of it in the page cache. Raises RuntimeError if it is gone.
+    """
+    return faiss.read_index(str(Path(path) / name), faiss.IO_FLAG_MMAP)
+
+
+def remove_unused_segments(path, dim: int):
+    """
+    Delete segment files the manifest no longer lists (replaced by a merge,
+    or left by a crash). Only safe while holding the maintenance lock.
+    """
+    path = Path(path)
+    keep = {name for name, _, _ in load_manifest(path, dim)}
+    if SNAPSHOT_FILE not in keep:
+        (path / SNAPSHOT_FILE).unlink(missing_ok=True)
+    segments_dir = path / SEGMENTS_DIR
+    if segments_dir.is_dir():
+        for file in segments_dir.iterdir():
+            if f"{SEGMENTS_DIR}/{file.name}" not in keep:
+                file.unlink(missing_ok=True)
+
+
+# ---- Compaction swap ----
+def recover_compaction(path):
+    """
+    Finish or discard a compaction swap interrupted by a crash.
+    The .compact directory is only renamed into place once it is complete,
+    so if the store directory is missing the .compact copy is the live one.
+    """
+    path = Path(path)
+    compact = path.with_name(path.name + COMPACT_SUFFIX)
+    old = path.with_name(path.name + OLD_SUFFIX)
+    if not path.exists() and compact.exists():
+        os.rename(compact, path)
+    shutil.rmtree(compact, ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def swap_in_compacted(path):
+    """Atomically-enough replace path with its finished .compact directory."""
+    path = Path(path)
+    compact = path.with_name(path.name + COMPACT_SUFFIX)
+    old = path.with_name(path.name + OLD_SUFFIX)
+    os.rename(path, old)
+    os.rename(compact, path)
+    shutil.rmtree(old, ignore_errors=True)
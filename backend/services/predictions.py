@@ -6,25 +6,218 @@ Given a user query:
 1️⃣ Embed the query
 2️⃣ Retrieve most relevant memories
 3️⃣ Generate an answer that reflects the user's own habits & knowledge
+
+ask() / aask() put a semantic answer cache (services/answer_cache.py) in
+front of step 3: a near-identical question whose retrieved memories are
+unchanged gets the cached answer instead of a new LLM call.
+
+The memories that go into the prompt are picked by the context builder
+(services/context_builder.py): near-duplicates are dropped, MMR can
+diversify them, and the prompt is kept within CONTEXT_TOKEN_BUDGET tokens.
+
+astream_ask() is the streaming variant: it yields the retrieved context
+first and then the answer token by token as the model produces it.
 """
 
+import asyncio
 import os
-from .embeddings import embed_text
-from .memory_store import search_memory
+import re
+import threading
+import time
+from .answer_cache import AnswerCache
+from .context_builder import build_context, count_tokens
+from .embeddings import embed_text, aembed_text
+from . import metrics
+from .metrics import REGISTRY, TOKENS_USED, span, timed
+from .memory_store import (
+    METRIC, add_listener, arun, get_memory_vectors, search_hits, asearch_hits,
+)
 
 USE_MOCK = True  # Set to False if you have a real OpenAI API key
 
-if not USE_MOCK and os.getenv("OPENAI_API_KEY"):
-    from openai import OpenAI
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    COMPLETION_MODEL = "gpt-4o-mini"  # small/cheap model
+# How memories are retrieved: "vector", "lexical" (BM25) or "hybrid" (both, rank-fused),
+# so questions about exact dates or names also find the memory that mentions them
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# Chat model that writes the answers (and whose tokenizer sizes the prompt)
+COMPLETION_MODEL = "gpt-4o-mini"  # small/cheap model
+
+# Prompt assembly: token limit for the whole prompt, cosine similarity above which
+# two memories count as duplicates, optional MMR trade-off (unset = off), and how
+# many candidates per context slot are retrieved so dropped memories can be replaced
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", 0.95))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA")) if os.getenv("CONTEXT_MMR_LAMBDA") else None
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", 2))
+
+# Answer cache: entries per process, lifetime, and how similar a question must be to reuse one
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1_000))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+answer_cache = AnswerCache(max_items=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                           threshold=ANSWER_CACHE_THRESHOLD, metric=METRIC)
+# New, edited or deleted memories drop the cached answers they could change, including
+# memories other worker processes change (reported when this process picks them up)
+add_listener(answer_cache.on_memory_event)
+REGISTRY.callback(
+    "secondbrain_answer_cache_lookups_total", "counter", "Answer cache lookups by result",
+    lambda: {"hit": answer_cache.hits, "miss": answer_cache.misses}, labelnames=("result",),
+)
+REGISTRY.callback(
+    "secondbrain_answer_cache_invalidations_total", "counter",
+    "Cached answers dropped because memories changed", lambda: answer_cache.invalidations,
+)
+
+# OpenAI clients, created on first use (or by warmup()) so importing this
+# module doesn't pay for the SDK import
+_client = None
+_aclient = None
+_client_lock = threading.Lock()
+
+def _openai_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _client
+
+def _openai_aclient():
+    # Pooled async client for the request handlers
+    global _aclient
+    with _client_lock:
+        if _aclient is None:
+            import httpx
+            from openai import AsyncOpenAI
+            _aclient = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 100))),
+                    timeout=httpx.Timeout(60.0, connect=5.0),
+                ),
+            )
+        return _aclient
+
+def warmup():
+    """Create the LLM clients now instead of on the first question (no-op with the mock)."""
+    if not _use_mock():
+        _openai_client()
+        _openai_aclient()
+
+# Delay between streamed tokens of the mock answer (0 = none), e.g. 20 to measure
+# time-to-first-token offline against a model-like token rate
+MOCK_STREAM_DELAY_MS = float(os.getenv("MOCK_STREAM_DELAY_MS", 0))
+# Simulated completion latency of the (non-streamed) mock answer, for load tests
+MOCK_LLM_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", 0))
+
+def _use_mock() -> bool:
+    return USE_MOCK or not os.getenv("OPENAI_API_KEY")
+
+def _mock_answer(question: str, memories: list[str]) -> str:
+    # Simple mock: echo back memories + question
+    if memories:
+        return (
+            f"🤖 (Mock Second Brain)\n"
+            f"You asked: '{question}'\n"
+            f"I remember these things about you:\n- "
+            + "\n- ".join(memories)
+            + "\nSo my guess is based on that memory."
+        )
+    else:
+        return (
+            f"🤖 (Mock Second Brain)\n"
+            f"You asked: '{question}'\n"
+            f"But I don't have any memories yet."
+        )
+
+def _build_messages(question: str, memories: list[str]) -> list[dict]:
+    context = "\n".join(memories) if memories else "No stored memories yet."
+    prompt = (
+        "You are the user's 'second brain'. "
+        "Use the following memories to answer the question as if you are the user.\n\n"
+        f"Memories:\n{context}\n\n"
+        f"Question: {question}\n"
+        "Answer like the user would:"
+    )
+    return [{"role": "user", "content": prompt}]
+
+@timed("context")
+def select_context(user_id: str, question: str, query_vec, hits: list[dict],
+                   top_k: int) -> tuple[list[dict], int]:
+    """
+    Pick up to top_k of the retrieved hits for the prompt (dedup, MMR, token budget).
+    Returns:
+        (list[dict], int): Chosen hits, and the prompt's token count
+    """
+    vectors = get_memory_vectors([h["id"] for h in hits], user_id=user_id)
+    # [""] renders the template with an empty memory section
+    base_tokens = count_tokens(_build_messages(question, [""])[0]["content"], COMPLETION_MODEL)
+    hits, _ = build_context(
+        hits, vectors, top_k, CONTEXT_TOKEN_BUDGET,
+        base_tokens=base_tokens,
+        dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+        query_vector=query_vec,
+        mmr_lambda=CONTEXT_MMR_LAMBDA,
+        model=COMPLETION_MODEL,
+    )
+    # Report the exact size of the prompt that is actually sent
+    prompt = _build_messages(question, [h["text"] for h in hits])[0]["content"]
+    return hits, count_tokens(prompt, COMPLETION_MODEL)
+
+def _count_llm_tokens(prompt_tokens: int, answer: str):
+    """Add one LLM call's prompt and completion tokens to the usage counter."""
+    if metrics.METRICS_ENABLED:
+        TOKENS_USED.inc(prompt_tokens, kind="prompt")
+        TOKENS_USED.inc(count_tokens(answer, COMPLETION_MODEL), kind="completion")
+
+@timed("llm")
+def answer_from_memories(question: str, memories: list[str]) -> str:
+    """
+    Generate the answer for question from already retrieved memories.
+    """
+    if _use_mock():
+        if MOCK_LLM_LATENCY_MS:
+            time.sleep(MOCK_LLM_LATENCY_MS / 1000)
+        return _mock_answer(question, memories)
+    # Real OpenAI completion call
+    resp = _openai_client().chat.completions.create(
+        model=COMPLETION_MODEL,
+        messages=_build_messages(question, memories),
+        temperature=0.7
+    )
+    return resp.choices[0].message.content.strip()
+
+def ask(user_id: str, question: str, top_k: int = 3) -> dict:
+    """
+    Retrieve memories and answer question, reusing a cached answer when a
+    similar question was answered from the same memories.
+    Returns:
+        dict: {"context": list[str], "answer": str, "cached": bool, "prompt_tokens": int}
+    """
+    query_vec = embed_text(question)
+    hits = search_hits(query_vec, k=top_k * CONTEXT_CANDIDATES, user_id=user_id,
+                       query_text=question, mode=RETRIEVAL_MODE)
+    hits, prompt_tokens = select_context(user_id, question, query_vec, hits, top_k)
+    memories = [h["text"] for h in hits]
+    result = {"context": memories, "cached": True, "prompt_tokens": prompt_tokens}
+    answer = answer_cache.get(user_id, query_vec, [h["id"] for h in hits], top_k)
+    if answer is None:
+        answer = answer_from_memories(question, memories)
+        _count_llm_tokens(prompt_tokens, answer)
+        answer_cache.put(user_id, question, query_vec, hits, top_k, answer)
+        result["cached"] = False
+    return {**result, "answer": answer}
+
+def answer_cache_stats() -> dict:
+    """Hit/miss/invalidation counters of the answer cache."""
+    return answer_cache.stats()
 
 def generate_response(user_id: str, question: str, top_k: int = 3) -> str:
     """
     Generate a 'Second Brain' style response to the user's question.
 
     Args:
-        user_id (str): Unique user identifier (optional for now)
+        user_id (str): Unique user identifier (only their memories are searched)
         question (str): The question to ask the Second Brain
         top_k (int): How many top memories to use for context
 
@@ -34,43 +227,102 @@ def generate_response(user_id: str, question: str, top_k: int = 3) -> str:
     if not question.strip():
         return "I need a question to think about!"
 
-    # 1️⃣ Embed the query
-    query_vec = embed_text(question)
+    # 3️⃣ Generate a response (or reuse a cached one)
+    return ask(user_id, question, top_k)["answer"]
 
-    # 2️⃣ Retrieve top memories
-    memories = search_memory(query_vec, k=top_k)
+# ---- Async API (for FastAPI handlers) ----
+@timed("llm")
+async def aanswer_from_memories(question: str, memories: list[str]) -> str:
+    """
+    Async answer_from_memories using the pooled AsyncOpenAI client.
+    """
+    if _use_mock():
+        if MOCK_LLM_LATENCY_MS:
+            await asyncio.sleep(MOCK_LLM_LATENCY_MS / 1000)
+        return _mock_answer(question, memories)
+    resp = await _openai_aclient().chat.completions.create(
+        model=COMPLETION_MODEL,
+        messages=_build_messages(question, memories),
+        temperature=0.7
+    )
+    return resp.choices[0].message.content.strip()
 
-    context = "\n".join(memories) if memories else "No stored memories yet."
+async def aask(user_id: str, question: str, top_k: int = 3) -> dict:
+    """
+    Async version of ask().
+    """
+    query_vec = await aembed_text(question)
+    hits = await asearch_hits(query_vec, k=top_k * CONTEXT_CANDIDATES, user_id=user_id,
+                              query_text=question, mode=RETRIEVAL_MODE)
+    # Vector reads and token counting block, so they run on the store's pool
+    hits, prompt_tokens = await arun(select_context, user_id, question, query_vec, hits, top_k)
+    memories = [h["text"] for h in hits]
+    result = {"context": memories, "cached": True, "prompt_tokens": prompt_tokens}
+    answer = answer_cache.get(user_id, query_vec, [h["id"] for h in hits], top_k)
+    if answer is None:
+        answer = await aanswer_from_memories(question, memories)
+        _count_llm_tokens(prompt_tokens, answer)
+        answer_cache.put(user_id, question, query_vec, hits, top_k, answer)
+        result["cached"] = False
+    return {**result, "answer": answer}
 
-    # 3️⃣ Generate a response
-    if USE_MOCK or not os.getenv("OPENAI_API_KEY"):
-        # Simple mock: echo back memories + question
-        if memories:
-            return (
-                f"🤖 (Mock Second Brain)\n"
-                f"You asked: '{question}'\n"
-                f"I remember these things about you:\n- "
-                + "\n- ".join(memories)
-                + "\nSo my guess is based on that memory."
-            )
-        else:
-            return (
-                f"🤖 (Mock Second Brain)\n"
-                f"You asked: '{question}'\n"
-                f"But I don't have any memories yet."
-            )
+async def astream_answer(question: str, memories: list[str]):
+    """
+    Async generator over the answer's text chunks, yielded as the model
+    produces them (the mock answer is streamed word by word).
+    """
+    if _use_mock():
+        # Keep the whitespace with each word so the chunks join back to the full answer
+        for token in re.findall(r"\s*\S+", _mock_answer(question, memories)):
+            await asyncio.sleep(MOCK_STREAM_DELAY_MS / 1000)
+            yield token
+        return
+    stream = await _openai_aclient().chat.completions.create(
+        model=COMPLETION_MODEL,
+        messages=_build_messages(question, memories),
+        temperature=0.7,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def astream_ask(user_id: str, question: str, top_k: int = 3):
+    """
+    Streaming version of aask(). Yields (event, data) pairs:
+      • ("context", {"context": [...], "cached": bool, "prompt_tokens": int})
+        as soon as retrieval is done
+      • ("token", str) for every chunk of the answer
+      • ("done", {"answer": str}) once the answer is complete
+    A cached answer is sent as a single token event.
+    """
+    query_vec = await aembed_text(question)
+    hits = await asearch_hits(query_vec, k=top_k * CONTEXT_CANDIDATES, user_id=user_id,
+                              query_text=question, mode=RETRIEVAL_MODE)
+    hits, prompt_tokens = await arun(select_context, user_id, question, query_vec, hits, top_k)
+    memories = [h["text"] for h in hits]
+    answer = answer_cache.get(user_id, query_vec, [h["id"] for h in hits], top_k)
+    yield "context", {"context": memories, "cached": answer is not None,
+                      "prompt_tokens": prompt_tokens}
+
+    if answer is None:
+        chunks = []
+        with span("llm"):
+            async for token in astream_answer(question, memories):
+                chunks.append(token)
+                yield "token", token
+        answer = "".join(chunks).strip()
+        _count_llm_tokens(prompt_tokens, answer)
+        answer_cache.put(user_id, question, query_vec, hits, top_k, answer)
     else:
-        # Real OpenAI completion call
-        prompt = (
-            "You are the user's 'second brain'. "
-            "Use the following memories to answer the question as if you are the user.\n\n"
-            f"Memories:\n{context}\n\n"
-            f"Question: {question}\n"
-            "Answer like the user would:"
-        )
-        resp = client.chat.completions.create(
-            model=COMPLETION_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
-        return resp.choices[0].message.content.strip()
+        yield "token", answer
+    yield "done", {"answer": answer}
+
+async def agenerate_response(user_id: str, question: str, top_k: int = 3) -> str:
+    """
+    Async version of generate_response.
+    """
+    if not question.strip():
+        return "I need a question to think about!"
+
+    return (await aask(user_id, question, top_k))["answer"]
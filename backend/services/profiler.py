@@ -0,0 +1,158 @@
+# backend/services/profiler.py
+"""
+Sampling Profiler
+-----------------
+Low-overhead, always-available CPU profiler that can be switched on at runtime
+(POST /debug/profiler/start) while the server is under real load:
+- A background thread wakes every interval_ms and records the Python stack
+  of every other thread (sys._current_frames), so nothing is instrumented
+  and the profiled code runs at full speed
+- Stacks are aggregated in memory and reported as the top functions
+  (self / total samples) or as collapsed stacks ("a;b;c 42" per line),
+  which flamegraph.pl and speedscope read directly
+- Threads parked in a wait (idle pool workers, the event loop's select)
+  are counted as idle samples rather than reported as hot spots
+- It stops by itself after duration_s; when it is off there is no thread
+  and no cost at all
+
+Sampling only sees Python frames: time spent inside FAISS or numpy shows up
+on the Python line that called into them.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILER_ALLOWED = os.getenv("PROFILER_ALLOWED", "1") != "0"
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 10))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 300))  # auto-stop
+MAX_STACK_DEPTH = 64
+
+# Leaf frames of threads that are parked, not working (pool workers, event loop, waits);
+# their samples are counted as idle instead of crowding out the real hot spots
+IDLE_FRAMES = frozenset({
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"), ("queue.py", "get"),
+    ("thread.py", "_worker"), ("process.py", "_worker"), ("socket.py", "accept"),
+})
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Periodically samples all thread stacks; start()/stop() may be called from any thread."""
+
+    def __init__(self):
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.interval = PROFILER_INTERVAL_MS / 1000
+        self.samples = 0
+        self.idle = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = None, duration_s: float = None) -> bool:
+        """Start sampling (clearing the previous profile); False if already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = max(interval_ms or PROFILER_INTERVAL_MS, 1) / 1000
+            duration = min(duration_s or PROFILER_MAX_SECONDS, PROFILER_MAX_SECONDS)
+            self._stacks = Counter()
+            self.samples = self.idle = 0
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration,), daemon=True,
+                                            name="sampling-profiler")
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Stop sampling; the collected profile stays available until the next start()."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, duration: float):
+        me = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            if time.monotonic() >= deadline:
+                break
+        self.stopped_at = time.time()
+
+    def collapsed(self) -> str:
+        """Collapsed-stack profile, root first, one "frame;frame;frame count" per line."""
+        stacks = self._stacks.copy()
+        return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+
+    def top(self, limit: int = 30) -> list[dict]:
+        """Functions with the most samples on-CPU (self) and anywhere on the stack (total)."""
+        own, total = Counter(), Counter()
+        for stack, n in self._stacks.copy().items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for name in set(frames):
+                total[name] += n
+        return [{"function": name, "self": n, "total": total[name]}
+                for name, n in own.most_common(limit)]
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "idle_thread_samples": self.idle,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
+
+
+profiler = SamplingProfiler()
+
+
+def start_profiler(interval_ms: float = None, duration_s: float = None) -> dict:
+    """Turn the sampling profiler on (PermissionError if PROFILER_ALLOWED=0)."""
+    if not PROFILER_ALLOWED:
+        raise PermissionError("The sampling profiler is disabled (PROFILER_ALLOWED=0)")
+    profiler.start(interval_ms, duration_s)
+    return profiler.status()
+
+
+def stop_profiler(limit: int = 30) -> dict:
+    """Turn the profiler off and return its status plus the hottest functions."""
+    profiler.stop()
+    return {**profiler.status(), "top": profiler.top(limit)}
+
+
+def profiler_report(limit: int = 30) -> dict:
+    """Status and hottest functions so far, without stopping."""
+    return {**profiler.status(), "top": profiler.top(limit)}
+
+
+def profiler_collapsed() -> str:
+    return profiler.collapsed()
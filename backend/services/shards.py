@@ -0,0 +1,922 @@
+# backend/services/shards.py
+"""
+Memory Shards
+-------------
+Every user gets their own shard: a FAISS index plus its on-disk MemoryLog
+under <store root>/users/<user_id>/. Searching or clearing one user's
+memories only touches that user's vectors.
+
+ShardRegistry opens shards lazily on first access and keeps at most
+`max_loaded` of them in memory, evicting the least recently used one.
+
+Reads never wait for writes. Writers (one at a time per shard, across
+threads and processes) publish an immutable ShardView after every change,
+and a search runs against the view it started with, so it never blocks on
+or sees a half-applied add. Other processes sharing the store pick up new
+rows, tombstones and index segments from disk the next time they search.
+
+A shard's vectors are indexed like an LSM tree: recent rows form a small
+mutable head that is scanned exactly, older rows live in sealed, immutable
+FAISS segments. A background thread seals the head once it is big enough
+and merges runs of similar-size segments into bigger ones (a tiered merge
+policy), building ANN indexes for the big ones, so adds never wait for an
+index build and search quality improves as a shard grows.
+"""
+
+import logging
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from .index_factory import (
+    bitmap_selector, build_index, faiss_metric, index_type_of, knn, merge_results, prepare_vectors,
+    search_params, train_index,
+)
+from .lexical_index import LexicalIndex
+from .metadata_index import GrowableColumn, MetadataIndex
+from .persistence import (
+    COMPACT_SUFFIX, MemoryLog, load_manifest, maintenance_lock, read_segment, recover_compaction,
+    remove_unused_segments, save_manifest, store_lock, swap_in_compacted, write_segment,
+)
+
+
+def _fit(mask: np.ndarray, n: int) -> np.ndarray:
+    """mask cut or padded (with False) to n rows."""
+    if len(mask) >= n:
+        return mask[:n]
+    return np.concatenate([mask, np.zeros(n - len(mask), dtype=bool)])
+
+
+class Segment:
+    """A sealed, immutable FAISS index over log rows [start, end)."""
+
+    __slots__ = ("name", "start", "end", "index")
+
+    def __init__(self, name: str, start: int, end: int, index):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.index = index
+
+    def __len__(self):
+        return self.end - self.start
+
+
+class ShardView:
+    """
+    One consistent, immutable state of a shard: rows [0, base_rows) are in
+    sealed segments, rows [base_rows, rows) (the recent "head") are searched
+    exactly straight from the memory-mapped log. Nothing a view references is
+    modified after it is published; writers copy or append instead.
+    """
+
+    __slots__ = ("log", "segments", "rows", "alive", "dead", "id_rows", "metric",
+                 "lexical", "lexical_lock")
+
+    def __init__(self, log, segments, rows, alive, dead, id_rows, metric, lexical, lexical_lock):
+        self.log = log
+        self.segments = segments
+        self.rows = rows
+        self.alive = alive
+        self.dead = dead
+        self.id_rows = id_rows
+        self.metric = metric
+        self.lexical = lexical
+        self.lexical_lock = lexical_lock
+
+    def __len__(self):
+        """Number of live memories."""
+        return self.rows - self.dead
+
+    @property
+    def base_rows(self) -> int:
+        """Rows covered by the sealed segments."""
+        return self.segments[-1].end if self.segments else 0
+
+    @property
+    def index(self):
+        """The oldest (and largest) segment's index; an empty flat index before the first seal."""
+        if self.segments:
+            return self.segments[0].index
+        return build_index("flat", self.log.dim, 0, self.metric)
+
+    def row_of(self, memory_id: int) -> int:
+        """Log row of a live memory, or -1."""
+        if 0 <= memory_id < len(self.id_rows):
+            return int(self.id_rows[memory_id])
+        return -1
+
+    def memory_id(self, row: int) -> int:
+        return int(self.log.ids[row])
+
+    def record(self, row: int) -> dict:
+        return self.log.record(row)
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive)
+
+    @property
+    def meta_index(self) -> MetadataIndex:
+        """Filters over the metadata columns (written with every row, nothing to build)."""
+        return MetadataIndex(self.log.meta_columns)
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = None, ef_search: int = None,
+               mask: np.ndarray = None):
+        """
+        Return the raw FAISS (values, rows) for a (n_queries, dim) query matrix
+        (see index_factory.to_distances for the values): one index search
+        per segment, one exact scan over the head, merged into one top-k.
+        nprobe / ef_search trade recall for latency on IVF / HNSW tiers.
+        mask (bool per row) restricts the scan to the selected rows;
+        tombstoned rows are always excluded.
+        """
+        query = prepare_vectors(query, self.metric)
+        n, base = self.rows, self.base_rows
+        if mask is not None:
+            mask = _fit(mask, n)
+        if self.dead:
+            mask = self.alive if mask is None else self.alive & mask
+        k = max(1, min(k, len(self)))
+
+        results = []
+        for segment in self.segments:
+            selector = bits = None
+            if mask is not None:
+                selector, bits = bitmap_selector(mask[segment.start:segment.end])
+            params = search_params(segment.index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+            if params is None:
+                values, found = segment.index.search(query, k)
+            else:
+                values, found = segment.index.search(query, k, params=params)
+            results.append((values, np.where(found >= 0, found + segment.start, -1)))
+        if n > base:
+            head = self.log.vectors[base:n]
+            if mask is None:
+                values, found = knn(query, head, k, self.metric)
+                results.append((values, np.where(found >= 0, found + base, -1)))
+            else:
+                selected = np.flatnonzero(mask[base:n])
+                if len(selected):
+                    values, found = knn(query, head[selected], k, self.metric)
+                    results.append((values, np.where(found >= 0, selected[found] + base, -1)))
+        if len(results) == 1 and results[0][1].shape[1] == k:
+            return results[0]
+        if not results:
+            return (np.full((len(query), k), np.nan, dtype="float32"),
+                    np.full((len(query), k), -1, dtype=np.int64))
+        return merge_results(results, k, self.metric)
+
+    def lexical_search(self, query: str, k: int, mask: np.ndarray = None):
+        """Return (bm25 scores, rows) for a keyword query; dead rows are excluded."""
+        if self.lexical is None:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        if mask is not None:
+            mask = _fit(mask, self.rows)
+        if self.dead:
+            mask = self.alive if mask is None else self.alive & mask
+        # The BM25 postings grow in place, so they are searched under their own lock
+        with self.lexical_lock:
+            return self.lexical.search(query, k, mask=mask, limit=self.rows)
+
+
+class MemoryShard:
+    """
+    One user's memories: FAISS index segments + persistent text/vector log.
+
+    New rows go to the head of the current view and are searched exactly.
+    Once the head holds `snapshot_every` rows, a background thread seals it
+    into a new segment: an index over those rows, written to disk and mapped
+    back in, so processes sharing the store share one copy of it in the page
+    cache. Adds never build indexes themselves.
+
+    Segments are merged by size tier: tier t holds segments of fewer than
+    snapshot_every × merge_factor^(t+1) rows, and `merge_factor` adjacent
+    segments of one tier are merged into one of the next (smallest tier
+    first), so a shard of n rows has O(merge_factor × log n) segments.
+    A merged segment of at least `train_threshold` rows is built as
+    `index_type`; once the flat segments and head together reach
+    train_threshold rows they are rebuilt as one such segment. The old
+    segments keep serving queries until their replacement is ready.
+
+    Every memory has a stable id. FAISS positions are log rows; deleting a
+    memory tombstones its row and updating one appends a new row with the
+    same id. Dead rows are excluded from searches by a bitmap selector, and
+    once they make up `compact_ratio` of the shard a background compaction
+    rewrites the log and index without them.
+
+    Vectors are compared by `metric` ("l2", "ip" or "cosine"); for cosine they
+    are normalized before they are stored, and queries before they are run.
+
+    Changes picked up from other processes are reported to `on_change` as
+    on_change(event, ids=, texts=, vectors=): "add" for their new rows (an
+    update is a new row with an existing id), "delete" for their tombstones
+    and "reset" when the store was cleared or compacted under us.
+    """
+
+    def __init__(self, path, dim: int, snapshot_every: int,
+                 index_type: str = "flat", train_threshold: int = 50_000,
+                 compact_ratio: float = 0.3, compact_min_dead: int = 1_000,
+                 metric: str = "l2", merge_factor: int = 4, on_change=None):
+        if merge_factor < 2:
+            raise ValueError(f"merge_factor must be at least 2, got {merge_factor}")
+        self.path = Path(path)
+        self.dim = dim
+        self.metric = metric
+        self.snapshot_every = snapshot_every
+        self.index_type = index_type
+        self.train_threshold = train_threshold
+        self.compact_ratio = compact_ratio
+        self.compact_min_dead = compact_min_dead
+        self.merge_factor = merge_factor
+        self.on_change = on_change
+        self._lock = threading.RLock()         # serializes this process's writers
+        self._state_lock = threading.Lock()    # held briefly while the row state is synced or published
+        self._writing = False                  # a writer of this process holds the write locks
+        self._lexical_lock = threading.Lock()  # guards the BM25 postings while they grow
+        self._file_lock = store_lock(self.path)           # one writer across processes
+        self._maintenance = maintenance_lock(self.path)   # one segment build/compaction across processes
+        self._builder = None           # background seal/merge thread, if any
+        self._compactor = None         # background compaction thread, if any
+        self._generation = 0           # bumped on clear()/compaction/reload so stale builds are dropped
+        self._removed = False          # set by clear(remove=True): nothing may recreate the directory
+        self._closed = False           # set by close(): no new background work
+        self._lexical_index = None     # built from the log on the first keyword search
+
+        with self._lock, self._file_lock, self._state_lock:
+            self._load()
+        self._maybe_maintain()
+
+    def _load(self):
+        """(Re)open the store from disk and publish it. Caller holds both write locks."""
+        self._generation += 1
+        if self._maintenance.acquire(blocking=False):
+            # Nobody is compacting, so a leftover .compact directory is from a crash
+            try:
+                recover_compaction(self.path)
+            finally:
+                self._maintenance.release()
+        self.log = MemoryLog(self.path, self.dim, self.metric)
+        segments = self._read_segments()
+        self._segments = segments or ()
+        self._lexical_index = None
+        self._load_ids()
+        self._seen = self.log.disk_state()
+        if segments is None:
+            self._seen = self._seen[:3] + (None,)  # try the manifest again on the next view
+        self._publish()
+
+    def _read_segments(self, current: tuple = ()):
+        """
+        The segments the manifest on disk lists, reusing those in current
+        that are already mapped; None if they can't be read consistently
+        right now (e.g. a merge in another process just replaced one).
+        """
+        known = {segment.name: segment for segment in current}
+        segments = []
+        for name, start, end in load_manifest(self.path, self.dim):
+            segment = known.get(name)
+            if segment is None:
+                try:
+                    index = read_segment(self.path, name)
+                except RuntimeError:
+                    return None
+                if index.ntotal != end - start or index.metric_type != faiss_metric(self.metric):
+                    return None
+                segment = Segment(name, start, end, index)
+            segments.append(segment)
+        if segments and segments[-1].end > len(self.log):
+            return None
+        return tuple(segments)
+
+    def _load_ids(self):
+        """Rebuild the alive bitmap and id -> row map from the log."""
+        n = len(self.log)
+        ids = np.asarray(self.log.ids, dtype=np.int64)
+        self._alive = GrowableColumn(bool)
+        self._alive.extend(np.ones(n, dtype=bool))
+        self._alive.values[self.log.deleted_rows()] = False
+        self.dead = int(n - self._alive.values.sum())
+        self.next_id = int(ids.max()) + 1 if n else 0
+        self._id_rows = GrowableColumn(np.int64)  # indexed by id; -1 = deleted / unknown
+        self._id_rows.extend(np.full(self.next_id, -1, dtype=np.int64))
+        live = np.flatnonzero(self._alive.values)
+        self._id_rows.values[ids[live]] = live
+        self._deleted_seen = self.log.disk_state()[2]
+        self._shared = False
+
+    # ---- Views ----
+    def _publish(self):
+        # Caller holds self._state_lock, or is the writer (self._writing)
+        self._view = ShardView(self.log, self._segments, len(self.log),
+                               self._alive.values, self.dead, self._id_rows.values, self.metric,
+                               self._lexical_index, self._lexical_lock)
+        self._shared = True
+
+    def _own(self):
+        """Copy the row state the published view shares before changing it in place."""
+        if self._shared:
+            self._alive = self._alive.copy()
+            self._id_rows = self._id_rows.copy()
+            self._shared = False
+
+    def view(self) -> ShardView:
+        """
+        The current state to search. If another process changed the store
+        since, its changes are picked up first, unless a writer of this
+        process is busy (it will publish them itself). Waits only for another
+        thread picking them up, or to reload a store compacted or cleared
+        under us; never for writes.
+        """
+        if self.log.disk_state() != self._seen and not self._catch_up():
+            with self._write():
+                pass  # _write reloads the store and publishes it
+        return self._view
+
+    def _catch_up(self) -> bool:
+        """
+        Apply other processes' changes unless a writer of this process is
+        busy. False if the store was replaced and must be reloaded under the
+        write locks instead.
+        """
+        with self._state_lock:
+            state = self.log.disk_state()
+            if self._writing or state == self._seen:
+                return True
+            if self._replaced(state):
+                return False
+            self._sync(state)
+            return True
+
+    def _replaced(self, state) -> bool:
+        """True if the directory was replaced (compaction) or cleared since we last looked."""
+        return (state is None or self._seen is None or state[0] != self._seen[0]
+                or state[1] < len(self.log))
+
+    def _sync(self, state, writer: bool = False):
+        """
+        Apply what other processes wrote since the last look: new rows,
+        tombstones, sealed or merged segments, or a compacted store. Caller
+        holds self._state_lock; writers (writer=True) hold the write locks
+        instead, and only they may reload a replaced store.
+        """
+        if self._replaced(state):
+            # The directory was replaced (compaction) or cleared: start over
+            if self._removed:
+                return  # ...unless this shard was removed (a late background build)
+            self._load()
+            if self.on_change is not None:
+                self.on_change("reset")
+            return
+        old = len(self.log)
+        new = self.log.recover() if writer else self.log.refresh()
+        if new > old:
+            self._follow(old, new)
+            if self.on_change is not None:
+                self.on_change("add", ids=self.log.ids[old:new].tolist(),
+                               texts=[self.log.text(i) for i in range(old, new)],
+                               vectors=np.array(self.log.vectors[old:new]))
+        if state[2] > self._deleted_seen:
+            died = self.log.deleted_rows(self._deleted_seen)
+            self._deleted_seen += len(died)
+            self._forget(died)
+            if self.on_change is not None and len(died):
+                self.on_change("delete", ids=np.unique(self.log.ids[died]).tolist())
+        if state[3] != self._seen[3]:
+            segments = self._read_segments(self._segments)
+            if segments is None:
+                state = state[:3] + (None,)  # try again on the next view
+            else:
+                self._segments = segments
+        self._seen = state
+        self._publish()
+
+    def _follow(self, old: int, new: int):
+        """Take in rows [old, new) another process appended."""
+        self._alive.extend(np.ones(new - old, dtype=bool))
+        self._set_rows(np.asarray(self.log.ids[old:new], dtype=np.int64), np.arange(old, new))
+        if self._lexical_index is not None:
+            texts = [self.log.text(i) for i in range(old, new)]
+            with self._lexical_lock:
+                self._lexical_index.add(texts)
+
+    def _forget(self, rows: np.ndarray):
+        """Take in tombstones another process wrote."""
+        rows = np.unique(rows)
+        rows = rows[self._alive.values[rows]]
+        if not len(rows):
+            return
+        self._own()
+        self._alive.values[rows] = False
+        self.dead += len(rows)
+        ids = np.asarray(self.log.ids[rows], dtype=np.int64)
+        # An update appends the id's new row before its old one is seen dying here
+        ids = ids[self._id_rows.values[ids] == rows]
+        self._id_rows.values[ids] = -1
+
+    def __len__(self):
+        """Number of live memories."""
+        return len(self.view())
+
+    # ---- Writes ----
+    @contextmanager
+    def _write(self):
+        """
+        Hold this shard's write locks (thread and process), caught up with
+        whatever other processes committed; publish a new view afterwards.
+        Searches meanwhile keep the last published view.
+        """
+        with self._lock, self._file_lock:
+            with self._state_lock:
+                self._writing = True
+            try:
+                self._sync(self.log.disk_state(), writer=True)
+                yield
+            finally:
+                with self._state_lock:
+                    self._publish()
+                    state = self.log.disk_state()
+                    if state is not None and self._seen is not None and self._seen[3] is None:
+                        state = state[:3] + (None,)  # keep retrying a manifest _sync couldn't read
+                    self._seen = state
+                    self._writing = False
+
+    def add(self, texts: list[str], vectors: np.ndarray, metas: list[dict]) -> list[int]:
+        """Append new memories; returns their ids."""
+        vectors = prepare_vectors(vectors, self.metric)
+        with self._write():
+            ids = np.arange(self.next_id, self.next_id + len(texts), dtype=np.int64)
+            self._append(texts, vectors, metas, ids)
+        self._maybe_maintain()
+        return ids.tolist()
+
+    def _append(self, texts, vectors, metas, ids):
+        # Caller holds the write locks
+        first_row = len(self.log)
+        self.log.append(texts, vectors, metas, ids)
+        self._alive.extend(np.ones(len(texts), dtype=bool))
+        self._set_rows(ids, np.arange(first_row, first_row + len(texts)))
+        if self._lexical_index is not None:
+            with self._lexical_lock:
+                self._lexical_index.add(texts)
+
+    def _set_rows(self, ids: np.ndarray, rows: np.ndarray):
+        if len(ids) and int(ids.min()) < len(self._id_rows.values):
+            self._own()  # an update moves an existing id to its new row
+        self.next_id = max(self.next_id, int(ids.max()) + 1) if len(ids) else self.next_id
+        grow = self.next_id - len(self._id_rows.values)
+        if grow > 0:
+            self._id_rows.extend(np.full(grow, -1, dtype=np.int64))
+        self._id_rows.values[ids] = rows
+
+    def _row_of(self, memory_id: int) -> int:
+        if 0 <= memory_id < len(self._id_rows.values):
+            return int(self._id_rows.values[memory_id])
+        return -1
+
+    def delete(self, memory_ids: list[int]) -> list[int]:
+        """Tombstone memories; returns the ids of those that existed."""
+        with self._write():
+            rows = [self._row_of(i) for i in memory_ids]
+            rows = np.unique([r for r in rows if r >= 0]).astype(np.int64)
+            ids = np.asarray(self.log.ids)[rows]
+            if len(rows):
+                self._kill(rows)
+                self._id_rows.values[ids] = -1
+        self._maybe_compact()
+        return ids.tolist()
+
+    def update(self, memory_id: int, text: str, vector: np.ndarray, metadata: dict) -> bool:
+        """Replace a memory's text/vector/metadata, keeping its id."""
+        vector = prepare_vectors(vector, self.metric)
+        with self._write():
+            row = self._row_of(memory_id)
+            if row < 0:
+                return False
+            self._kill(np.array([row], dtype=np.int64))
+            self._append([text], vector, [metadata], np.array([memory_id], dtype=np.int64))
+        self._maybe_maintain()
+        self._maybe_compact()
+        return True
+
+    def _kill(self, rows: np.ndarray):
+        # Caller holds the write locks
+        self._own()
+        self.log.mark_deleted(rows)
+        self._deleted_seen += len(rows)
+        self._alive.values[rows] = False
+        self.dead += len(rows)
+
+    # ---- Reads ----
+    @property
+    def index(self):
+        """The oldest (largest) segment's index of the current view (see ShardView.index)."""
+        return self._view.index
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = None, ef_search: int = None,
+               mask: np.ndarray = None):
+        """ShardView.search on the current view."""
+        return self.view().search(query, k, nprobe=nprobe, ef_search=ef_search, mask=mask)
+
+    def row_of(self, memory_id: int) -> int:
+        """Current log row of a live memory, or -1."""
+        return self.view().row_of(memory_id)
+
+    def vectors_of(self, memory_ids: list[int]) -> np.ndarray:
+        """Stored vectors of live memories (zero rows for unknown ids)."""
+        view = self.view()
+        rows = np.array([view.row_of(i) for i in memory_ids], dtype=np.int64)
+        vectors = np.zeros((len(rows), self.dim), dtype="float32")
+        found = rows >= 0
+        vectors[found] = view.log.vectors[rows[found]]
+        return vectors
+
+    def memory_id(self, row: int) -> int:
+        return self.view().memory_id(row)
+
+    def ids_after(self, memory_id: int) -> np.ndarray:
+        """Ids of live memories newer than memory_id, ascending (cost ∝ the newer ids)."""
+        start = max(memory_id + 1, 0)
+        return np.flatnonzero(self.view().id_rows[start:] >= 0) + start
+
+    def records_of(self, memory_ids) -> list[dict]:
+        """{"id", "text", "metadata"} of the given memories that are still live."""
+        view = self.view()
+        records = []
+        for memory_id in memory_ids:
+            row = view.row_of(int(memory_id))
+            if row >= 0:
+                record = view.record(row)
+                records.append({"id": int(memory_id), "text": record["text"],
+                                "metadata": record["meta"]})
+        return records
+
+    def live_rows(self) -> np.ndarray:
+        return self.view().live_rows()
+
+    @property
+    def meta_index(self) -> MetadataIndex:
+        return self.view().meta_index
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        """BM25 index over this shard's texts (built lazily, then kept in sync)."""
+        if self._lexical_index is None:
+            with self._lock, self._state_lock:
+                if self._lexical_index is None:
+                    lexical_index = LexicalIndex()
+                    lexical_index.add(list(self.log.texts()))
+                    self._lexical_index = lexical_index
+                    self._publish()
+        return self._lexical_index
+
+    def lexical_search(self, query: str, k: int, mask: np.ndarray = None):
+        """ShardView.lexical_search on the current view (builds the BM25 index if needed)."""
+        _ = self.lexical_index
+        return self.view().lexical_search(query, k, mask=mask)
+
+    def snapshot(self):
+        """
+        Seal the head and merge every segment into one now, waiting for any
+        background build to finish first.
+        """
+        with self._maintenance:
+            generation, view = self._current()
+            if view.rows and (len(view.segments) != 1 or view.base_rows < view.rows):
+                segments = len(view.segments)
+                self._build_segment(view, generation, 0, segments, view.rows, self._type_for(view.rows))
+
+    def clear(self, remove: bool = False):
+        """Delete every memory (and with remove, the store directory itself)."""
+        with self._write():
+            self._generation += 1
+            self.log.clear()
+            self._segments = ()
+            self._lexical_index = None
+            self._load_ids()
+            if remove:
+                self._removed = True
+                shutil.rmtree(self.path, ignore_errors=True)
+                # An in-flight compaction copy must not be mistaken for the store on reopen
+                shutil.rmtree(self.path.with_name(self.path.name + COMPACT_SUFFIX), ignore_errors=True)
+
+    def close(self):
+        """
+        Stop background work and unmap the log: no new seal, merge or
+        compaction starts, and a running one is waited for. Views already
+        handed out stay readable.
+        """
+        with self._lock:
+            self._closed = True
+            running = [t for t in (self._builder, self._compactor) if t is not None]
+        for thread in running:
+            thread.join()
+        self.log.unmap()
+
+    @property
+    def busy(self) -> bool:
+        """True while a background seal, merge or compaction is running."""
+        return self._builder is not None or self._compactor is not None
+
+    # ---- Background sealing and merging ----
+    @property
+    def upgrading(self) -> bool:
+        """True while a background seal or merge is running."""
+        return self._builder is not None
+
+    def _maybe_maintain(self):
+        """Start a background build if the head needs sealing or segments need merging."""
+        with self._lock:
+            if (self._builder is not None or self._removed or self._closed
+                    or self._plan(self._view) is None):
+                return
+            self._builder = threading.Thread(target=self._maintain, daemon=True,
+                                             name=f"index-build-{self.path.name}")
+            self._builder.start()
+
+    def _type_for(self, rows: int) -> str:
+        """Index type of a segment of rows rows."""
+        if self.index_type != "flat" and rows >= self.train_threshold:
+            return self.index_type
+        return "flat"
+
+    def _tier(self, rows: int) -> int:
+        tier, bound = 0, self.snapshot_every * self.merge_factor
+        while rows >= bound:
+            tier, bound = tier + 1, bound * self.merge_factor
+        return tier
+
+    def _plan(self, view: ShardView):
+        """
+        The next build as (i, j, end, index_type): one index_type segment over
+        rows [start of segments[i], end) replacing segments[i:j]; i == j ==
+        len(segments) seals the head. None when there is nothing to do.
+        """
+        segments, rows, sealed = view.segments, view.rows, view.base_rows
+        last = len(segments)
+        if self.index_type != "flat":
+            # Promote the trailing flat segments plus the head once they are worth training on
+            i = last
+            while i and index_type_of(segments[i - 1].index) == "flat":
+                i -= 1
+            start = segments[i].start if i < last else sealed
+            if rows - start >= self.train_threshold:
+                return i, last, rows, self.index_type
+        if rows - sealed >= self.snapshot_every:
+            return last, last, rows, self._type_for(rows - sealed)
+
+        tiers = [self._tier(len(segment)) for segment in segments]
+        run = None
+        for i in range(len(tiers) - self.merge_factor + 1):
+            window = tiers[i:i + self.merge_factor]
+            if min(window) == max(window) and (run is None or window[0] < tiers[run]):
+                run = i
+        if run is None:
+            return None
+        j = run + self.merge_factor
+        end = segments[j - 1].end
+        return run, j, end, self._type_for(end - segments[run].start)
+
+    def _current(self):
+        """(generation, view) of the current state, caught up with other processes."""
+        with self._lock:  # after this process's writer, if one is busy
+            return self._generation, self.view()
+
+    def _maintain(self):
+        held = False
+        try:
+            if not self._maintenance.acquire(blocking=False):
+                return  # another thread or process is building; it picks up our rows too
+            held = True
+            try:
+                remove_unused_segments(self.path, self.dim)
+                while not (self._removed or self._closed):
+                    generation, view = self._current()
+                    plan = self._plan(view)
+                    if plan is None:
+                        break
+                    self._build_segment(view, generation, *plan)
+            finally:
+                self._maintenance.release()
+        except Exception:
+            held = False
+            logging.exception("Background segment build failed for shard %s", self.path)
+        finally:
+            self._builder = None
+        if held and not (self._removed or self._closed) and self._plan(self.view()) is not None:
+            # Rows committed while we held the lock, by a writer that couldn't get it
+            self._maybe_maintain()
+
+    def _build_segment(self, view: ShardView, generation: int, i: int, j: int, end: int,
+                       index_type: str):
+        """
+        Build the segment _plan described from view's rows and swap it in.
+        Caller holds the maintenance lock. Only the manifest is written under
+        the (process) write lock; this process picks the segment up like any
+        other process's, so its searches never wait for the build.
+        """
+        segments = view.segments
+        start = segments[i].start if i < len(segments) else view.base_rows
+        index = self._build_index(index_type, view.log.vectors[start:end])
+        name = write_segment(index, self.path, start, end)
+        with self._file_lock:
+            state = self.log.disk_state()
+            if (generation != self._generation or self._removed or self._segments != segments
+                    or state is None or state[1] < end
+                    or not all((self.path / s).exists() for s in [name] + [s.name for s in segments])):
+                (self.path / name).unlink(missing_ok=True)
+                return  # shard was cleared/compacted while we were building
+            listed = [(s.name, s.start, s.end) for s in segments]
+            save_manifest(self.path, listed[:i] + [(name, start, end)] + listed[j:], self.dim)
+        self.view()
+        remove_unused_segments(self.path, self.dim)
+
+    def _build_index(self, index_type: str, vectors: np.ndarray):
+        """Build, train and fill an index of index_type over vectors."""
+        index = build_index(index_type, self.dim, len(vectors), self.metric)
+        train_index(index, vectors)
+        for start in range(0, len(vectors), self.snapshot_every):
+            index.add(np.ascontiguousarray(vectors[start:start + self.snapshot_every]))
+        return index
+
+    def wait_for_upgrade(self, timeout: float = None):
+        """Block until background seals and merges are done (tests / benchmarks)."""
+        builder = self._builder
+        while builder is not None:
+            builder.join(timeout)
+            if builder.is_alive():
+                return
+            builder = self._builder
+
+    # ---- Compaction ----
+    def _maybe_compact(self):
+        """Start a background compaction once enough rows are dead."""
+        with self._lock:
+            if (self._compactor is not None or self._closed or self.dead < self.compact_min_dead
+                    or self.dead < self.compact_ratio * len(self.log)):
+                return
+            self._compactor = threading.Thread(target=self._compact_in_background, daemon=True,
+                                               name=f"compact-{self.path.name}")
+            self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception:
+            logging.exception("Compaction failed for shard %s", self.path)
+        finally:
+            self._compactor = None
+
+    def compact(self):
+        """
+        Rewrite the log with live rows only, indexed by a single segment.
+        The copy is built from a view, without holding the write locks; rows
+        added or deleted meanwhile are applied to it under the locks just
+        before the swap. Waits for a running segment build (or a compaction
+        in another process) to finish first.
+        """
+        with self._maintenance:
+            self._compact()
+        self._maybe_maintain()
+
+    def _compact(self):
+        generation, view = self._current()
+        n = view.rows
+        rows = np.flatnonzero(view.alive)
+        if n == len(rows):
+            return
+
+        compact_path = self.path.with_name(self.path.name + COMPACT_SUFFIX)
+        shutil.rmtree(compact_path, ignore_errors=True)
+        new_log = MemoryLog(compact_path, self.dim, self.metric)
+        self._copy_rows(view.log, new_log, rows)
+        index = self._build_index(self._type_for(len(rows)), new_log.vectors)
+
+        with self._write():
+            if generation != self._generation:
+                shutil.rmtree(compact_path, ignore_errors=True)
+                return
+            alive_now = self._alive.values
+            # Rows appended while we were copying
+            tail = n + np.flatnonzero(alive_now[n:])
+            self._copy_rows(self.log, new_log, tail)
+            if len(tail):
+                index.add(np.ascontiguousarray(new_log.vectors[len(rows):]))
+            # Copied rows deleted while we were copying
+            died = np.flatnonzero(~alive_now[rows])
+            if len(died):
+                new_log.mark_deleted(died)
+
+            if len(new_log):
+                name = write_segment(index, compact_path, 0, len(new_log))
+                save_manifest(compact_path, [(name, 0, len(new_log))], self.dim)
+            swap_in_compacted(self.path)
+            self._load()
+
+    @staticmethod
+    def _copy_rows(log: MemoryLog, new_log: MemoryLog, rows: np.ndarray, chunk: int = 10_000):
+        vectors, ids = log.vectors, log.ids
+        for start in range(0, len(rows), chunk):
+            part = rows[start:start + chunk]
+            records = [log.record(int(r)) for r in part]
+            new_log.append([r["text"] for r in records], np.ascontiguousarray(vectors[part]),
+                           [r["meta"] for r in records], ids[part])
+
+
+class ShardRegistry:
+    """
+    Maps user_id -> MemoryShard, loading shards on demand and closing
+    cold ones (LRU) once more than `max_loaded` are open. Shards busy with
+    a background seal, merge or compaction are kept until it is done.
+    """
+
+    def __init__(self, root, dim: int, max_loaded: int = 64, snapshot_every: int = 10_000,
+                 index_type: str = "flat", train_threshold: int = 50_000,
+                 compact_ratio: float = 0.3, compact_min_dead: int = 1_000, metric: str = "l2",
+                 merge_factor: int = 4, on_change=None):
+        self.root = Path(root)
+        self.dim = dim
+        self.metric = metric
+        self.max_loaded = max_loaded
+        self.snapshot_every = snapshot_every
+        self.index_type = index_type
+        self.train_threshold = train_threshold
+        self.compact_ratio = compact_ratio
+        self.compact_min_dead = compact_min_dead
+        self.merge_factor = merge_factor
+        self.on_change = on_change  # on_change(event, user_id, **change); see MemoryShard
+        self._loaded: OrderedDict[str, MemoryShard] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_path(self, user_id: str) -> Path:
+        # quote() keeps ids readable on disk while preventing path traversal
+        return self.root / "users" / quote(user_id, safe="")
+
+    def get(self, user_id: str) -> MemoryShard:
+        """Return the shard for user_id, opening it (and evicting) if needed."""
+        with self._lock:
+            shard = self._loaded.get(user_id)
+            if shard is not None:
+                self._loaded.move_to_end(user_id)
+                return shard
+            on_change = None
+            if self.on_change is not None:
+                def on_change(event, _user_id=user_id, **change):
+                    self.on_change(event, _user_id, **change)
+            shard = MemoryShard(self.shard_path(user_id), self.dim, self.snapshot_every,
+                                index_type=self.index_type, train_threshold=self.train_threshold,
+                                compact_ratio=self.compact_ratio, compact_min_dead=self.compact_min_dead,
+                                metric=self.metric, merge_factor=self.merge_factor,
+                                on_change=on_change)
+            self._loaded[user_id] = shard
+            self._evict()
+            return shard
+
+    def _evict(self):
+        """Close the coldest idle shards beyond max_loaded. Caller holds self._lock."""
+        excess = len(self._loaded) - self.max_loaded
+        for user_id, shard in list(self._loaded.items())[:-1]:  # never the one just opened
+            if excess <= 0:
+                break
+            if shard.busy:
+                continue
+            del self._loaded[user_id]
+            shard.close()
+            excess -= 1
+
+    def clear(self, user_id: str):
+        """Delete one user's memories without loading their shard."""
+        with self._lock:
+            shard = self._loaded.pop(user_id, None)
+            path = self.shard_path(user_id)
+            if shard is not None:
+                shard.clear(remove=True)  # also cancels any background segment build
+                return
+            with store_lock(path):
+                shutil.rmtree(path, ignore_errors=True)
+                shutil.rmtree(path.with_name(path.name + COMPACT_SUFFIX), ignore_errors=True)
+
+    def clear_all(self):
+        """Delete every user's memories."""
+        with self._lock:
+            loaded, self._loaded = self._loaded, OrderedDict()
+        for shard in loaded.values():
+            shard.clear(remove=True)
+        for user_id in self.user_ids():
+            self.clear(user_id)
+
+    def user_ids(self) -> list[str]:
+        """All users that have a shard on disk (loaded or not)."""
+        users_dir = self.root / "users"
+        if not users_dir.exists():
+            return []
+        return sorted(unquote(p.name) for p in users_dir.iterdir() if p.is_dir())
+
+    def loaded_user_ids(self) -> list[str]:
+        """Users whose shards are currently in memory, coldest first."""
+        with self._lock:
+            return list(self._loaded)
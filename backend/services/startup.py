@@ -0,0 +1,160 @@
+# backend/services/startup.py
+"""
+Startup & Readiness
+-------------------
+Keeps cold start short and reports when the server can actually serve fast:
+- Startup is split into timed phases: importing the services, setting up the
+  app, then a background warmup (see warmup_steps()) that starts once the server
+  accepts connections
+- Warmup loads what the first requests would otherwise pay for: the embedding
+  backend's client or model, the on-disk embedding cache, the LLM clients,
+  and the WARMUP_USERS' shards (FAISS index, BM25 postings)
+- /health is liveness (the process is up); /ready answers 503 until warmup
+  has finished, then 200, both with the per-phase timings
+
+Whatever warmup skips is still loaded lazily on first use, so WARMUP_ON_START=0
+gives the fastest possible start at the cost of slower first requests.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import REGISTRY
+
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") != "0"
+# Users whose shards are opened during warmup (comma-separated)
+WARMUP_USERS = [u for u in os.getenv("WARMUP_USERS", "default").split(",") if u.strip()]
+# Most recent embeddings copied from the SQLite cache into memory during warmup
+WARMUP_EMBEDDINGS = int(os.getenv("WARMUP_EMBEDDINGS", 10_000))
+
+
+class Startup:
+    """Timed startup phases plus the warmup state; safe to read from any thread."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # phase -> seconds, in the order they finished
+        self.status = "starting"  # -> "warming" -> "ready" / "failed"
+        self.error = None
+        self.ready_after = None  # seconds from start to ready
+        self._last = self.started
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+            self._last = time.perf_counter()
+        logging.info("Startup phase %s took %.1f ms", name, seconds * 1000)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as one startup phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark(self, name: str):
+        """Record everything since the previous phase ended as phase name."""
+        self.record(name, time.perf_counter() - self._last)
+
+    def start_warmup(self, steps):
+        """Run steps ([(phase, fn), ...]) on a background thread; ready once all succeed."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.status = "warming"
+            self._thread = threading.Thread(target=self.run_warmup, args=(steps,), daemon=True,
+                                            name="warmup")
+            self._thread.start()
+
+    def run_warmup(self, steps):
+        self.status = "warming"
+        try:
+            for name, fn in steps:
+                with self.phase(name):
+                    fn()
+        except Exception as e:
+            logging.exception("Warmup failed")
+            self.error = f"{name}: {e}"
+            self.status = "failed"
+            return
+        self.set_ready()
+
+    def set_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+        self.status = "ready"
+        logging.info("Ready after %.1f ms", self.ready_after * 1000)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until warmup is over; True if it ended ready."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready
+
+    def report(self) -> dict:
+        with self._lock:
+            phases = {name: round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "error": self.error,
+            "phases_ms": phases,
+            "ready_after_ms": round(self.ready_after * 1000, 2) if self.ready_after else None,
+        }
+
+
+startup = Startup()
+REGISTRY.callback(
+    "secondbrain_startup_phase_seconds", "gauge", "Duration of each startup phase",
+    lambda: dict(startup.phases), labelnames=("phase",),
+)
+REGISTRY.callback("secondbrain_ready", "gauge", "1 once warmup has finished",
+                  lambda: int(startup.ready))
+
+
+def warmup_steps(user_ids: list[str] = None) -> list:
+    """The (phase, fn) pairs warmup runs, cheapest first."""
+    # Imported here so that importing this module stays free
+    from . import embeddings, memory_store, predictions
+
+    steps = [
+        ("embedding_backend", embeddings.backend.warmup),
+        ("embedding_cache", lambda: embeddings.cache.preload(WARMUP_EMBEDDINGS)),
+        ("llm_client", predictions.warmup),
+    ]
+    for user_id in WARMUP_USERS if user_ids is None else user_ids:
+        steps.append((f"shard:{user_id}", lambda u=user_id: memory_store.warm_shard(u)))
+    return steps
+
+
+def start_warmup():
+    """Start the background warmup (or, with WARMUP_ON_START=0, be ready right away)."""
+    if WARMUP_ON_START:
+        startup.start_warmup(warmup_steps())
+    else:
+        startup.set_ready()
+
+
+def readiness() -> dict:
+    """Warmup state, per-phase timings and what is loaded in memory right now."""
+    from . import embeddings, memory_store
+
+    return {
+        **startup.report(),
+        "loaded": {
+            "embedding_backend": embeddings.backend.name,
+            "embedding_cache_items": embeddings.cache.stats()["memory_items"],
+            "shards": memory_store.loaded_users(),
+        },
+    }
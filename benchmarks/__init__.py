@@ -0,0 +1,18 @@
+# benchmarks/__init__.py
+"""
+Second Brain Benchmarks
+-----------------------
+Reproducible retrieval and end-to-end benchmarks, run from the repo root:
+
+    python -m benchmarks --sizes 10000 100000 --out results/HEAD.json
+    python -m benchmarks.compare results/base.json results/HEAD.json
+
+- corpus.py     deterministic synthetic memories + queries (mock embedder)
+- retrieval.py  add/search throughput, p50/p95/p99 latency, memory
+                footprint and recall@k against the flat index, per index type
+- ask_load.py   concurrent /ask_brain/ load against a local mock LLM
+- compare.py    diff two result files and fail on regressions
+
+Results are JSON tagged with the git commit, so runs of different commits
+can be compared directly.
+"""
@@ -0,0 +1,73 @@
+# benchmarks/__main__.py
+"""
+Run the benchmark suite and write one JSON result file.
+
+    python -m benchmarks --sizes 10000 1000000 --index-types flat hnsw ivf_pq \\
+        --ask-requests 2000 --concurrency 64 --out results/$(git rev-parse --short HEAD).json
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+# The mock embedder is deterministic already; a persistent embedding cache would
+# only make runs depend on what earlier runs left behind
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
+from backend.services.index_factory import INDEX_TYPES  # noqa: E402
+
+from .ask_load import run_ask_load  # noqa: E402
+from .report import SCHEMA_VERSION, environment, write_results  # noqa: E402
+from .retrieval import run_retrieval  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    retrieval = parser.add_argument_group("retrieval")
+    retrieval.add_argument("--sizes", type=int, nargs="*", default=[10_000],
+                           help="corpus sizes to benchmark (10k-10M; none skips retrieval)")
+    retrieval.add_argument("--index-types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    retrieval.add_argument("--k", type=int, default=10)
+    retrieval.add_argument("--queries", type=int, default=1_000)
+    retrieval.add_argument("--single-adds", type=int, default=1_000,
+                           help="memories added one by one with add_memory() (latency)")
+    retrieval.add_argument("--nprobe", type=int)
+    retrieval.add_argument("--ef-search", type=int)
+    retrieval.add_argument("--workdir", help="where the temporary stores live (default: system temp)")
+
+    ask = parser.add_argument_group("/ask_brain/ load")
+    ask.add_argument("--ask-requests", type=int, default=500, help="0 skips the load test")
+    ask.add_argument("--concurrency", type=int, default=32)
+    ask.add_argument("--ask-k", type=int, default=3)
+    ask.add_argument("--ask-corpus", type=int, default=10_000)
+    ask.add_argument("--llm-latency-ms", type=float, default=200)
+    ask.add_argument("--distinct-questions", type=int,
+                     help="repeat this many questions (default: all distinct)")
+    ask.add_argument("--url", help="load-test a running server instead of the in-process app")
+
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="result file (default: stdout)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+
+    results = {"schema": SCHEMA_VERSION, "environment": environment(), "config": vars(args),
+               "retrieval": [], "ask": None}
+    for size in args.sizes:
+        results["retrieval"] += run_retrieval(
+            size, args.index_types, k=args.k, query_count=args.queries,
+            single_adds=args.single_adds, seed=args.seed, nprobe=args.nprobe,
+            ef_search=args.ef_search, workdir=args.workdir)
+    if args.ask_requests:
+        logging.info("Load-testing /ask_brain/ with %d requests", args.ask_requests)
+        results["ask"] = run_ask_load(
+            args.ask_requests, args.concurrency, k=args.ask_k, corpus_size=args.ask_corpus,
+            llm_latency_ms=args.llm_latency_ms, distinct_questions=args.distinct_questions,
+            seed=args.seed, url=args.url)
+    write_results(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
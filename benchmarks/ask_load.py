@@ -0,0 +1,109 @@
+# benchmarks/ask_load.py
+"""
+/ask_brain/ Load Benchmark
+--------------------------
+Drives POST /ask_brain/ with a fixed number of concurrent clients:
+- In-process by default: the FastAPI app is served over httpx's ASGI
+  transport, with a synthetic corpus in a temporary store and the mock LLM
+  answering after MOCK_LLM_LATENCY_MS, so no server or API key is needed
+- Against a running server with --url (its data and model are used as-is)
+
+Reports end-to-end latency percentiles, requests/second, errors and how
+many answers came from the answer cache.
+"""
+
+import asyncio
+import importlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from . import corpus
+from .report import REPO_ROOT, latency_summary
+
+USER = "bench"
+
+
+def _load_app(store_dir: Path, corpus_size: int, seed: int, llm_latency_ms: float):
+    """Import backend/app.py the way uvicorn does and fill a fresh store for it."""
+    backend = str(REPO_ROOT / "backend")
+    if backend not in sys.path:
+        sys.path.insert(0, backend)
+    memory_store = importlib.import_module("services.memory_store")
+    predictions = importlib.import_module("services.predictions")
+    app_module = importlib.import_module("app")
+
+    memory_store.open_store(store_dir)
+    for texts, vectors, metas in corpus.corpus_batches(corpus_size, memory_store.VECTOR_DIM, seed):
+        memory_store.add_memories(texts, vectors, metas, user_id=USER)
+    memory_store.get_shard(USER).wait_for_upgrade()
+    predictions.MOCK_LLM_LATENCY_MS = llm_latency_ms
+    predictions.answer_cache.clear()
+    return app_module.app
+
+
+async def _drive(client: httpx.AsyncClient, questions: list[str], concurrency: int, k: int):
+    pending = iter(questions)  # shared by the workers
+    seconds, errors, cached = [], 0, 0
+
+    async def worker():
+        nonlocal errors, cached
+        for question in pending:
+            started = time.perf_counter()
+            try:
+                resp = await client.post("/ask_brain/", json={"user_id": USER, "question": question, "k": k})
+                ok = resp.status_code == 200
+                if ok and resp.json().get("cached"):
+                    cached += 1
+            except httpx.HTTPError:
+                ok = False
+            seconds.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return seconds, errors, cached, time.perf_counter() - started
+
+
+def run_ask_load(requests: int = 1_000, concurrency: int = 32, k: int = 3,
+                 corpus_size: int = 10_000, llm_latency_ms: float = 200,
+                 distinct_questions: int = None, seed: int = 0, url: str = None) -> dict:
+    """
+    Send requests /ask_brain/ calls from concurrency clients.
+    distinct_questions < requests repeats questions, exercising the answer cache.
+    """
+    distinct = min(distinct_questions or requests, requests)
+    texts, _ = corpus.queries(distinct, dim=8, seed=seed)  # only the texts are needed
+    questions = [texts[i % distinct] for i in range(requests)]
+
+    with tempfile.TemporaryDirectory(prefix="bench-ask-") as tmp:
+        if url is None:
+            app = _load_app(Path(tmp), corpus_size, seed, llm_latency_ms)
+            transport, base_url = httpx.ASGITransport(app=app), "http://bench"
+        else:
+            transport, base_url = None, url
+
+        async def main():
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(transport=transport, base_url=base_url,
+                                         limits=limits, timeout=120) as client:
+                return await _drive(client, questions, concurrency, k)
+
+        seconds, errors, cached, wall = asyncio.run(main())
+
+    return {
+        "target": url or "in-process",
+        "requests": requests,
+        "distinct_questions": distinct,
+        "concurrency": concurrency,
+        "k": k,
+        "corpus_size": corpus_size if url is None else None,
+        "llm_latency_ms": llm_latency_ms if url is None else None,
+        "latency": latency_summary(seconds),
+        "requests_per_second": round(requests / wall, 1) if wall else None,
+        "errors": errors,
+        "cached": cached,
+    }
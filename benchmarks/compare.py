@@ -0,0 +1,105 @@
+# benchmarks/compare.py
+"""
+Benchmark Comparison
+--------------------
+Diff two result files (e.g. main vs. a branch) metric by metric:
+
+    python -m benchmarks.compare base.json head.json --tolerance 0.1
+
+Retrieval rows are matched on (size, index_type). A metric regresses when
+it moves the wrong way by more than --tolerance (relative); recall uses
+--recall-tolerance (absolute). Exits with status 1 if anything regressed.
+"""
+
+import argparse
+import json
+import sys
+
+# (path inside a result row, True if higher is better)
+RETRIEVAL_METRICS = [
+    (("add", "bulk_per_second"), True),
+    (("add", "single", "p99_ms"), False),
+    (("search", "qps"), True),
+    (("search", "p50_ms"), False),
+    (("search", "p95_ms"), False),
+    (("search", "p99_ms"), False),
+    (("recall_at_k",), True),
+    (("memory", "rss_delta_mb"), False),
+]
+ASK_METRICS = [
+    (("requests_per_second",), True),
+    (("latency", "p50_ms"), False),
+    (("latency", "p95_ms"), False),
+    (("latency", "p99_ms"), False),
+]
+
+
+def _get(row: dict, path):
+    for key in path:
+        if not isinstance(row, dict):
+            return None
+        row = row.get(key)
+    return row
+
+
+def _check(label, path, higher_is_better, base, head, tolerance, recall_tolerance) -> dict:
+    old, new = _get(base, path), _get(head, path)
+    if old is None or new is None:
+        return None
+    change = new - old
+    if path == ("recall_at_k",):
+        regressed = -change > recall_tolerance
+    else:
+        worse = -change if higher_is_better else change
+        regressed = worse > tolerance * abs(old) if old else worse > 0
+    return {"row": label, "metric": ".".join(path), "base": old, "head": new,
+            "change": round(change / old, 4) if old else None, "regressed": regressed}
+
+
+def compare(base: dict, head: dict, tolerance: float = 0.10, recall_tolerance: float = 0.01) -> list[dict]:
+    """Return one entry per metric present in both runs, flagging regressions."""
+    rows = []
+    head_rows = {(r["size"], r["index_type"]): r for r in head.get("retrieval", [])}
+    for old in base.get("retrieval", []):
+        new = head_rows.get((old["size"], old["index_type"]))
+        if new is None:
+            continue
+        label = f"{old['index_type']}@{old['size']}"
+        for path, higher in RETRIEVAL_METRICS:
+            rows.append(_check(label, path, higher, old, new, tolerance, recall_tolerance))
+    if base.get("ask") and head.get("ask"):
+        for path, higher in ASK_METRICS:
+            rows.append(_check("ask_brain", path, higher, base["ask"], head["ask"],
+                               tolerance, recall_tolerance))
+    return [r for r in rows if r is not None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative slowdown per metric (default 0.10)")
+    parser.add_argument("--recall-tolerance", type=float, default=0.01,
+                        help="allowed absolute recall drop (default 0.01)")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    rows = compare(base, head, args.tolerance, args.recall_tolerance)
+
+    commits = (base.get("environment", {}).get("commit"), head.get("environment", {}).get("commit"))
+    print(f"base {str(commits[0])[:10]}  ->  head {str(commits[1])[:10]}")
+    for r in rows:
+        change = f"{r['change']:+.1%}" if r["change"] is not None else "n/a"
+        flag = "  REGRESSION" if r["regressed"] else ""
+        print(f"{r['row']:<22} {r['metric']:<24} {r['base']:>12} -> {r['head']:<12} {change:>8}{flag}")
+    regressions = sum(r["regressed"] for r in rows)
+    print(f"{regressions} regression(s) in {len(rows)} metrics")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# benchmarks/corpus.py
+"""
+Synthetic Corpus
+----------------
+Deterministic memories and queries for the benchmarks:
+- Words follow a Zipf distribution over a fixed pronounceable vocabulary,
+  so term frequencies (BM25) and vector neighbourhoods look like real notes
+- Vectors come from the mock embedder, so no API key or model is needed
+- The same (n, seed) always yields the same texts and vectors, batch by batch,
+  which is what makes results comparable between commits
+"""
+
+import functools
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from backend.services.mock_embeddings import mock_embed_batch
+
+VOCAB_SIZE = 20_000
+ZIPF_A = 1.3           # word-frequency skew (natural language is ~1.0-1.5)
+MIN_WORDS, MAX_WORDS = 6, 16
+QUERY_WORDS = (3, 8)
+BATCH_SIZE = 10_000
+SOURCES = ("note", "chat", "calendar", "habit", "email")
+START = datetime(2024, 1, 1)
+
+_SYLLABLES = ("ka", "lo", "mi", "ra", "te", "su", "no", "vi", "da", "pe",
+              "zo", "fu", "ga", "he", "ji", "ba", "co", "re", "wu", "ye")
+
+
+@functools.lru_cache(maxsize=4)
+def vocabulary(size: int = VOCAB_SIZE) -> np.ndarray:
+    """size distinct words: every 2-, 3- and 4-syllable combination, in order."""
+    words, n = [], len(_SYLLABLES)
+    for length in (2, 3, 4):
+        for i in range(n ** length):
+            word = "".join(_SYLLABLES[(i // n ** p) % n] for p in range(length))
+            words.append(word)
+            if len(words) == size:
+                return np.array(words, dtype=object)
+    raise ValueError(f"vocabulary is limited to {len(words)} words")
+
+
+def _texts(rng: np.random.Generator, count: int, word_range) -> list[str]:
+    vocab = vocabulary()
+    lengths = rng.integers(word_range[0], word_range[1] + 1, size=count)
+    ranks = np.minimum(rng.zipf(ZIPF_A, size=int(lengths.sum())), len(vocab)) - 1
+    words = vocab[ranks]
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    return [" ".join(words[bounds[i]:bounds[i + 1]]) for i in range(count)]
+
+
+def corpus_batches(n: int, dim: int, seed: int = 0, batch_size: int = BATCH_SIZE):
+    """
+    Yield (texts, vectors, metas) batches that add up to n memories.
+    Batch b only depends on (seed, b, batch_size), so the corpus can be
+    regenerated row for row without holding it in memory.
+    """
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        rng = np.random.default_rng([seed, start // batch_size])
+        texts = _texts(rng, count, (MIN_WORDS, MAX_WORDS))
+        sources = rng.integers(0, len(SOURCES), size=count)
+        metas = [{"source": SOURCES[s], "timestamp": (START + timedelta(minutes=start + i)).isoformat()}
+                 for i, s in enumerate(sources.tolist())]
+        yield texts, mock_embed_batch(texts, dim=dim), metas
+
+
+def queries(count: int, dim: int, seed: int = 0):
+    """(texts, vectors) of count short queries drawn from the corpus distribution."""
+    rng = np.random.default_rng([seed, 2 ** 31])  # disjoint from every corpus batch
+    texts = _texts(rng, count, QUERY_WORDS)
+    return texts, mock_embed_batch(texts, dim=dim)
@@ -0,0 +1,140 @@
+# benchmarks/retrieval.py
+"""
+Retrieval Benchmark
+-------------------
+For every corpus size and index type:
+1️⃣ Bulk-load the synthetic corpus with add_memories() (embedding time excluded)
+   and wait for the background index build
+2️⃣ Add the last memories one by one with add_memory() (single-insert latency)
+3️⃣ Run the query set through search_hits() (latency, QPS)
+4️⃣ Score recall@k against the exact flat index, which always runs first
+
+Each index type gets a fresh store in a temporary directory; its train
+threshold is lowered to the bulk size so the requested tier is the one
+that gets measured.
+"""
+
+import gc
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from backend.services import memory_store
+from backend.services.index_factory import INDEX_TYPES, index_type_of
+
+from . import corpus
+from .report import dir_size_mb, latency_summary, rss_mb
+
+USER = "bench"
+
+
+def _wait_for_build() -> float:
+    started = time.perf_counter()
+    memory_store.get_shard(USER).wait_for_upgrade()
+    return time.perf_counter() - started
+
+
+def _ingest(size: int, single_adds: int, seed: int, batch_size: int) -> dict:
+    bulk_n = size - single_adds
+    bulk_seconds, build_seconds, single_seconds = 0.0, None, []
+    row = 0
+    for texts, vectors, metas in corpus.corpus_batches(size, memory_store.VECTOR_DIM, seed, batch_size):
+        split = max(0, min(len(texts), bulk_n - row))
+        if split:
+            started = time.perf_counter()
+            memory_store.add_memories(texts[:split], vectors[:split], metas[:split], user_id=USER)
+            bulk_seconds += time.perf_counter() - started
+        if split < len(texts) and build_seconds is None:
+            # The tier build starts once the bulk load is in; time it on its own
+            build_seconds = _wait_for_build()
+        for i in range(split, len(texts)):
+            started = time.perf_counter()
+            memory_store.add_memory(texts[i], vectors[i], metas[i], user_id=USER)
+            single_seconds.append(time.perf_counter() - started)
+        row += len(texts)
+    if build_seconds is None:
+        build_seconds = _wait_for_build()
+
+    single = latency_summary(single_seconds)
+    if single_seconds:
+        single["per_second"] = round(len(single_seconds) / sum(single_seconds), 1)
+    return {
+        "bulk_count": max(bulk_n, 0),
+        "bulk_seconds": round(bulk_seconds, 4),
+        "bulk_per_second": round(bulk_n / bulk_seconds, 1) if bulk_seconds else None,
+        "build_seconds": round(build_seconds, 4),
+        "single": single,
+    }
+
+
+def _search(query_vectors, k: int, nprobe: int, ef_search: int):
+    seconds, results = [], []
+    for vector in query_vectors:
+        started = time.perf_counter()
+        hits = memory_store.search_hits(vector, k, user_id=USER, nprobe=nprobe, ef_search=ef_search)
+        seconds.append(time.perf_counter() - started)
+        results.append([hit["id"] for hit in hits])
+    summary = latency_summary(seconds)
+    summary["qps"] = round(len(seconds) / sum(seconds), 1) if seconds else None
+    return summary, results
+
+
+def recall_at_k(results: list[list[int]], truth: list[list[int]]) -> float:
+    """Mean fraction of the exact top-k ids each approximate result recovered."""
+    scores = [len(set(got) & set(exact)) / len(exact) for got, exact in zip(results, truth) if exact]
+    return round(sum(scores) / len(scores), 4) if scores else None
+
+
+def run_retrieval(size: int, index_types=INDEX_TYPES, k: int = 10, query_count: int = 1_000,
+                  single_adds: int = 1_000, seed: int = 0, nprobe: int = None,
+                  ef_search: int = None, batch_size: int = corpus.BATCH_SIZE,
+                  workdir: str = None) -> list[dict]:
+    """
+    Benchmark each of index_types on a corpus of size memories.
+    Returns one result dict per index type, flat (the recall baseline) first.
+    """
+    unknown = set(index_types) - set(INDEX_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown index types {sorted(unknown)}, expected some of {INDEX_TYPES}")
+    single_adds = min(single_adds, size)
+    _, query_vectors = corpus.queries(query_count, memory_store.VECTOR_DIM, seed)
+    index_types = ["flat"] + [t for t in index_types if t != "flat"]
+
+    saved = memory_store.INDEX_TYPE, memory_store.INDEX_TRAIN_THRESHOLD, memory_store._shards
+    results, truth = [], None
+    try:
+        for index_type in index_types:
+            with tempfile.TemporaryDirectory(dir=workdir, prefix=f"bench-{index_type}-") as tmp:
+                memory_store.INDEX_TYPE = index_type
+                memory_store.INDEX_TRAIN_THRESHOLD = max(1, size - single_adds)
+                memory_store.open_store(Path(tmp))
+                gc.collect()
+                rss_before = rss_mb()
+
+                logging.info("Benchmarking %s on %d memories", index_type, size)
+                add = _ingest(size, single_adds, seed, batch_size)
+                rss_after = rss_mb()
+                search, ids = _search(query_vectors, k, nprobe, ef_search)
+                if truth is None:
+                    truth = ids
+
+                results.append({
+                    "size": size,
+                    "index_type": index_type,
+                    "built_index": index_type_of(memory_store.get_shard(USER).index),
+                    "k": k,
+                    "nprobe": nprobe,
+                    "ef_search": ef_search,
+                    "add": add,
+                    "search": search,
+                    "recall_at_k": recall_at_k(ids, truth),
+                    "memory": {
+                        "rss_delta_mb": round(rss_after - rss_before, 1),
+                        "disk_mb": round(dir_size_mb(tmp), 1),
+                    },
+                })
+    finally:
+        memory_store.INDEX_TYPE, memory_store.INDEX_TRAIN_THRESHOLD, memory_store._shards = saved
+        gc.collect()
+    return results
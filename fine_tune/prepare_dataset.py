@@ -1,57 +1,43 @@
 """
 prepare_dataset.py
 ------------------
-Collects user data and produces user_training.jsonl
-for potential fine-tuning of a conversational model.
+Builds the fine-tuning dataset from the user's memories and writes
+user_training.jsonl for a conversational model.
+
+The build is incremental (see backend/services/fine_tune_dataset.py): only
+memories added since the previous run are turned into examples, duplicates
+are skipped, and the new examples go to their own part file. The output file
+is then the concatenation of all parts.
+
+Usage (from anywhere):
+    python fine_tune/prepare_dataset.py --user default
 """
 
-import json
+import argparse
+import sys
 from pathlib import Path
 
-DATA_DIR = Path("../data")
-OUTPUT_FILE = Path("user_training.jsonl")
-
-def load_sample_data():
-    """Load habits, calendar events, and notes."""
-    habits = json.loads((DATA_DIR / "habits.json").read_text())
-    calendar = json.loads((DATA_DIR / "calendar.json").read_text())
-    notes = (DATA_DIR / "notes.txt").read_text().splitlines()
-    return habits, calendar["events"], notes
-
-def create_training_examples():
-    """Transform user data into Q&A style examples for fine-tuning."""
-    habits, events, notes = load_sample_data()
-    examples = []
-
-    # Habits
-    for h in habits:
-        q = f"When do I usually {h['habit'].lower()}?"
-        a = f"You usually {h['habit'].lower()} at {h['time']} ({h['frequency']})."
-        examples.append({"messages": [{"role": "user", "content": q},
-                                      {"role": "assistant", "content": a}]})
-
-    # Calendar events
-    for e in events:
-        q = f"When is {e['title']}?"
-        a = f"{e['title']} is on {e['date']} at {e['time']} at {e['location']}."
-        examples.append({"messages": [{"role": "user", "content": q},
-                                      {"role": "assistant", "content": a}]})
-
-    # Notes
-    for note in notes:
-        if note.strip():
-            q = f"What do I need to remember about: {note[:20]}..."
-            a = note
-            examples.append({"messages": [{"role": "user", "content": q},
-                                          {"role": "assistant", "content": a}]})
-    return examples
-
-def main():
-    examples = create_training_examples()
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for ex in examples:
-            f.write(json.dumps(ex, ensure_ascii=False) + "\n")
-    print(f"Created {len(examples)} training examples in {OUTPUT_FILE}")
+FINE_TUNE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(FINE_TUNE_DIR.parent))
+
+from backend.services.fine_tune_dataset import build_dataset, export_dataset  # noqa: E402
+
+OUTPUT_FILE = FINE_TUNE_DIR / "user_training.jsonl"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the fine-tuning dataset from stored memories")
+    parser.add_argument("--user", default="default", help="whose memories to use")
+    parser.add_argument("--out", default=str(OUTPUT_FILE), help="merged JSONL output file")
+    parser.add_argument("--workers", type=int, help="processes writing part files")
+    args = parser.parse_args(argv)
+
+    options = {"workers": args.workers} if args.workers else {}
+    build = build_dataset(args.user, **options)
+    if build["status"] == "failed":
+        sys.exit(f"Dataset build failed: {build['error']}")
+    total = export_dataset(args.user, args.out)
+    print(f"Read {build['memories']} new memories, added {build['examples']} examples "
+          f"({build['duplicates']} duplicates skipped); {total} examples in {args.out}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,32 @@
+"""
+Every file the services keep under data/ by default (embedding cache,
+memory store, ingest jobs, fine-tune datasets) goes to the test's tmp_path
+instead, whichever test modules run and in whatever order.
+"""
+import os
+
+import pytest
+
+# Read when the services are imported (the cache is created then), so it must
+# be set before any test module imports them; the fixture then gives each
+# test a cache of its own under tmp_path
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+
+from backend.services import embeddings, fine_tune_dataset, ingest_jobs, memory_store  # noqa: E402
+from backend.services.embedding_cache import EmbeddingCache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_data(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    monkeypatch.setattr(embeddings, "cache", EmbeddingCache(max_items=embeddings.EMBEDDING_CACHE_SIZE,
+                                                            path=data / "embedding_cache.sqlite"))
+    monkeypatch.setattr(memory_store, "STORE_DIR", str(data / "memory_store"))
+    monkeypatch.setattr(memory_store, "_shards", None)
+    monkeypatch.setattr(ingest_jobs, "INGEST_JOBS_DIR", str(data / "ingest_jobs"))
+    monkeypatch.setattr(ingest_jobs, "_jobs", None)
+    monkeypatch.setattr(ingest_jobs, "_runner", None)
+    monkeypatch.setattr(fine_tune_dataset, "FINE_TUNE_DIR", str(data / "fine_tune"))
+    monkeypatch.setattr(fine_tune_dataset, "_builds", None)
+    monkeypatch.setattr(fine_tune_dataset, "_runner", None)
+    return data
@@ -0,0 +1,122 @@
+import time
+
+import numpy as np
+import pytest
+
+from backend.services import memory_store, predictions
+from backend.services.answer_cache import AnswerCache
+from backend.services.shards import MemoryShard
+
+DIM = memory_store.VECTOR_DIM
+
+
+@pytest.fixture
+def brain(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((10, DIM), dtype=np.float32)
+    question_vecs = {}
+    llm_calls = []
+
+    def fake_embed(text):
+        return question_vecs[text].tolist()
+
+    def fake_llm(question, memories):
+        llm_calls.append(question)
+        return f"answer #{len(llm_calls)}"
+
+    monkeypatch.setattr(predictions, "embed_text", fake_embed)
+    monkeypatch.setattr(predictions, "answer_from_memories", fake_llm)
+    predictions.answer_cache.clear()
+    memory_store.open_store(tmp_path)
+    memory_store.add_memories([f"memory {i}" for i in range(10)], vectors)
+    question_vecs["favourite food?"] = vectors[2] + 0.01
+    question_vecs["favourite food ?"] = vectors[2] + 0.011
+    return vectors, question_vecs, llm_calls
+
+
+def test_repeated_question_hits_cache(brain):
+    _, _, llm_calls = brain
+    first = predictions.ask("default", "favourite food?", top_k=3)
+    second = predictions.ask("default", "favourite food?", top_k=3)
+    near = predictions.ask("default", "favourite food ?", top_k=3)
+
+    assert not first["cached"] and second["cached"] and near["cached"]
+    assert second["answer"] == near["answer"] == first["answer"]
+    assert second["context"] == first["context"]
+    assert len(llm_calls) == 1
+
+
+def test_cache_is_per_user(brain):
+    vectors, _, llm_calls = brain
+    memory_store.add_memories([f"memory {i}" for i in range(10)], vectors, user_id="bob")
+    predictions.ask("default", "favourite food?", top_k=3)
+    assert not predictions.ask("bob", "favourite food?", top_k=3)["cached"]
+    assert len(llm_calls) == 2
+
+
+def test_relevant_new_memory_invalidates(brain):
+    _, question_vecs, llm_calls = brain
+    predictions.ask("default", "favourite food?", top_k=3)
+    invalidations = predictions.answer_cache_stats()["invalidations"]
+
+    memory_store.add_memory("loves ramen", question_vecs["favourite food?"])
+    result = predictions.ask("default", "favourite food?", top_k=3)
+
+    assert not result["cached"] and "loves ramen" in result["context"]
+    assert predictions.answer_cache_stats()["invalidations"] == invalidations + 1
+
+
+def test_unrelated_new_memory_keeps_entry(brain):
+    predictions.ask("default", "favourite food?", top_k=3)
+    memory_store.add_memory("unrelated", np.full(DIM, 100.0, dtype=np.float32))
+    assert predictions.ask("default", "favourite food?", top_k=3)["cached"]
+
+
+def test_editing_a_context_memory_invalidates(brain):
+    vectors, _, _ = brain
+    first = predictions.ask("default", "favourite food?", top_k=3)
+    assert first["context"][0] == "memory 2"
+
+    memory_store.update_memory(2, "memory 2 (edited)", vectors[2])
+    result = predictions.ask("default", "favourite food?", top_k=3)
+    assert not result["cached"] and result["context"][0] == "memory 2 (edited)"
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    cache = AnswerCache(max_items=2, ttl_seconds=60, threshold=0.9)
+    hits = [{"id": 0, "distance": 0.1}]
+    for i in range(3):
+        vec = np.eye(4, dtype=np.float32)[i]
+        cache.put("u", f"q{i}", vec, hits, 1, f"a{i}")
+    assert cache.get("u", np.eye(4)[0], [0], 1) is None  # evicted (LRU)
+    assert cache.get("u", np.eye(4)[2], [0], 1) == "a2"
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get("u", np.eye(4)[2], [0], 1) is None
+    assert cache.stats()["items"] == 0  # expired entries are dropped on lookup
+
+
+def test_answer_without_hits_is_cached():
+    cache = AnswerCache()
+    cache.put("u", "q", [1, 0], [], 0, "a")
+    cache.put("u", "q", [1, 0], [{"id": 0, "distance": None}], 1, "b")
+    assert cache.stats()["items"] == 2
+    cache.on_memory_event("add", "u", ids=[1], texts=["x"], vectors=[[5, 5]])
+    assert cache.stats()["items"] == 0  # no k-th distance: any new memory could enter the top-k
+
+
+def test_edit_in_another_worker_invalidates(brain):
+    vectors, _, llm_calls = brain
+    assert predictions.ask("default", "favourite food?", top_k=3)["context"][0] == "memory 2"
+
+    # Another worker process sharing the store edits the memory the answer came from
+    shard = memory_store.get_shard()
+    other = MemoryShard(shard.path, DIM, snapshot_every=memory_store.SNAPSHOT_EVERY)
+    other.update(2, "memory 2 (edited elsewhere)", vectors[2], {})
+
+    result = predictions.ask("default", "favourite food?", top_k=3)
+    assert not result["cached"] and result["context"][0] == "memory 2 (edited elsewhere)"
+    other.delete([2])
+    assert not predictions.ask("default", "favourite food?", top_k=3)["cached"]
+    assert len(llm_calls) == 3
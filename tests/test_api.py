@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# app.py imports the services as a top-level package, like uvicorn running from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+import app  # noqa: E402
+from services import memory_store  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    memory_store.open_store(tmp_path / "store")
+    return TestClient(app.app)
+
+
+def _search(client, query, **filters):
+    response = client.post("/search/", json={"query": query, "mode": "vector", **filters})
+    assert response.status_code == 200
+    return [hit["text"] for hit in response.json()["hits"]]
+
+
+def test_added_memories_match_source_and_time_filters(client):
+    response = client.post("/add_memory/", json={"text": "dentist on friday", "source": "calendar",
+                                                  "metadata": {"place": "downtown"}})
+    assert response.status_code == 201
+    response = client.post("/add_memories/", json={"items": [
+        {"text": "buy milk", "source": "notes", "metadata": {"timestamp": "2020-01-01T00:00:00"}},
+        {"text": "call mom"},
+    ]})
+    assert response.json()["added"] == 2
+
+    assert _search(client, "dentist", source=["calendar"], since="2024-01-01") == ["dentist on friday"]
+    assert _search(client, "milk", source=["notes"], until="2021-01-01") == ["buy milk"]
+    assert sorted(_search(client, "anything", since="2024-01-01")) == ["call mom", "dentist on friday"]
+    assert memory_store.get_memory(0)["metadata"]["place"] == "downtown"
+    assert memory_store.get_memory(2)["metadata"]["source"] == "manual"
+
+
+@pytest.mark.parametrize("path,body", [
+    ("/search/", {"query": "tea"}),
+    ("/search_batch/", {"queries": ["tea"]}),
+    ("/ask_brain/", {"question": "tea?"}),
+])
+@pytest.mark.parametrize("k", [0, -1])
+def test_non_positive_k_is_rejected(client, path, body, k):
+    response = client.post(path, json={**body, "k": k})
+    assert response.status_code == 400 and response.json()["detail"] == "k must be at least 1"
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from backend.services import embeddings, memory_store, predictions
+from backend.services.embedding_dispatcher import EmbeddingDispatcher
+
+PROVIDER_LATENCY = 0.05
+
+
+@pytest.fixture(autouse=True)
+def fake_provider(tmp_path, monkeypatch):
+    async def slow_embeddings(texts):
+        await asyncio.sleep(PROVIDER_LATENCY)
+        rng = np.random.default_rng(abs(hash(tuple(texts))) % 2**32)
+        return rng.random((len(texts), memory_store.VECTOR_DIM), dtype=np.float32).tolist()
+
+    monkeypatch.setattr(embeddings, "_arequest_embeddings", slow_embeddings)
+    embeddings.cache.clear()
+    memory_store.open_store(tmp_path)
+
+
+def test_concurrent_questions_do_not_serialize():
+    async def ask_many(n):
+        return await asyncio.gather(*(
+            predictions.agenerate_response("u", f"question {i}?") for i in range(n)
+        ))
+
+    start = time.perf_counter()
+    answers = asyncio.run(ask_many(20))
+    elapsed = time.perf_counter() - start
+
+    assert len(answers) == 20 and all("Mock Second Brain" in a for a in answers)
+    assert elapsed < 10 * PROVIDER_LATENCY  # serialized would be >= 20 * latency
+
+
+def test_context_selection_runs_off_the_event_loop(monkeypatch):
+    threads = []
+    select_context = predictions.select_context
+
+    def recording_select_context(*args):
+        threads.append(threading.current_thread())
+        return select_context(*args)
+
+    monkeypatch.setattr(predictions, "select_context", recording_select_context)
+
+    async def ask_and_stream():
+        await predictions.aask("u", "question?")
+        return [event async for event, _ in predictions.astream_ask("u", "question?")]
+
+    assert asyncio.run(ask_and_stream())[-1] == "done"
+    assert len(threads) == 2 and threading.main_thread() not in threads
+
+
+def test_embedding_is_a_list_on_hit_and_miss():
+    async def embed_twice():
+        return [await embeddings.aembed_text("same text") for _ in range(2)]
+
+    miss, hit = asyncio.run(embed_twice())
+    assert type(miss) is list and type(hit) is list and miss == hit
+
+
+def test_async_add_then_ask():
+    async def flow():
+        vector = await embeddings.aembed_text("I drink green tea")
+        await memory_store.aadd_memory("I drink green tea", vector, user_id="u")
+        return await predictions.aask("u", "I drink green tea", top_k=1)
+
+    assert asyncio.run(flow())["context"] == ["I drink green tea"]
+
+
+def test_concurrent_single_embeds_share_provider_calls(monkeypatch):
+    calls = []
+
+    async def recording_provider(texts):
+        calls.append(len(texts))
+        await asyncio.sleep(PROVIDER_LATENCY)
+        return [[float(len(t))] * memory_store.VECTOR_DIM for t in texts]
+
+    monkeypatch.setattr(embeddings, "_arequest_embeddings", recording_provider)
+    # Wide enough that the cache lookups in front of the dispatcher can't split a batch
+    monkeypatch.setattr(embeddings, "EMBED_BATCH_MAX_WAIT_MS", 100)
+
+    async def embed_many():
+        vectors = await asyncio.gather(*(embeddings.aembed_text(f"text {i:03d}") for i in range(100)))
+        return vectors, embeddings.embedding_dispatcher_stats()
+
+    vectors, stats = asyncio.run(embed_many())
+
+    assert all(v[0] == 8.0 for v in vectors)
+    assert sum(calls) == 100
+    assert len(calls) <= 100 // embeddings.EMBED_BATCH_MAX_SIZE + 1
+    assert stats["requests"] == 100 and stats["batches"] == len(calls)
+
+
+def test_dispatcher_sends_batches_concurrently():
+    active, peak = 0, 0
+
+    async def provider(texts):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(PROVIDER_LATENCY)
+        active -= 1
+        return [[1.0] for _ in texts]
+
+    async def embed_many():
+        dispatcher = EmbeddingDispatcher(provider, max_batch_size=10, max_wait_ms=1, max_in_flight=3)
+        start = time.perf_counter()
+        vectors = await asyncio.gather(*(dispatcher.embed(f"t{i}") for i in range(50)))
+        return vectors, time.perf_counter() - start
+
+    vectors, elapsed = asyncio.run(embed_many())
+    assert vectors == [[1.0]] * 50
+    assert peak == 3  # five full batches, at most three in flight
+    assert elapsed < 4 * PROVIDER_LATENCY  # one at a time would be >= 5 * latency
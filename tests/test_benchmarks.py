@@ -0,0 +1,30 @@
+from benchmarks import corpus
+from benchmarks.compare import compare
+from benchmarks.retrieval import run_retrieval
+
+
+def test_corpus_is_deterministic():
+    first = next(corpus.corpus_batches(50, dim=16, seed=3))
+    again = next(corpus.corpus_batches(50, dim=16, seed=3))
+    assert first[0] == again[0] and (first[1] == again[1]).all()
+    assert next(corpus.corpus_batches(50, dim=16, seed=4))[0] != first[0]
+
+
+def test_retrieval_reports_recall_against_flat(tmp_path):
+    results = run_retrieval(3_000, ["hnsw"], k=5, query_count=20, single_adds=50,
+                            workdir=str(tmp_path))
+
+    flat, hnsw = results
+    assert (flat["index_type"], hnsw["built_index"]) == ("flat", "hnsw")
+    assert flat["recall_at_k"] == 1.0 and hnsw["recall_at_k"] > 0.8
+    assert hnsw["add"]["single"]["count"] == 50 and hnsw["search"]["count"] == 20
+    assert hnsw["search"]["p50_ms"] <= hnsw["search"]["p99_ms"]
+
+
+def test_compare_flags_regressions():
+    row = {"size": 10, "index_type": "hnsw", "recall_at_k": 0.95,
+           "search": {"qps": 1000.0, "p99_ms": 2.0}}
+    slower = {**row, "recall_at_k": 0.90, "search": {"qps": 950.0, "p99_ms": 3.0}}
+
+    checks = {c["metric"]: c["regressed"] for c in compare({"retrieval": [row]}, {"retrieval": [slower]})}
+    assert checks == {"search.qps": False, "search.p99_ms": True, "recall_at_k": True}
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from backend.services import memory_store
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(tmp_path):
+    memory_store.open_store(tmp_path)
+    yield
+
+
+def test_add_memories_single_index_add():
+    rng = np.random.default_rng(0)
+    vectors = rng.random((50, memory_store.VECTOR_DIM), dtype=np.float32)
+    texts = [f"memory {i}" for i in range(50)]
+
+    added = memory_store.add_memories(texts, vectors, [{"source": "bulk"}] * 50)
+
+    assert added == 50
+    assert len(memory_store.get_all_memories()) == 50
+    assert memory_store.get_all_memories() == texts
+    assert memory_store.search_memory(vectors[7].tolist(), k=1) == ["memory 7"]
+
+
+def test_add_memories_rejects_mismatched_lengths():
+    vectors = np.zeros((2, memory_store.VECTOR_DIM), dtype=np.float32)
+    with pytest.raises(ValueError):
+        memory_store.add_memories(["only one"], vectors)
+    assert len(memory_store.get_all_memories()) == 0
+
+
+def test_bulk_ingest_failure_only_fails_the_bad_item(monkeypatch):
+    from backend.services import data_ingestion
+
+    def embed_batch(texts):
+        if "bad" in texts:
+            raise ValueError("provider rejected 'bad'")
+        return np.ones((len(texts), memory_store.VECTOR_DIM), dtype=np.float32)
+
+    monkeypatch.setattr(data_ingestion, "embed_batch", embed_batch)
+    results = data_ingestion.bulk_ingest("default", [{"text": "a"}, {"text": "bad"}, {"text": ""},
+                                                     {"text": "c"}])
+
+    assert [r["status"] for r in results] == ["success", "error", "error", "success"]
+    assert results[1]["error"] == "provider rejected 'bad'" and results[1]["text"] == "bad"
+    assert memory_store.get_all_memories() == ["a", "c"]
@@ -0,0 +1,53 @@
+import numpy as np
+
+from backend.services import memory_store, predictions
+from backend.services.context_builder import build_context, count_tokens, mmr_order
+
+
+def _hits(texts):
+    return [{"id": i, "text": t} for i, t in enumerate(texts)]
+
+
+def test_count_tokens_scales_with_text():
+    assert count_tokens("") == 0
+    assert 0 < count_tokens("I like pasta.") < count_tokens("I like pasta. " * 10)
+
+
+def test_near_duplicates_are_dropped():
+    base = np.random.default_rng(0).random((3, 16), dtype=np.float32)
+    vectors = np.stack([base[0], base[0] * 1.01, base[1], base[2]])
+    hits, _ = build_context(_hits(["a", "a again", "b", "c"]), vectors, k=3, budget_tokens=1000)
+    assert [h["text"] for h in hits] == ["a", "b", "c"]
+
+
+def test_budget_is_respected():
+    texts = ["word " * 50, "short one", "word " * 50, "tiny"]
+    vectors = np.eye(4, dtype=np.float32)
+    hits, tokens = build_context(_hits(texts), vectors, k=4, budget_tokens=70, base_tokens=10)
+    assert [h["text"] for h in hits] == [texts[0], "short one", "tiny"]
+    assert tokens <= 70
+
+
+def test_mmr_prefers_diverse_memories():
+    query = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    vectors = np.array([[1.0, 0.1, 0.0], [1.0, 0.12, 0.0], [0.7, 0.0, 0.7]], dtype=np.float32)
+    assert mmr_order(query, vectors, mmr_lambda=1.0) == [0, 1, 2]
+    assert mmr_order(query, vectors, mmr_lambda=0.5)[:2] == [0, 2]
+
+
+def test_ask_reports_prompt_tokens(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((4, memory_store.VECTOR_DIM), dtype=np.float32)
+    vectors[1] = vectors[0]  # stored twice
+    predictions.answer_cache.clear()
+    memory_store.open_store(tmp_path)
+    memory_store.add_memories(["gym at 7am", "gym at 7am (copy)", "likes pasta", "reads books"],
+                              vectors)
+    monkeypatch.setattr(predictions, "embed_text", lambda text: vectors[0].tolist())
+
+    result = predictions.ask("default", "when do I work out?", top_k=2)
+
+    assert result["context"][0] == "gym at 7am" and "gym at 7am (copy)" not in result["context"]
+    assert len(result["context"]) == 2
+    prompt = predictions._build_messages("when do I work out?", result["context"])[0]["content"]
+    assert result["prompt_tokens"] == count_tokens(prompt)
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+from backend.services import memory_store
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_store, "COMPACT_MIN_DEAD", 10_000)  # compact only when asked
+    memory_store.open_store(tmp_path)
+    yield tmp_path
+
+
+def _vecs(n, seed=0):
+    return np.random.default_rng(seed).random((n, memory_store.VECTOR_DIM), dtype=np.float32)
+
+
+def test_add_returns_stable_ids():
+    vecs = _vecs(3)
+    ids = [memory_store.add_memory(f"memory {i}", vecs[i]) for i in range(3)]
+    assert ids == [0, 1, 2]
+    assert memory_store.get_memory(1) == {"id": 1, "text": "memory 1", "metadata": {}}
+
+
+def test_deleted_memory_is_not_searched():
+    vecs = _vecs(5)
+    memory_store.add_memories([f"memory {i}" for i in range(5)], vecs)
+
+    assert memory_store.delete_memory(2)
+    assert not memory_store.delete_memory(2)
+
+    hits = memory_store.search_hits(vecs[2].tolist(), k=5)
+    assert 2 not in [h["id"] for h in hits] and len(hits) == 4
+    assert memory_store.get_memory(2) is None
+    assert "memory 2" not in memory_store.get_all_memories()
+
+
+def test_listeners_hear_only_the_deleted_ids():
+    events = []
+
+    def listener(event, user_id, **change):
+        events.append((event, change.get("ids")))
+
+    memory_store.add_memories([f"memory {i}" for i in range(3)], _vecs(3))
+    memory_store.add_listener(listener)
+    try:
+        assert memory_store.delete_memories([1, 7, 1]) == 1
+        assert memory_store.delete_memories([7, 1]) == 0
+    finally:
+        memory_store.remove_listener(listener)
+    assert events == [("delete", [1])]
+
+
+def test_update_keeps_id():
+    vecs = _vecs(4)
+    memory_store.add_memories([f"memory {i}" for i in range(3)], vecs[:3])
+
+    assert memory_store.update_memory(1, "edited", vecs[3], {"source": "notes"})
+
+    hits = memory_store.search_hits(vecs[3].tolist(), k=1)
+    assert hits[0]["id"] == 1 and hits[0]["text"] == "edited"
+    assert memory_store.search_hits(vecs[1].tolist(), k=1)[0]["id"] != 1
+    assert memory_store.get_memory_meta(1) == {"source": "notes"}
+    assert not memory_store.update_memory(99, "missing", vecs[0])
+
+
+def test_deletes_survive_reopen(fresh_store):
+    vecs = _vecs(4)
+    memory_store.add_memories([f"memory {i}" for i in range(4)], vecs)
+    memory_store.delete_memory(0)
+    memory_store.update_memory(3, "edited", vecs[0])
+
+    memory_store.open_store(fresh_store)
+    assert memory_store.get_all_memories() == ["memory 1", "memory 2", "edited"]
+    assert memory_store.add_memory("next", vecs[1]) == 4
+
+
+def test_compaction_drops_dead_rows(fresh_store):
+    vecs = _vecs(10)
+    memory_store.add_memories([f"memory {i}" for i in range(10)], vecs,
+                              [{"source": "even" if i % 2 == 0 else "odd"} for i in range(10)])
+    memory_store.delete_memories([0, 2, 4, 6])
+    memory_store.update_memory(9, "edited", vecs[9])
+
+    memory_store.compact()
+    shard = memory_store.get_shard()
+    assert len(shard.log) == len(shard) == 6
+    assert shard.index.ntotal == 6
+
+    hits = memory_store.search_hits(vecs[9].tolist(), k=1)
+    assert hits[0]["id"] == 9 and hits[0]["text"] == "edited"
+    assert [h["id"] for h in memory_store.search_hits(vecs[8].tolist(), k=10, source="even")] == [8]
+
+    memory_store.open_store(fresh_store)
+    assert memory_store.get_all_memories() == [f"memory {i}" for i in (1, 3, 5, 7, 8)] + ["edited"]
+    assert memory_store.add_memory("next", vecs[0]) == 10
+
+
+def test_background_compaction_triggers_on_ratio(monkeypatch, tmp_path):
+    monkeypatch.setattr(memory_store, "COMPACT_MIN_DEAD", 2)
+    monkeypatch.setattr(memory_store, "COMPACT_RATIO", 0.5)
+    memory_store.open_store(tmp_path / "bg")
+    vecs = _vecs(6)
+    memory_store.add_memories([f"memory {i}" for i in range(6)], vecs)
+
+    memory_store.delete_memories([0, 1, 2])
+    shard = memory_store.get_shard()
+    compactor = shard._compactor
+    if compactor is not None:
+        compactor.join(10)
+
+    assert len(shard.log) == 3
+    assert memory_store.get_all_memories() == ["memory 3", "memory 4", "memory 5"]
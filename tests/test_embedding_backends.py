@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from backend.services import embedding_backends
+from backend.services.embedding_backends import MockBackend, OpenAIBackend, create_backend
+from backend.services.persistence import MemoryLog
+
+
+def test_provider_selection(monkeypatch):
+    monkeypatch.delenv("EMBEDDING_PROVIDER", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    assert isinstance(create_backend(), MockBackend)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    backend = create_backend()
+    assert isinstance(backend, OpenAIBackend) and backend.dim == 1536
+
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "mock")
+    assert isinstance(create_backend(), MockBackend)
+
+    with pytest.raises(ValueError):
+        create_backend("word2vec")
+
+
+def test_mock_backend_reports_its_dimension():
+    backend = MockBackend(dim=32)
+    vectors = backend.embed(["a", "b"])
+    assert vectors.shape == (2, backend.dim) == (2, 32)
+
+
+def test_local_backend_dimension_known_without_loading_model():
+    backend = embedding_backends.LocalBackend("sentence-transformers/all-MiniLM-L6-v2")
+    assert backend.dim == 384 and backend._st is None
+
+
+def test_store_refuses_vectors_of_another_dimension(tmp_path):
+    MemoryLog(tmp_path, 128).append(["x"], np.zeros((1, 128), dtype=np.float32), [{}])
+    with pytest.raises(ValueError, match="128-dim"):
+        MemoryLog(tmp_path, 384)
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+from backend.services.embedding_cache import EmbeddingCache, cache_key
+
+
+class CountingProvider:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_only_misses_reach_the_provider():
+    cache = EmbeddingCache(max_items=100)
+    provider = CountingProvider()
+
+    first = cache.embed_many("m", ["a", "bb"], provider)
+    second = cache.embed_many("m", ["bb", "ccc", "ccc", "a"], provider)
+
+    assert provider.calls == [["a", "bb"], ["ccc"]]
+    assert first == [[1.0, 1.0], [2.0, 1.0]]
+    assert second == [[2.0, 1.0], [3.0, 1.0], [3.0, 1.0], [1.0, 1.0]]
+    assert cache.stats()["memory_hits"] == 2
+
+
+def test_keys_depend_on_model_and_normalized_text():
+    assert cache_key("m", "hello   world\n") == cache_key("m", " hello world")
+    assert cache_key("m", "hello") != cache_key("other", "hello")
+
+
+def test_disk_level_survives_restart_and_lru_is_bounded(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    provider = CountingProvider()
+    cache = EmbeddingCache(max_items=1, path=path)
+    cache.embed_many("m", ["a", "bb"], provider)
+    assert cache.stats()["memory_items"] == 1
+
+    restarted = EmbeddingCache(max_items=1, path=path)
+    assert restarted.embed_many("m", ["a", "bb"], provider) == [[1.0, 1.0], [2.0, 1.0]]
+    assert len(provider.calls) == 1
+    stats = restarted.stats()
+    assert stats["disk_hits"] == 2 and stats["misses"] == 0 and stats["hit_rate"] == 1.0
+
+
+def test_async_lookups_keep_sqlite_off_the_event_loop(tmp_path, monkeypatch):
+    cache = EmbeddingCache(path=tmp_path / "cache.sqlite")
+    threads = []
+    for name in ("get_many", "put_many"):
+        method = getattr(cache, name)
+
+        def recording(*args, _method=method):
+            threads.append(threading.current_thread())
+            return _method(*args)
+
+        monkeypatch.setattr(cache, name, recording)
+
+    async def provider(texts):
+        return [[float(len(t)), 1.0] for t in texts]
+
+    assert asyncio.run(cache.aembed_many("m", ["a", "bb"], provider)) == [[1.0, 1.0], [2.0, 1.0]]
+    assert asyncio.run(cache.aembed_many("m", ["bb"], provider)) == [[2.0, 1.0]]
+    assert len(threads) == 3 and threading.main_thread() not in threads
+
+
+def test_misses_are_sent_in_provider_sized_batches():
+    cache = EmbeddingCache()
+    provider = CountingProvider()
+    texts = [f"text {i}" for i in range(5)]
+
+    assert cache.embed_many("m", texts, provider, batch_size=2) == [[6.0, 1.0]] * 5
+    assert [len(call) for call in provider.calls] == [2, 2, 1]
+
+    async def aprovider(texts):
+        return provider(texts)
+
+    more = [f"more {i}" for i in range(3)]
+    assert asyncio.run(cache.aembed_many("m", texts + more, aprovider, batch_size=2)) == \
+        [[6.0, 1.0]] * 8
+    assert [len(call) for call in provider.calls] == [2, 2, 1, 2, 1]
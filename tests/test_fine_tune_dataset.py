@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend.services import fine_tune_dataset, memory_store
+from backend.services.fine_tune_dataset import (
+    BuildQueue, DatasetBuildRunner, build_dataset, dataset_files, export_dataset, memory_example,
+)
+
+
+def _add(texts, user_id="default"):
+    vectors = np.random.default_rng(len(texts)).random((len(texts), memory_store.VECTOR_DIM),
+                                                       dtype=np.float32)
+    return memory_store.add_memory_ids(texts, vectors, user_id=user_id)
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def store(tmp_path):
+    memory_store.open_store(tmp_path / "store")
+    yield
+    memory_store.reset_store()
+
+
+def test_examples_follow_memory_kind():
+    habit = memory_example("Habit: Morning run at 06:30 (daily)")
+    assert habit["messages"][0]["content"] == "When do I usually morning run?"
+    assert habit["messages"][1]["content"] == "You usually morning run at 06:30 (daily)."
+    event = memory_example("Event: Dentist on 2024-05-01 at 09:00")
+    assert event["messages"][1]["content"] == "Dentist is on 2024-05-01 at 09:00."
+    assert memory_example("likes pasta")["messages"][1]["content"] == "likes pasta"
+    assert memory_example("   ") is None
+
+
+def test_second_build_reads_only_new_memories(store, tmp_path):
+    out_dir = tmp_path / "ft"
+    _add(["likes pasta", "reads books", "likes pasta"])
+
+    first = build_dataset("default", out_dir=out_dir, workers=1)
+    assert first["status"] == "done"
+    assert (first["memories"], first["examples"], first["duplicates"]) == (3, 2, 1)
+
+    _add(["plays chess", "reads books"])
+    second = build_dataset("default", out_dir=out_dir, workers=1)
+    assert (second["memories"], second["examples"], second["duplicates"]) == (2, 1, 1)
+    assert second["after_id"] == first["last_id"]
+
+    third = build_dataset("default", out_dir=out_dir, workers=1)
+    assert third["memories"] == 0 and third["parts"] == 0
+    assert len(dataset_files("default", out_dir)) == 2
+
+    merged = tmp_path / "train.jsonl"
+    assert export_dataset("default", merged, out_dir) == 3
+    answers = [example["messages"][1]["content"] for example in _lines(merged)]
+    assert answers == ["likes pasta", "reads books", "plays chess"]
+
+
+def test_users_are_built_separately(store, tmp_path):
+    out_dir = tmp_path / "ft"
+    _add(["likes pasta"], user_id="alice")
+    _add(["likes pasta", "plays chess"], user_id="bob")
+
+    assert build_dataset("alice", out_dir=out_dir, workers=1)["examples"] == 1
+    assert build_dataset("bob", out_dir=out_dir, workers=1)["examples"] == 2
+    assert build_dataset("nobody", out_dir=out_dir, workers=1)["memories"] == 0
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parts_are_written_in_memory_order(store, tmp_path, workers):
+    out_dir = tmp_path / "ft"
+    _add([f"note number {i}" for i in range(7)])
+    builds = BuildQueue(out_dir / "builds.sqlite")
+    runner = DatasetBuildRunner(builds, out_dir, workers=workers, shard_memories=2)
+    try:
+        build_id = builds.submit("default")
+        runner.run(builds.claim(build_id))
+    finally:
+        runner.stop()
+
+    build = builds.get(build_id)
+    assert build["status"] == "done" and build["parts"] == 4
+    files = dataset_files("default", out_dir)
+    assert [path.name for path in files] == sorted(path.name for path in files)
+    answers = [example["messages"][1]["content"] for path in files for example in _lines(path)]
+    assert answers == [f"note number {i}" for i in range(7)]
+
+
+def test_orphaned_parts_are_removed(store, tmp_path):
+    out_dir = tmp_path / "ft"
+    _add(["likes pasta"])
+    user_dir = fine_tune_dataset._user_dir(out_dir, "default")
+    user_dir.mkdir(parents=True)
+    (user_dir / "part-000000000099-000000000100.jsonl").write_text("stale\n")
+
+    build_dataset("default", out_dir=out_dir, workers=1)
+    assert [path.name for path in user_dir.glob("part-*")] == ["part-000000000000-000000000000.jsonl"]
@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+import pytest
+from backend.services import memory_store
+from backend.services.lexical_index import LexicalIndex, rrf_fuse, tokenize
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(tmp_path):
+    memory_store.open_store(tmp_path)
+    yield
+
+
+def _vecs(n, seed=0):
+    return np.random.default_rng(seed).random((n, memory_store.VECTOR_DIM), dtype=np.float32)
+
+
+def test_tokenize_keeps_dates_and_drops_stopwords():
+    assert tokenize("Project deadline is on 2025-10-01.") == ["project", "deadline", "2025-10-01"]
+
+
+def test_bm25_ranks_rarer_and_repeated_terms_higher():
+    index = LexicalIndex()
+    index.add(["pasta pasta dinner", "pasta lunch", "gym at 7am", "dinner with anna"])
+
+    _, rows = index.search("pasta", k=5)
+    assert rows.tolist() == [0, 1]
+    _, rows = index.search("anna dinner", k=5)
+    assert rows.tolist()[0] == 3
+    _, rows = index.search("pasta", k=5, mask=np.array([False, True, True, True]))
+    assert rows.tolist() == [1]
+    assert len(index.search("nothing matches", k=5)[1]) == 0
+
+
+def test_lexical_search_finds_exact_keyword():
+    texts = ["I like Italian food", "Project deadline is on 2025-10-01", "Workout at 7am"]
+    memory_store.add_memories(texts, _vecs(3))
+
+    hits = memory_store.search_hits(None, k=3, query_text="when is 2025-10-01?", mode="lexical")
+    assert [h["id"] for h in hits] == [1]
+    assert hits[0]["distance"] is None
+
+
+def test_hybrid_fuses_both_rankings():
+    vecs = _vecs(20)
+    memory_store.add_memories([f"memory {i}" for i in range(19)] + ["call anna"], vecs)
+
+    # The vector favours memory 3, the keyword favours memory 19: both come back
+    hits = memory_store.search_hits(vecs[3].tolist(), k=2, query_text="anna", mode="hybrid")
+    assert {h["id"] for h in hits} == {3, 19}
+
+
+def test_lexical_index_follows_adds_and_deletes():
+    memory_store.add_memories(["dentist on friday"], _vecs(1))
+    memory_store.search_hits(None, k=1, query_text="dentist", mode="lexical")  # builds the index
+    memory_store.add_memories(["dentist moved to monday"], _vecs(1, seed=1))
+    memory_store.delete_memory(0)
+
+    hits = memory_store.search_hits(None, k=5, query_text="dentist", mode="lexical")
+    assert [h["text"] for h in hits] == ["dentist moved to monday"]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        memory_store.search_hits(None, k=1, query_text="x", mode="fuzzy")
+    with pytest.raises(ValueError):
+        memory_store.search_hits(None, k=1, mode="lexical")
+
+
+def test_rrf_fuse():
+    assert rrf_fuse([[1, 2, 3], [3, 1]], k=2) == [(1, 1 / 61 + 1 / 62), (3, 1 / 63 + 1 / 61)]
+
+
+def test_rare_term_lookup_is_fast():
+    rng = np.random.default_rng(0)
+    words = rng.integers(0, 5_000, size=(30_000, 8))
+    index = LexicalIndex()
+    index.add([" ".join(f"word{w}" for w in row) + f" ticket{i}" for i, row in enumerate(words)])
+
+    start = time.perf_counter()
+    for i in range(100):
+        _, rows = index.search(f"ticket{i * 7}", k=5)
+    per_query = (time.perf_counter() - start) / 100
+    assert rows.tolist() == [99 * 7]
+    assert per_query < 0.005
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from backend.services import memory_store
+from backend.services.index_factory import build_index, index_type_of
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, memory_store.VECTOR_DIM), dtype=np.float32)
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "hnsw", "ivf_pq"])
+def test_build_index_round_trips_type(index_type):
+    assert index_type_of(build_index(index_type, 64, 10_000)) == index_type
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "hnsw"])
+def test_shard_upgrades_in_background_and_survives_reopen(tmp_path, monkeypatch, index_type):
+    monkeypatch.setattr(memory_store, "INDEX_TYPE", index_type)
+    monkeypatch.setattr(memory_store, "INDEX_TRAIN_THRESHOLD", 2_000)
+    memory_store.open_store(tmp_path)
+    vectors = _vectors(2_100)
+    texts = [f"m{i}" for i in range(len(vectors))]
+
+    memory_store.add_memories(texts[:1_999], vectors[:1_999])
+    shard = memory_store.get_shard()
+    assert index_type_of(shard.index) == "flat" and not shard.upgrading
+
+    memory_store.add_memories(texts[1_999:], vectors[1_999:])
+    shard.wait_for_upgrade()
+    assert index_type_of(shard.index) == index_type
+    assert shard.index.ntotal == len(vectors)
+    assert memory_store.search_memory(vectors[42].tolist(), k=1, nprobe=64, ef_search=128) == ["m42"]
+
+    memory_store.open_store(tmp_path)
+    shard = memory_store.get_shard()
+    assert index_type_of(shard.index) == index_type
+    memory_store.add_memory("new", vectors[0].tolist())
+    # New rows are searched from the view's head until the next seal
+    view = shard.view()
+    assert view.base_rows == shard.index.ntotal == len(vectors) and view.rows == len(vectors) + 1
+
+
+def test_unknown_index_type_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_store, "INDEX_TYPE", "annoy")
+    with pytest.raises(ValueError):
+        memory_store.open_store(tmp_path)
@@ -0,0 +1,92 @@
+import json
+import time
+
+import pytest
+
+from backend.services import ingest_jobs, memory_store
+from backend.services.ingest_jobs import IngestJobRunner, JobQueue
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    memory_store.open_store(tmp_path / "store")
+    return JobQueue(tmp_path / "jobs" / "jobs.sqlite")
+
+
+def _wait(jobs, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job)
+
+
+def test_queue_survives_restart(jobs, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("a\n")
+    job_id = jobs.submit("u", path, "text")
+    assert jobs.claim()["id"] == job_id and jobs.claim() is None
+
+    reopened = JobQueue(tmp_path / "jobs" / "jobs.sqlite")
+    assert reopened.requeue_interrupted() == 1
+    assert reopened.claim()["status"] == "running"
+
+
+def test_segments_are_processed_in_parallel_and_written_once(jobs, tmp_path):
+    path = tmp_path / "chat.jsonl"
+    lines = [json.dumps({"text": f"message number {i}", "source": "chat"}) for i in range(300)]
+    lines.append(json.dumps({"text": "message number 0"}))  # duplicate
+    path.write_text("\n".join(lines) + "\n")
+
+    runner = IngestJobRunner(jobs, tmp_path / "jobs", workers=2, segment_bytes=1000,
+                             poll_seconds=0.05)
+    runner.start()
+    try:
+        job_id = jobs.submit("u", path, "jsonl")
+        runner.notify()
+        job = _wait(jobs, job_id)
+    finally:
+        runner.stop()
+
+    assert job["status"] == "done", job["error"]
+    assert job["progress"] == 1.0
+    assert job["records"] == 301 and job["inserted"] == 300 and job["duplicates"] == 1
+    memories = memory_store.get_all_memories("u")
+    assert sorted(memories) == sorted(f"message number {i}" for i in range(300))
+    metadata = memory_store.get_memory(0, "u")["metadata"]
+    assert metadata["source"] == "chat" and set(metadata) == {"user_id", "source", "timestamp"}
+
+    # Every segment is checkpointed: running the job again inserts nothing
+    runner = IngestJobRunner(jobs, tmp_path / "jobs", workers=1, segment_bytes=1000)
+    try:
+        runner.run_job(jobs.get(job_id))
+    finally:
+        runner.stop()
+    assert len(memory_store.get_all_memories("u")) == 300
+
+
+def test_json_array_job(jobs, tmp_path):
+    path = tmp_path / "calendar.json"
+    path.write_text(json.dumps({"events": [{"text": f"event {i}"} for i in range(40)]}))
+
+    runner = IngestJobRunner(jobs, tmp_path / "jobs", workers=1)
+    try:
+        job_id = jobs.submit("u", path, "json", {"items_key": "events"})
+        runner.run_job(jobs.claim())
+    finally:
+        runner.stop()
+
+    job = jobs.get(job_id)
+    assert job["inserted"] == 40 and job["done_bytes"] == job["total_bytes"]
+    assert memory_store.get_all_memories("u")[:2] == ["event 0", "event 1"]
+
+
+def test_files_outside_ingest_root_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_jobs, "INGEST_ROOT", str(tmp_path / "allowed"))
+    (tmp_path / "secret.txt").write_text("nope")
+    with pytest.raises(ValueError):
+        ingest_jobs.submit_file_job("u", tmp_path / "secret.txt")
+    with pytest.raises(ValueError):
+        ingest_jobs.submit_file_job("u", "../secret.txt")
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from backend.services import data_ingestion, ingest_pipeline, memory_store
+from backend.services.ingest_pipeline import (
+    IngestPipeline, JsonArrayReader, JsonlReader, TextReader, chunk_text, iter_json_array,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(tmp_path):
+    memory_store.open_store(tmp_path / "store")
+    yield
+
+
+def test_json_array_is_parsed_incrementally(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_pipeline, "_READ_SIZE", 7)  # elements span many blocks
+    path = tmp_path / "cal.json"
+    events = [{"title": f"Évènement {i}", "n": i * 1.5} for i in range(20)]
+    path.write_text(json.dumps({"owner": "me", "events": events}, ensure_ascii=False))
+
+    parsed = list(iter_json_array(path, items_key="events"))
+    assert [obj for obj, _ in parsed] == events
+
+    # Resuming from an element's end offset continues with the next element
+    resumed = [obj for obj, _ in iter_json_array(path, start=parsed[9][1], items_key="events")]
+    assert resumed == events[10:]
+
+
+def test_chunks_overlap_and_respect_size():
+    text = " ".join(f"word{i}" for i in range(300))
+    chunks = list(chunk_text(text, max_chars=200, overlap=50))
+
+    assert all(len(c) <= 200 for c in chunks)
+    assert chunks[0].startswith("word0 ") and chunks[-1].endswith("word299")
+    for a, b in zip(chunks, chunks[1:]):
+        assert b.split()[0] in a.split()  # consecutive chunks share words
+    assert list(chunk_text("short")) == ["short"]
+
+
+def test_pipeline_ingests_and_dedups(tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("buy milk\n\nbuy  milk\ncall mom\n")
+    chats = tmp_path / "chat.jsonl"
+    chats.write_text("\n".join(json.dumps({"text": t, "timestamp": "2025-01-01T00:00:00"})
+                               for t in ["hello", "call mom", "see you"]))
+
+    stats = IngestPipeline("u", batch_size=2).run([TextReader(notes), JsonlReader(chats)])
+
+    assert stats["records"] == 6 and stats["duplicates"] == 2 and stats["inserted"] == 4
+    assert memory_store.get_all_memories("u") == ["buy milk", "call mom", "hello", "see you"]
+    assert memory_store.get_memory(2, "u")["metadata"] == {
+        "user_id": "u", "source": "jsonl", "timestamp": "2025-01-01T00:00:00"}
+
+
+def test_pipeline_ingests_json_array(tmp_path):
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps({"owner": "me", "events": [
+        {"body": "dentist at 3", "when": "2025-02-01T15:00:00"},
+        {"body": "pay rent"},
+        {"body": "dentist at 3", "when": "2025-02-01T15:00:00"},
+    ]}))
+
+    reader = JsonArrayReader(path, items_key="events", text_field="body", timestamp_field="when")
+    stats = IngestPipeline("u").run([reader])
+
+    assert stats["records"] == 3 and stats["duplicates"] == 1 and stats["inserted"] == 2
+    assert memory_store.get_all_memories("u") == ["dentist at 3", "pay rent"]
+    assert memory_store.get_memory(0, "u")["metadata"]["timestamp"] == "2025-02-01T15:00:00"
+
+
+def test_pipeline_resumes_from_checkpoint(tmp_path, monkeypatch):
+    path = tmp_path / "big.jsonl"
+    path.write_text("\n".join(json.dumps({"text": f"message {i}"}) for i in range(50)))
+    checkpoint = tmp_path / "job.sqlite"
+
+    real_add = ingest_pipeline.add_memories
+    calls = []
+
+    def crash_on_third_batch(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError("power cut")
+        return real_add(*args, **kwargs)
+
+    monkeypatch.setattr(ingest_pipeline, "add_memories", crash_on_third_batch)
+    with pytest.raises(RuntimeError):
+        IngestPipeline("u", checkpoint_path=checkpoint, batch_size=8).run([JsonlReader(path)])
+    assert len(memory_store.get_all_memories("u")) == 16
+
+    monkeypatch.setattr(ingest_pipeline, "add_memories", real_add)
+    stats = IngestPipeline("u", checkpoint_path=checkpoint, batch_size=8).run([JsonlReader(path)])
+
+    assert stats["inserted"] == 34
+    assert memory_store.get_all_memories("u") == [f"message {i}" for i in range(50)]
+
+
+def test_sample_data_uses_pipeline():
+    class Brain:
+        user_id = "demo"
+
+    result = data_ingestion.ingest_sample_data(Brain())
+    memories = memory_store.get_all_memories("demo")
+
+    assert result["inserted"] == len(memories) > 0
+    assert any(m.startswith("Event: Team Meeting on 2025-09-12") for m in memories)
+    assert any(m.startswith("Habit: Morning Jog at 06:00") for m in memories)
@@ -0,0 +1,86 @@
+import datetime
+import json
+
+import numpy as np
+from backend.services.metadata_index import MetadataIndex, from_epoch_us, to_epoch_us
+from backend.services.persistence import MemoryLog, OFFSETS_FILE, RECORDS_FILE
+
+
+def _append(log, metas):
+    log.append([f"m{i}" for i in range(len(metas))], np.ones((len(metas), 4), dtype=np.float32), metas)
+
+
+def _raw_records(path):
+    return [json.loads(line) for line in (path / RECORDS_FILE).read_text().splitlines()]
+
+
+def test_metadata_round_trips_through_columns(tmp_path):
+    metas = [
+        {"user_id": "u", "source": "notes", "timestamp": "2025-09-20T12:00:00.123456"},
+        {"source": "calendar", "timestamp": "2025-09-20T12:00:00+02:00", "tags": ["a"]},
+        {"source": 7, "timestamp": 1_700_000_000},
+        {"timestamp": "yesterday"},
+        {},
+    ]
+    log = MemoryLog(tmp_path, 4)
+    _append(log, metas)
+
+    assert [log.meta(i) for i in range(5)] == metas
+    # Column-encodable values are not repeated in the record log
+    assert _raw_records(tmp_path)[0] == {"text": "m0"}
+    assert _raw_records(tmp_path)[1]["meta"] == {"timestamp": "2025-09-20T12:00:00+02:00", "tags": ["a"]}
+
+    log = MemoryLog(tmp_path, 4)  # reopen: dictionaries and columns come back from disk
+    assert [log.meta(i) for i in range(5)] == metas
+    assert log.meta_columns.values("source") == ["notes", "calendar"]
+
+
+def test_filters_use_every_timestamp_form(tmp_path):
+    log = MemoryLog(tmp_path, 4)
+    _append(log, [
+        {"source": "notes", "timestamp": "2025-09-20T12:00:00"},
+        {"source": "chat", "timestamp": "2025-09-20T12:00:00+00:00"},
+        {"source": "chat", "timestamp": datetime.datetime(2025, 9, 10).timestamp()},
+        {"source": "chat"},
+    ])
+    index = MetadataIndex(log.meta_columns)
+
+    assert index.mask(source=["chat", "email"]).tolist() == [False, True, True, True]
+    assert index.mask(since="2025-09-15T00:00:00").tolist() == [True, True, False, False]
+    assert index.mask(source="chat", until=datetime.datetime(2025, 9, 21)).tolist() == [False, True, True, False]
+    assert not index.mask(source="email").any()
+
+
+def test_old_stores_get_columns_on_open(tmp_path):
+    log = MemoryLog(tmp_path, 4)
+    _append(log, [{"source": "notes", "timestamp": "2025-09-20T12:00:00", "i": 0}])
+    # A store written before the columns existed: full meta in the record, no column files
+    line = json.dumps({"text": "m0", "meta": {"source": "notes", "timestamp": "2025-09-20T12:00:00",
+                                              "i": 0}}).encode() + b"\n"
+    (tmp_path / RECORDS_FILE).write_bytes(line)
+    np.array([len(line)], dtype="<i8").tofile(tmp_path / OFFSETS_FILE)
+    for column in tmp_path.glob("meta_*"):
+        column.unlink()
+
+    log = MemoryLog(tmp_path, 4)
+
+    assert log.meta(0) == {"source": "notes", "timestamp": "2025-09-20T12:00:00", "i": 0}
+    assert MetadataIndex(log.meta_columns).mask(source="notes", since="2025-09-01").tolist() == [True]
+
+
+def test_torn_column_tail_is_truncated(tmp_path):
+    log = MemoryLog(tmp_path, 4)
+    _append(log, [{"source": "notes"}])
+    # Crash after the columns were written but before the offsets commit
+    log.meta_columns.append(log.meta_columns.encode([{"source": "chat"}])[0])
+
+    log = MemoryLog(tmp_path, 4)
+    assert len(log.meta_columns) == 1
+    _append(log, [{"source": "chat"}])
+    assert [log.meta(i)["source"] for i in range(2)] == ["notes", "chat"]
+
+
+def test_epoch_conversion_is_exact():
+    stamp = "2025-09-20T12:34:56.789012"
+    assert from_epoch_us(to_epoch_us(stamp)) == stamp
+    assert to_epoch_us("2025-09-20T12:34:56+00:00") == to_epoch_us("2025-09-20T12:34:56")
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+
+from backend.services import memory_store, metrics, predictions
+from backend.services.metrics import Registry
+from backend.services.profiler import SamplingProfiler
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    counter = registry.counter("jobs_total", "Jobs", ("kind",))
+    histogram = registry.histogram("wait_seconds", "Wait", buckets=(0.1, 1.0))
+    registry.callback("queue_depth", "gauge", "Depth", lambda: 7)
+    counter.inc(kind='say "hi"')
+    counter.inc(2, kind='say "hi"')
+    for value in (0.05, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{kind="say \\"hi\\""} 3' in lines
+    assert 'wait_seconds_bucket{le="0.1"} 1' in lines
+    assert 'wait_seconds_bucket{le="1.0"} 2' in lines
+    assert 'wait_seconds_bucket{le="+Inf"} 3' in lines
+    assert "wait_seconds_count 3" in lines and "queue_depth 7" in lines
+
+
+def test_spans_feed_histogram_and_request_timings():
+    before = metrics.STAGE_SECONDS.count(stage="unit")
+    timings = metrics.begin_request()
+    with metrics.span("unit"):
+        pass
+    with metrics.span("unit"):
+        pass
+    assert metrics.STAGE_SECONDS.count(stage="unit") == before + 2
+    assert [stage for stage, _ in timings] == ["unit", "unit"]
+    header = metrics.server_timing(timings, 0.01)
+    assert header.startswith("unit;dur=") and header.endswith("total;dur=10.00")
+
+
+def test_disabled_metrics_are_noops(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    before = metrics.SEARCHES.value(mode="off")
+    metrics.SEARCHES.inc(mode="off")
+    assert metrics.span("x") is metrics.span("y")
+    assert metrics.SEARCHES.value(mode="off") == before
+
+
+def test_ask_is_instrumented(tmp_path, monkeypatch):
+    vectors = np.random.default_rng(0).random((3, memory_store.VECTOR_DIM), dtype=np.float32)
+    memory_store.open_store(tmp_path)
+    memory_store.add_memories(["gym at 7am", "likes pasta", "reads books"], vectors)
+    predictions.answer_cache.clear()
+    monkeypatch.setattr(predictions, "embed_text", lambda text: vectors[0].tolist())
+    searched = metrics.VECTORS_SEARCHED.value()
+    prompt_tokens = metrics.TOKENS_USED.value(kind="prompt")
+
+    timings = metrics.begin_request()
+    result = predictions.ask("default", "when do I work out?", top_k=2)
+
+    assert {"search", "context", "llm"} <= {stage for stage, _ in timings}
+    assert metrics.VECTORS_SEARCHED.value() == searched + 3
+    assert metrics.TOKENS_USED.value(kind="prompt") == prompt_tokens + result["prompt_tokens"]
+    assert 'secondbrain_answer_cache_lookups_total{result="miss"}' in metrics.render()
+
+
+def _busy_wait(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler_sees_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_wait, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler()
+    try:
+        assert profiler.start(interval_ms=1)
+        assert not profiler.start()  # already running
+        time.sleep(0.2)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not profiler.running and profiler.samples > 0
+    assert any("_busy_wait" in line for line in profiler.collapsed().splitlines())
+    assert any("_busy_wait" in row["function"] for row in profiler.top(5))
@@ -0,0 +1,26 @@
+import numpy as np
+from backend.services.mock_embeddings import MOCK_DIM, embed_batch, embed_text, mock_embed_batch
+
+
+def test_full_dimension_float32_batch():
+    out = mock_embed_batch(["I like tea", "Meeting on Monday", "!!!"])
+    assert out.shape == (3, MOCK_DIM)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(out, axis=1), 1.0, rtol=1e-5)
+
+
+def test_deterministic_and_matches_single_text_path():
+    batch = mock_embed_batch(["morning jog in the park", "tea"])
+    again = embed_batch(["morning jog in the park", "tea"])
+    np.testing.assert_array_equal(batch, again)
+    np.testing.assert_allclose(embed_text("tea"), batch[1], rtol=1e-6)
+    assert not np.allclose(mock_embed_batch(["tea"], seed=1), batch[1])
+
+
+def test_similar_texts_are_closer():
+    a, b, c = mock_embed_batch([
+        "I go jogging every morning in the park",
+        "Every morning I go for a jog in the park",
+        "Dentist appointment at the city clinic",
+    ])
+    assert a @ b > a @ c
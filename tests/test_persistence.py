@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+from backend.services import memory_store
+from backend.services.persistence import MemoryLog, OFFSETS_FILE, RECORDS_FILE
+
+
+def _vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((n, memory_store.VECTOR_DIM), dtype=np.float32)
+
+
+def test_store_survives_reopen(tmp_path):
+    memory_store.open_store(tmp_path)
+    vectors = _vectors(20)
+    memory_store.add_memories([f"note {i}" for i in range(20)], vectors,
+                              [{"source": "notes", "i": i} for i in range(20)])
+
+    memory_store.open_store(tmp_path)  # simulate a restart
+
+    assert memory_store.get_all_memories() == [f"note {i}" for i in range(20)]
+    assert memory_store.get_memory_meta(3) == {"source": "notes", "i": 3}
+    assert memory_store.search_memory(vectors[11].tolist(), k=1) == ["note 11"]
+
+
+def test_snapshot_then_replay_tail(tmp_path):
+    memory_store.open_store(tmp_path)
+    vectors = _vectors(10)
+    memory_store.add_memories([f"a{i}" for i in range(5)], vectors[:5])
+    memory_store.snapshot()
+    memory_store.add_memories([f"a{i}" for i in range(5, 10)], vectors[5:])
+
+    memory_store.open_store(tmp_path)
+
+    view = memory_store.get_shard().view()
+    assert view.base_rows == view.index.ntotal == 5 and view.rows == 10
+    assert memory_store.search_memory(vectors[8].tolist(), k=1) == ["a8"]
+    memory_store.add_memory("after reopen", vectors[0].tolist())
+    assert memory_store.get_shard().view().rows == 11
+    memory_store.snapshot()
+    assert memory_store.get_shard().index.ntotal == 11
+
+
+def test_torn_write_is_truncated_on_open(tmp_path):
+    log = MemoryLog(tmp_path, 4)
+    log.append(["ok"], np.ones((1, 4), dtype=np.float32), [{}])
+    # Crash after writing the record but before its offset was committed
+    with open(tmp_path / RECORDS_FILE, "ab") as f:
+        f.write(b'{"text": "torn"')
+
+    log = MemoryLog(tmp_path, 4)
+
+    assert len(log) == 1
+    assert log.text(0) == "ok"
+    assert os.path.getsize(tmp_path / OFFSETS_FILE) == 8
+
+
+def test_reset_store_clears_disk(tmp_path):
+    memory_store.open_store(tmp_path)
+    memory_store.add_memories(["x"], _vectors(1))
+    memory_store.snapshot()
+    memory_store.reset_store()
+
+    memory_store.open_store(tmp_path)
+    assert memory_store.get_all_memories() == []
@@ -0,0 +1,52 @@
+import datetime
+
+import numpy as np
+import pytest
+from backend.services import memory_store
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path):
+    memory_store.open_store(tmp_path)
+    rng = np.random.default_rng(0)
+    now = datetime.datetime(2025, 9, 20, 12, 0)
+    texts, metas = [], []
+    for i in range(60):
+        texts.append(f"memory {i}")
+        metas.append({
+            "user_id": "default",
+            "source": ["calendar", "notes", "chat"][i % 3],
+            "timestamp": (now - datetime.timedelta(days=i)).isoformat(),
+        })
+    vectors = rng.random((60, memory_store.VECTOR_DIM), dtype=np.float32)
+    memory_store.add_memories(texts, vectors, metas)
+    return vectors
+
+
+def test_hits_carry_id_score_and_metadata(store):
+    hits = memory_store.search_hits(store[4].tolist(), k=3)
+    assert hits[0]["id"] == 4 and hits[0]["text"] == "memory 4"
+    assert hits[0]["distance"] == pytest.approx(0.0, abs=1e-4)
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-4)
+    assert hits[0]["metadata"]["source"] == "notes"
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+
+def test_source_and_time_filters_applied_inside_scan(store):
+    hits = memory_store.search_hits(store[4].tolist(), k=5, source="calendar",
+                                    since="2025-09-13T00:00:00", until=datetime.datetime(2025, 9, 20, 23, 0))
+    # calendar rows are every third day: days 0, 3 and 6 fall in the last week
+    assert sorted(h["id"] for h in hits) == [0, 3, 6]
+    assert all(h["metadata"]["source"] == "calendar" for h in hits)
+
+
+def test_filter_matching_nothing_returns_empty(store):
+    assert memory_store.search_hits(store[0].tolist(), k=5, source="email") == []
+    assert memory_store.search_memory(store[0].tolist(), k=5, source=["chat", "email"])[0] != "memory 0"
+
+
+def test_filters_stay_in_sync_with_new_memories(store):
+    memory_store.search_hits(store[0].tolist(), k=1, source="notes")  # builds the columns
+    vec = np.full(memory_store.VECTOR_DIM, 0.5, dtype=np.float32)
+    memory_store.add_memory("new email", vec.tolist(), {"source": "email"})
+    assert [h["text"] for h in memory_store.search_hits(vec.tolist(), k=5, source="email")] == ["new email"]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from backend.services import memory_store
+from backend.services.answer_cache import AnswerCache
+from backend.services.index_factory import build_index, vector_distances
+from backend.services.shards import MemoryShard
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, memory_store.VECTOR_DIM), dtype=np.float32)
+
+
+@pytest.mark.parametrize("metric", ["l2", "ip", "cosine"])
+def test_batch_matches_single_queries(tmp_path, monkeypatch, metric):
+    monkeypatch.setattr(memory_store, "METRIC", metric)
+    memory_store.open_store(tmp_path)
+    vectors = _vectors(300)
+    memory_store.add_memories([f"m{i}" for i in range(300)], vectors,
+                              [{"source": "notes" if i % 2 else "chat"} for i in range(300)])
+    queries = _vectors(20, seed=1)
+
+    for filters in ({}, {"source": "notes"}):
+        batch = memory_store.search_hits_batch(queries, k=5, **filters)
+        single = [memory_store.search_hits(q.tolist(), k=5, mode="vector", **filters) for q in queries]
+        assert [[h["id"] for h in hits] for hits in batch] == [[h["id"] for h in hits] for hits in single]
+        for got, want in zip(batch, single):
+            assert [h["distance"] for h in got] == pytest.approx([h["distance"] for h in want], rel=1e-5)
+    assert all(h["id"] % 2 for hits in batch for h in hits)
+
+
+def test_cosine_normalizes_and_scores_similarity(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_store, "METRIC", "cosine")
+    memory_store.open_store(tmp_path)
+    vectors = _vectors(10)
+    memory_store.add_memories([f"m{i}" for i in range(10)], vectors)
+
+    # Scaling the query doesn't change cosine similarity
+    hits = memory_store.search_hits((vectors[3] * 7).tolist(), k=2, mode="vector")
+    assert hits[0]["id"] == 3
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert hits[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+    norms = np.linalg.norm(memory_store.get_shard().log.vectors, axis=1)
+    assert norms == pytest.approx(np.ones(10), abs=1e-5)
+
+
+def test_inner_product_index(tmp_path):
+    shard = MemoryShard(tmp_path, 4, snapshot_every=100, metric="ip")
+    shard.add(["small", "big"], np.array([[1, 0, 0, 0], [3, 0, 0, 0]], dtype=np.float32), [{}, {}])
+    values, rows = shard.search(np.array([[1, 0, 0, 0]], dtype=np.float32), 2)
+    assert rows[0].tolist() == [1, 0]  # largest inner product first
+    assert values[0].tolist() == pytest.approx([3.0, 1.0])
+    assert build_index("hnsw", 8, 1_000, "ip").metric_type == shard.index.metric_type
+
+
+def test_store_refuses_a_different_metric(tmp_path):
+    MemoryShard(tmp_path, 4, snapshot_every=100, metric="cosine")
+    with pytest.raises(ValueError, match="metric"):
+        MemoryShard(tmp_path, 4, snapshot_every=100, metric="l2")
+    with pytest.raises(ValueError):
+        build_index("flat", 4, 0, "manhattan")
+
+
+def test_answer_cache_uses_the_store_metric():
+    vectors = np.array([[2, 0], [0, 1]], dtype=np.float32)
+    assert vector_distances(vectors, np.array([1, 0], dtype=np.float32), "cosine").tolist() == \
+        pytest.approx([0.0, 1.0])
+
+    cache = AnswerCache(metric="cosine")
+    cache.put("u", "when is the gym", [1, 0], [{"id": 0, "distance": 0.5}], 1, "7am")
+    cache.on_memory_event("add", "u", ids=[1], texts=["unrelated"], vectors=[[0, 5]])
+    assert cache.stats()["items"] == 1  # orthogonal: distance 1.0 > 0.5
+    cache.on_memory_event("add", "u", ids=[2], texts=["other"], vectors=[[5, 0.1]])
+    assert cache.stats()["items"] == 0
@@ -0,0 +1,98 @@
+import json
+
+import faiss
+import numpy as np
+from backend.services.index_factory import index_type_of, knn
+from backend.services.persistence import MANIFEST_FILE, SEGMENTS_DIR, SNAPSHOT_FILE, maintenance_lock
+from backend.services.shards import MemoryShard
+
+DIM = 8
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, DIM), dtype=np.float32)
+
+
+def _add(shard, vectors, first=0):
+    shard.add([f"m{i}" for i in range(first, first + len(vectors))], vectors, [{}] * len(vectors))
+    shard.wait_for_upgrade()
+
+
+def _sizes(shard):
+    return [len(s) for s in shard.view().segments]
+
+
+def test_tiered_merges(tmp_path):
+    shard = MemoryShard(tmp_path, DIM, snapshot_every=20, merge_factor=3)
+    vectors = _vectors(200)
+
+    for batch in range(3):
+        _add(shard, vectors[batch * 20:batch * 20 + 20], batch * 20)
+    assert _sizes(shard) == [60]  # three 20-row seals merged into one
+    for batch in range(3, 9):
+        _add(shard, vectors[batch * 20:batch * 20 + 20], batch * 20)
+    assert _sizes(shard) == [180]  # ...and three of those into the next tier
+    _add(shard, vectors[180:195], 180)
+    assert _sizes(shard) == [180] and shard.view().rows == 195  # head below the seal size
+
+    assert sorted((tmp_path / SEGMENTS_DIR).iterdir()) == [tmp_path / shard.view().segments[0].name]
+    reopened = MemoryShard(tmp_path, DIM, snapshot_every=20, merge_factor=3)
+    assert _sizes(reopened) == [180] and reopened.view().rows == 195
+
+
+def test_search_merges_segments_and_head(tmp_path):
+    shard = MemoryShard(tmp_path, DIM, snapshot_every=10, merge_factor=4)
+    vectors = _vectors(75)
+    for start in range(0, 75, 14):
+        _add(shard, vectors[start:start + 14], start)
+    shard.delete([4, 40])
+    assert _sizes(shard) == [56, 14] and shard.view().rows == 75
+
+    queries = _vectors(10, seed=1)
+    mask = np.arange(75) % 3 == 0
+    values, rows = shard.search(queries, 5, mask=mask)
+    candidates = np.flatnonzero(mask & ~np.isin(np.arange(75), [4, 40]))
+    want = candidates[knn(queries, vectors[candidates], 5, "l2")[1]]
+    assert rows.tolist() == want.tolist()
+
+
+def test_large_segments_use_the_ann_index(tmp_path):
+    shard = MemoryShard(tmp_path, DIM, snapshot_every=20, index_type="hnsw", train_threshold=100)
+    vectors = _vectors(130)
+    for start in range(0, 120, 20):
+        _add(shard, vectors[start:start + 20], start)
+
+    # The flat segments were rebuilt as one HNSW segment once they held 100 rows
+    assert _sizes(shard) == [100, 20]
+    assert [index_type_of(s.index) for s in shard.view().segments] == ["hnsw", "flat"]
+    assert int(shard.search(vectors[57][None, :], 1)[1][0][0]) == 57
+
+
+def test_adds_never_wait_for_a_build(tmp_path):
+    shard = MemoryShard(tmp_path, DIM, snapshot_every=20)
+    vectors = _vectors(101)
+
+    with maintenance_lock(tmp_path):  # another process is busy building this store
+        _add(shard, vectors[:100])
+        view = shard.view()
+        assert view.base_rows == 0 and view.rows == 100
+        assert int(shard.search(vectors[77][None, :], 1)[1][0][0]) == 77
+
+    _add(shard, vectors[100:], 100)  # the next write picks the work up
+    assert shard.view().base_rows == 101
+
+
+def test_pre_segment_snapshot_is_read_as_a_segment(tmp_path):
+    shard = MemoryShard(tmp_path, DIM, snapshot_every=100)
+    vectors = _vectors(10)
+    _add(shard, vectors)
+    index = faiss.IndexFlatL2(DIM)
+    index.add(vectors[:6])
+    faiss.write_index(index, str(tmp_path / SNAPSHOT_FILE))
+    (tmp_path / MANIFEST_FILE).write_text(json.dumps({"count": 6, "dim": DIM}))
+
+    shard = MemoryShard(tmp_path, DIM, snapshot_every=100)
+    assert _sizes(shard) == [6] and shard.view().rows == 10
+    shard.snapshot()
+    assert _sizes(shard) == [10]
+    assert not (tmp_path / SNAPSHOT_FILE).exists()
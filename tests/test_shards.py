@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+import pytest
+from backend.services import memory_store
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_store, "MAX_LOADED_SHARDS", 2)
+    memory_store.open_store(tmp_path)
+    yield
+
+
+def _vec(seed):
+    return np.random.default_rng(seed).random(memory_store.VECTOR_DIM, dtype=np.float32).tolist()
+
+
+def test_search_only_sees_own_memories():
+    memory_store.add_memory("alice likes tea", _vec(1), user_id="alice")
+    memory_store.add_memory("bob likes coffee", _vec(1), user_id="bob")
+
+    assert memory_store.search_memory(_vec(1), k=5, user_id="alice") == ["alice likes tea"]
+    assert memory_store.search_memory(_vec(1), k=5, user_id="bob") == ["bob likes coffee"]
+    assert memory_store.search_memory(_vec(1), k=5, user_id="carol") == []
+
+
+def test_reset_one_user_keeps_others():
+    memory_store.add_memory("alice note", _vec(1), user_id="alice")
+    memory_store.add_memory("bob note", _vec(2), user_id="bob")
+
+    memory_store.reset_store("alice")
+
+    assert memory_store.get_all_memories("alice") == []
+    assert memory_store.get_all_memories("bob") == ["bob note"]
+
+
+def test_cold_shards_are_evicted_and_reloaded():
+    for i, user in enumerate(["u1", "u2", "u3"]):
+        memory_store.add_memory(f"{user} note", _vec(i), user_id=user)
+
+    registry = memory_store._registry()
+    assert registry.loaded_user_ids() == ["u2", "u3"]
+    assert registry.user_ids() == ["u1", "u2", "u3"]
+
+    # u1 was evicted but its shard is reopened from disk on demand
+    assert memory_store.search_memory(_vec(0), k=1, user_id="u1") == ["u1 note"]
+    assert registry.loaded_user_ids() == ["u3", "u1"]
+
+
+def test_evicted_shards_are_closed_unless_busy():
+    registry = memory_store._registry()
+    busy = registry.get("u1")
+    busy._compactor = threading.Thread(target=lambda: None)  # as if compacting in the background
+    idle = registry.get("u2")
+
+    registry.get("u3")
+    assert registry.loaded_user_ids() == ["u1", "u3"]
+    assert idle._closed and not busy._closed
+
+    busy._compactor = None
+    registry.get("u4")
+    assert registry.loaded_user_ids() == ["u3", "u4"]
+    assert busy._closed
+
+
+def test_user_ids_are_safe_directory_names(tmp_path):
+    memory_store.add_memory("x", _vec(0), user_id="../escape")
+    assert memory_store._registry().user_ids() == ["../escape"]
+    assert not (tmp_path.parent / "escape").exists()
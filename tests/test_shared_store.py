@@ -0,0 +1,151 @@
+import subprocess
+import sys
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from backend.services.shards import MemoryShard
+
+DIM = 8
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, DIM), dtype=np.float32)
+
+
+def _shard(path, **kwargs):
+    return MemoryShard(path, DIM, snapshot_every=kwargs.pop("snapshot_every", 50), **kwargs)
+
+
+def _settle(*shards):
+    """Wait until no shard has a background seal or merge running."""
+    while any(shard.upgrading for shard in shards):
+        for shard in shards:
+            shard.wait_for_upgrade()
+
+
+def _nearest(shard_or_view, vector):
+    return int(shard_or_view.search(vector[None, :], 1)[1][0][0])
+
+
+def test_searches_do_not_wait_for_writers(tmp_path):
+    shard = _shard(tmp_path / "s")
+    vectors = _vectors(20)
+    shard.add([f"m{i}" for i in range(20)], vectors, [{}] * 20)
+
+    # A writer of this process and one of another process are both mid-write
+    with shard._lock, shard._file_lock:
+        with ThreadPoolExecutor(1) as pool:
+            row = pool.submit(_nearest, shard, vectors[7]).result(timeout=5)
+    assert row == 7
+
+
+def test_views_are_snapshots(tmp_path):
+    shard = _shard(tmp_path / "s", snapshot_every=10)
+    vectors = _vectors(30)
+    shard.add([f"m{i}" for i in range(8)], vectors[:8], [{}] * 8)
+    before = shard.view()
+
+    shard.add([f"m{i}" for i in range(8, 30)], vectors[8:], [{}] * 22)
+    shard.wait_for_upgrade()  # the head is sealed in the background
+    shard.delete([3])
+
+    assert before.rows == len(before) == 8 and before.base_rows == 0
+    assert _nearest(before, vectors[20]) < 8 and _nearest(before, vectors[3]) == 3
+    after = shard.view()
+    assert after.base_rows == 30 and len(after) == 29
+    assert _nearest(after, vectors[20]) == 20 and _nearest(after, vectors[3]) != 3
+
+
+def test_workers_sharing_a_store_see_each_others_writes(tmp_path):
+    a, b = _shard(tmp_path / "s"), _shard(tmp_path / "s")
+    vectors = _vectors(120)
+
+    ids_a = a.add([f"a{i}" for i in range(60)], vectors[:60], [{"source": "a"}] * 60)
+    ids_b = b.add([f"b{i}" for i in range(60)], vectors[60:], [{"source": "b"}] * 60)
+    assert ids_b == list(range(60, 120)) and ids_a == list(range(60))
+
+    # Each head was sealed into a segment on disk, which the other worker maps on its next search
+    assert _nearest(a, vectors[100]) == 100
+    _settle(a, b)
+    assert a.view().base_rows == b.view().base_rows == 120
+    assert [s.name for s in a.view().segments] == [s.name for s in b.view().segments]
+    assert a.records_of([100]) == [{"id": 100, "text": "b40", "metadata": {"source": "b"}}]
+    assert a.meta_index.mask(source="b").sum() == 60
+
+    b.update(5, "edited", vectors[0], {})
+    a.delete([6])
+    assert b.records_of([5, 6]) == [{"id": 5, "text": "edited", "metadata": {}}]
+    assert len(a) == len(b) == 119
+
+
+def test_compaction_in_another_worker(tmp_path):
+    a, b = _shard(tmp_path / "s"), _shard(tmp_path / "s")
+    vectors = _vectors(10)
+    a.add([f"m{i}" for i in range(10)], vectors, [{}] * 10)
+    a.delete([0, 1, 2])
+
+    b.compact()
+
+    view = a.view()
+    assert view.rows == len(view) == 7
+    assert a.records_of([9])[0]["text"] == "m9"
+    assert a.add(["next"], vectors[:1], [{}]) == [10]
+
+
+def test_concurrent_adds_and_searches(tmp_path):
+    shard = _shard(tmp_path / "s", snapshot_every=64)
+    vectors = _vectors(800)
+    errors = []
+
+    def write(part):
+        for start in range(part * 200, part * 200 + 200, 10):
+            shard.add([f"m{i}" for i in range(start, start + 10)], vectors[start:start + 10], [{}] * 10)
+
+    def read():
+        for i in range(200):
+            view = shard.view()
+            values, rows = view.search(vectors[i % 50][None, :], 5)
+            found = rows[0][rows[0] >= 0]
+            if (found >= view.rows).any():
+                errors.append(f"row outside the view: {found} / {view.rows}")
+
+    threads = [threading.Thread(target=write, args=(p,)) for p in range(4)]
+    threads += [threading.Thread(target=read) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(shard) == 800 and sorted(shard.ids_after(-1)) == list(range(800))
+
+
+_WORKER = textwrap.dedent("""
+    import sys
+    import numpy as np
+    sys.path.insert(0, {root!r})
+    from backend.services.shards import MemoryShard
+
+    shard = MemoryShard({path!r}, {dim}, snapshot_every=50)
+    rng = np.random.default_rng(int(sys.argv[1]))
+    for batch in range(20):
+        shard.add([f"w{{sys.argv[1]}}-{{batch}}-{{i}}" for i in range(5)],
+                  rng.random((5, {dim}), dtype=np.float32), [{{"source": f"w{{sys.argv[1]}}"}}] * 5)
+""")
+
+
+def test_worker_processes_write_one_store(tmp_path):
+    path = tmp_path / "s"
+    script = _WORKER.format(root=str(Path(__file__).resolve().parents[1]), path=str(path), dim=DIM)
+    workers = [subprocess.Popen([sys.executable, "-c", script, str(w)]) for w in range(3)]
+    assert [w.wait(60) for w in workers] == [0, 0, 0]
+
+    shard = _shard(path)
+    assert len(shard) == 300
+    assert sorted(shard.ids_after(-1)) == list(range(300))
+    texts = {r["text"] for r in shard.records_of(range(300))}
+    assert len(texts) == 300
+    assert shard.meta_index.mask(source="w1").sum() == 100
@@ -0,0 +1,62 @@
+import numpy as np
+
+from backend.services import memory_store, startup
+from backend.services.embedding_cache import EmbeddingCache
+from backend.services.startup import Startup
+
+
+def test_warmup_records_phases_and_becomes_ready():
+    state = Startup()
+    calls = []
+    with state.phase("imports"):
+        pass
+    state.start_warmup([("one", lambda: calls.append(1)), ("two", lambda: calls.append(2))])
+
+    assert state.wait(5)
+    report = state.report()
+    assert calls == [1, 2]
+    assert report["status"] == "ready" and report["error"] is None
+    assert list(report["phases_ms"]) == ["imports", "one", "two"]
+    assert report["ready_after_ms"] >= sum(report["phases_ms"].values()) - 1
+
+
+def test_failed_warmup_is_not_ready():
+    state = Startup()
+
+    def broken():
+        raise RuntimeError("index file is corrupt")
+
+    state.start_warmup([("shard:default", broken), ("never", lambda: None)])
+    assert not state.wait(5)
+    report = state.report()
+    assert report["status"] == "failed"
+    assert report["error"] == "shard:default: index file is corrupt"
+    assert "never" not in report["phases_ms"]
+
+
+def test_warmup_steps_load_shards(tmp_path):
+    memory_store.open_store(tmp_path)
+    vectors = np.random.default_rng(0).random((2, memory_store.VECTOR_DIM), dtype=np.float32)
+    memory_store.add_memories(["gym at 7am", "likes pasta"], vectors, user_id="alice")
+    memory_store.open_store(tmp_path)  # a restart: nothing loaded yet
+    assert memory_store.loaded_users() == []
+
+    steps = startup.warmup_steps(["alice"])
+    assert [name for name, _ in steps][-1] == "shard:alice"
+    state = Startup()
+    state.run_warmup(steps)
+
+    assert state.ready
+    assert startup.readiness()["loaded"]["shards"] == ["alice"]
+    assert memory_store.get_shard("alice")._lexical_index is not None
+
+
+def test_embedding_cache_preload(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    EmbeddingCache(path=str(path)).put_many({f"k{i}": np.full(4, i, dtype="float32") for i in range(5)})
+
+    cache = EmbeddingCache(max_items=3, path=str(path))
+    assert cache.preload() == 3
+    assert cache.stats()["memory_items"] == 3 and cache.misses == 0
+    assert set(cache.get_many(["k2", "k3", "k4"])) == {"k2", "k3", "k4"}
+    assert cache.memory_hits == 3 and cache.disk_hits == 0
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from backend.services import memory_store, predictions
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(predictions, "MOCK_STREAM_DELAY_MS", 5)
+    predictions.answer_cache.clear()
+    memory_store.open_store(tmp_path)
+    vectors = np.random.default_rng(0).random((3, memory_store.VECTOR_DIM), dtype=np.float32)
+    memory_store.add_memories(["I like pasta", "Gym at 7am", "Deadline 2025-10-01"], vectors)
+
+
+def _collect(question):
+    async def run():
+        start = time.perf_counter()
+        events = []
+        async for event, data in predictions.astream_ask("default", question, top_k=2):
+            events.append((event, data, time.perf_counter() - start))
+        return events
+    return asyncio.run(run())
+
+
+def test_context_arrives_before_tokens():
+    events = _collect("What do I like to eat?")
+    kinds = [e[0] for e in events]
+
+    assert kinds[0] == "context" and kinds[-1] == "done"
+    assert set(kinds[1:-1]) == {"token"} and len(kinds) > 5
+    assert len(events[0][1]["context"]) == 2 and not events[0][1]["cached"]
+    # First token long before the full answer
+    assert events[1][2] < events[-1][2] / 3
+
+
+def test_tokens_join_to_the_answer():
+    events = _collect("What do I like to eat?")
+    streamed = "".join(data for kind, data, _ in events if kind == "token")
+    assert streamed.strip() == events[-1][1]["answer"]
+    assert events[-1][1]["answer"] == predictions._mock_answer(
+        "What do I like to eat?", events[0][1]["context"])
+
+
+def test_cached_answer_is_streamed_at_once():
+    first = _collect("What do I like to eat?")
+    second = _collect("What do I like to eat?")
+
+    assert second[0][1]["cached"]
+    assert [e[0] for e in second] == ["context", "token", "done"]
+    assert second[-1][1]["answer"] == first[-1][1]["answer"]